@@ -0,0 +1,238 @@
+# --- START OF FILE batch_prayer_engine.py ---
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+from local_prayer_engine import (
+    LABEL_CALCULATIONS, PRAYER_DEFINITIONS, BASE_URL, SOLVER_ITERATIONS, HIGH_LATITUDE_RULE,
+    parse_muwaqqit_params, horizon_altitude, high_latitude_night_fraction, _normalize_label,
+)
+from prayer_schedule import schedule_labels, build_prayer_schedule
+
+SECONDS_PER_DAY = 86400
+_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+_LABEL_CALCULATIONS_BY_NORMALIZED = {_normalize_label(label): calc for label, calc in LABEL_CALCULATIONS.items()}
+_tz_transition_cache = {}
+
+
+def _sun_arrays(julian_day):
+    """Vectorized solar_declination_and_equation_of_time() from local_prayer_engine."""
+    T = (julian_day - 2451545.0) / 36525.0
+    mean_long = np.radians((280.46646 + T * (36000.76983 + 0.0003032 * T)) % 360.0)
+    mean_anom = np.radians(357.52911 + T * (35999.05029 - 0.0001537 * T))
+    eccentricity = 0.016708634 - T * (0.000042037 + 0.0000001267 * T)
+    center = (np.sin(mean_anom) * (1.914602 - T * (0.004817 + 0.000014 * T))
+              + np.sin(2 * mean_anom) * (0.019993 - 0.000101 * T)
+              + np.sin(3 * mean_anom) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * T)
+    apparent_long = np.radians(np.degrees(mean_long) + center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliquity = 23.0 + (26.0 + (21.448 - T * (46.815 + T * (0.00059 - T * 0.001813))) / 60.0) / 60.0
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+
+    declination = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(apparent_long)))
+    y = np.tan(obliquity / 2.0) ** 2
+    equation_of_time = 4.0 * np.degrees(
+        y * np.sin(2 * mean_long)
+        - 2 * eccentricity * np.sin(mean_anom)
+        + 4 * eccentricity * y * np.sin(mean_anom) * np.cos(2 * mean_long)
+        - 0.5 * y * y * np.sin(4 * mean_long)
+        - 1.25 * eccentricity * eccentricity * np.sin(2 * mean_anom)
+    )
+    return declination, equation_of_time
+
+
+def _hour_angle_arrays(latitude, declination, altitude):
+    """Vectorized hour angle in degrees; NaN where the sun never reaches 'altitude'."""
+    lat_r, dec_r = np.radians(latitude), np.radians(declination)
+    cos_h = (np.sin(np.radians(altitude)) - np.sin(lat_r) * np.sin(dec_r)) / (np.cos(lat_r) * np.cos(dec_r))
+    with np.errstate(invalid="ignore"):
+        return np.where(np.abs(cos_h) <= 1.0, np.degrees(np.arccos(np.clip(cos_h, -1.0, 1.0))), np.nan)
+
+
+def _solve_event_hours(calc, midnight_julian_day, latitude, longitude, params):
+    """
+    Vectorized _event_utc_hours(): solves one label for every (date, location) pair at once.
+
+    Args:
+        calc (tuple): An entry of LABEL_CALCULATIONS (not 'half_night').
+        midnight_julian_day (ndarray): Julian day of 00:00 UTC for each date, shape (D, 1).
+        latitude, longitude (ndarray): Degrees, shape (1, N).
+
+    Returns:
+        ndarray: Hours after 00:00 UTC, shape (D, N); NaN where the event does not occur.
+    """
+    kind = calc[0]
+    hours = np.broadcast_to(12.0 - longitude / 15.0, np.broadcast(midnight_julian_day, longitude).shape).astype(float)
+    for _ in range(SOLVER_ITERATIONS):
+        declination, equation_of_time = _sun_arrays(midnight_julian_day + hours / 24.0)
+        transit = 12.0 - longitude / 15.0 - equation_of_time / 60.0
+        if kind == "transit":
+            hours = transit
+            continue
+        if kind == "asr":
+            altitude = np.degrees(np.arctan(1.0 / (calc[1] + np.tan(np.radians(np.abs(latitude - declination))))))
+            side = "evening"
+        elif kind == "horizon":
+            altitude, side = horizon_altitude(params), calc[1]
+        else:
+            altitude, side = params[calc[2]], calc[1]
+        hour_angle = _hour_angle_arrays(latitude, declination, altitude)
+        hours = transit - hour_angle / 15.0 if side == "morning" else transit + hour_angle / 15.0
+    return hours
+
+
+def _tz_transitions(timezone_str):
+    """Returns (transition epochs, utc offsets in seconds) for a pytz timezone, cached per name."""
+    if timezone_str not in _tz_transition_cache:
+        tz = pytz.timezone(timezone_str)
+        transition_times = getattr(tz, "_utc_transition_times", None)
+        transition_info = getattr(tz, "_transition_info", None)
+        if transition_times and transition_info:
+            epoch = datetime(1970, 1, 1)
+            epochs = np.array([(t - epoch).total_seconds() for t in transition_times])
+            offsets = np.array([info[0].total_seconds() for info in transition_info])
+        else: # Fixed-offset zones (e.g. UTC, Etc/GMT-3)
+            epochs = np.array([-np.inf])
+            offsets = np.array([tz.utcoffset(datetime(2000, 1, 1)).total_seconds()])
+        _tz_transition_cache[timezone_str] = (epochs, offsets)
+    return _tz_transition_cache[timezone_str]
+
+
+def _utc_offsets(timezone_str, utc_epoch_seconds):
+    """Vectorized UTC offset lookup (seconds) for an array of UTC instants."""
+    epochs, offsets = _tz_transitions(timezone_str)
+    index = np.clip(np.searchsorted(epochs, utc_epoch_seconds, side="right") - 1, 0, len(offsets) - 1)
+    return offsets[index]
+
+
+class PrayerTimeBatch:
+    """
+    Dense result of compute_batch().
+
+    Attributes:
+        dates (list[datetime.date]): The D dates calculated.
+        locations (list[tuple]): The N (latitude, longitude, timezone) tuples.
+        labels (list[str]): The K labels calculated.
+        local_seconds (ndarray): Shape (D, N, K). Seconds after local midnight of the
+            date, in the location's timezone; values outside [0, 86400) mean the time
+            falls on the next/previous day (muwaqqit's ▲/▼). NaN where the event does
+            not occur (e.g. no astronomical twilight at high latitudes in summer).
+    """
+
+    def __init__(self, dates, locations, labels, local_seconds):
+        self.dates = dates
+        self.locations = locations
+        self.labels = labels
+        self.local_seconds = local_seconds
+        valid = ~np.isnan(local_seconds)
+        whole_seconds = np.where(valid, local_seconds, 0).astype(np.int64)
+        self.date_offsets = np.floor_divide(whole_seconds, SECONDS_PER_DAY)
+        self.seconds_of_day = np.mod(whole_seconds, SECONDS_PER_DAY)
+        self.valid = valid
+
+    def label_times(self, date_index, location_index):
+        """Returns label -> ("HH:MM:SS", date_offset) for one (date, location), like compute_label_times()."""
+        label_times = {}
+        for k, label in enumerate(self.labels):
+            if not self.valid[date_index, location_index, k]:
+                continue
+            seconds = int(self.seconds_of_day[date_index, location_index, k])
+            time_str = f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+            label_times[label] = (time_str, int(self.date_offsets[date_index, location_index, k]))
+        return label_times
+
+    def prayer_schedule(self, date_index, location_index, prayer_definitions=None):
+        """Returns the prayer schedule dict (same shape as get_prayer_times_with_ends()) for one (date, location)."""
+        return build_prayer_schedule(self.label_times(date_index, location_index), self.dates[date_index],
+                                     prayer_definitions or PRAYER_DEFINITIONS, verbose=False)
+
+    def prayer_schedules_for_location(self, location_index, prayer_definitions=None):
+        """Returns {date: prayer schedule or None} for every date at one location."""
+        return {day: self.prayer_schedule(d, location_index, prayer_definitions) for d, day in enumerate(self.dates)}
+
+
+def compute_batch(dates, locations, labels=None, params=None, high_latitude_rule=None):
+    """
+    Calculates many dates x many locations in one vectorized pass.
+
+    Solar declination, equation of time and the hour-angle solve run as NumPy array
+    operations over the whole (date, location) grid; only timezone offsets are looked
+    up per unique timezone.
+
+    Args:
+        dates (iterable[datetime.date]): Local dates to calculate.
+        locations (iterable[tuple]): (latitude, longitude, timezone_str) tuples.
+        labels (iterable[str], optional): Labels to calculate. Defaults to every label in PRAYER_DEFINITIONS.
+        params (dict, optional): Calculation parameters. Defaults to those in muwaqqit_base_url.
+        high_latitude_rule (str, optional): One of local_prayer_engine.HIGH_LATITUDE_RULES.
+            Defaults to the configured rule.
+
+    Returns:
+        PrayerTimeBatch: Dense (D, N, K) result.
+    """
+    dates = list(dates)
+    locations = [(float(lat), float(lon), tz) for lat, lon, tz in locations]
+    labels = sorted(labels if labels is not None else schedule_labels(PRAYER_DEFINITIONS))
+    params = params or parse_muwaqqit_params(BASE_URL)
+    rule = high_latitude_rule or HIGH_LATITUDE_RULE
+
+    days_since_epoch = np.array([(day - datetime(1970, 1, 1).date()).days for day in dates], dtype=np.int64)[:, None]
+    midnight_julian_day = _UNIX_EPOCH_JULIAN_DAY + days_since_epoch.astype(float)
+    latitude = np.array([loc[0] for loc in locations])[None, :]
+    longitude = np.array([loc[1] for loc in locations])[None, :]
+
+    utc_hours = np.full((len(dates), len(locations), len(labels)), np.nan)
+    solved = {}
+    def solve(calc, day_shift=0):
+        key = (calc, day_shift)
+        if key not in solved:
+            hours = _solve_event_hours(calc, midnight_julian_day + day_shift, latitude, longitude, params)
+            angle = params[calc[2]] if calc[0] == "altitude" else 0.0
+            fraction = high_latitude_night_fraction(rule, angle) if angle < 0 else None
+            if fraction is not None: # Same high-latitude rule as local_prayer_engine._twilight_event_utc_hours()
+                sunrise = solve(LABEL_CALCULATIONS["Shurūq/Sunrise"], day_shift)
+                sunset = solve(LABEL_CALCULATIONS["Maghrib/Sunset"], day_shift)
+                portion = fraction * (sunrise + 24.0 - sunset) # NaN (no adjustment) in polar day or night
+                if calc[1] == "morning":
+                    limit = sunrise - portion
+                    outside = np.isnan(hours) | (sunrise - hours > portion)
+                else:
+                    limit = sunset + portion
+                    outside = np.isnan(hours) | (hours - sunset > portion)
+                hours = np.where(outside & ~np.isnan(portion), limit, hours)
+            solved[key] = hours
+        return solved[key]
+
+    for k, label in enumerate(labels):
+        calc = _LABEL_CALCULATIONS_BY_NORMALIZED.get(_normalize_label(label))
+        if calc is None:
+            print(f"Warning: The batch prayer time engine does not know how to calculate '{label}'.")
+            continue
+        if calc[0] == "half_night":
+            utc_hours[:, :, k] = (solve(LABEL_CALCULATIONS["Maghrib/Sunset"]) + solve(LABEL_CALCULATIONS["Fajr"], 1) + 24.0) / 2.0
+        else:
+            utc_hours[:, :, k] = solve(calc)
+
+    utc_seconds = np.round(utc_hours * 3600.0)
+    event_epochs = days_since_epoch[:, :, None] * SECONDS_PER_DAY + utc_seconds
+    local_seconds = np.full_like(utc_seconds, np.nan)
+    timezones = np.array([loc[2] for loc in locations])
+    for timezone_str in set(timezones):
+        columns = timezones == timezone_str
+        local_seconds[:, columns, :] = utc_seconds[:, columns, :] + _utc_offsets(timezone_str, event_epochs[:, columns, :])
+    return PrayerTimeBatch(dates, locations, labels, local_seconds)
+
+
+if __name__ == '__main__':
+    import time
+    sites = [(-33.8688, 151.2093, "Australia/Sydney"), (51.5074, -0.1278, "Europe/London"),
+             (21.4225, 39.8262, "Asia/Riyadh"), (40.7128, -74.0060, "America/New_York")]
+    start_day = datetime.now().date()
+    year = [start_day + timedelta(days=i) for i in range(365)]
+    started = time.perf_counter()
+    batch = compute_batch(year, sites)
+    print(f"Computed {len(year)} days x {len(sites)} locations x {len(batch.labels)} labels in {time.perf_counter() - started:.3f}s.")
+    for n, site in enumerate(sites):
+        print(f"{site[2]} on {year[0]}: {batch.label_times(0, n)}")
+
+# --- END OF FILE batch_prayer_engine.py ---
\ No newline at end of file
@@ -0,0 +1,351 @@
+# --- START OF FILE benchmarks/bench_e2e.py ---
+
+"""
+End-to-end benchmark of a sync against local stand-ins for muwaqqit.com, IP geolocation
+and the Google Calendar API (see fake_services.py). Nothing leaves the machine.
+
+Every (horizon, location count) combination runs in a fresh Python process, in a scratch
+directory with its own config.json, token and caches, so runs don't share warm state:
+
+    import      importing prayer_calendar_manager
+    fetch       get_prayer_times_with_ends() for every day of the horizon at every location
+    sync_cold   run_sync() (one location) or run_fleet() (several) against an empty calendar
+    sync_warm   the same again, with every event already in place
+
+For each phase it reports the latency, events/s and the process's peak RSS so far, plus
+the calls the fake services received. Results are saved as JSON (tagged with the git
+commit) and can be compared with an earlier file:
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --horizons 7 30 90 --locations 1 5 --backend local
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e_<commit>_<time>.json
+"""
+
+import argparse
+import json
+import math
+import os
+import pickle
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_HORIZONS = (7, 30)
+DEFAULT_LOCATION_COUNTS = (1, 3)
+BENCH_LOCATIONS = [ # (latitude, longitude, timezone); reused with an offset past the end of the list
+    (-33.8688, 151.2093, 'Australia/Sydney'),
+    (-37.8136, 144.9631, 'Australia/Melbourne'),
+    (51.5072, -0.1276, 'Europe/London'),
+    (40.7128, -74.0060, 'America/New_York'),
+    (30.0444, 31.2357, 'Africa/Cairo'),
+    (-6.2088, 106.8456, 'Asia/Jakarta'),
+    (41.0082, 28.9784, 'Europe/Istanbul'),
+    (3.1390, 101.6869, 'Asia/Kuala_Lumpur'),
+]
+
+
+def bench_locations(count):
+    locations = []
+    for index in range(count):
+        latitude, longitude, timezone_str = BENCH_LOCATIONS[index % len(BENCH_LOCATIONS)]
+        offset = 0.5 * (index // len(BENCH_LOCATIONS)) # Far enough apart not to share cached schedules
+        locations.append({'latitude': round(latitude + offset, 4), 'longitude': round(longitude + offset, 4),
+                          'timezone': timezone_str, 'address_for_display': f"Benchmark location {index + 1}"})
+    return locations
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where 'resource' is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1) # Bytes on macOS, KB elsewhere
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# ---------------------------------------------------------------------------------------
+# Worker: runs inside the scratch directory, in its own process.
+# ---------------------------------------------------------------------------------------
+
+def _fake_stats(services_url):
+    with urllib.request.urlopen(f"{services_url}/_bench/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def _request_delta(before, after):
+    delta = {}
+    for endpoint, entry in after['requests'].items():
+        count = entry['count'] - before['requests'].get(endpoint, {}).get('count', 0)
+        if count:
+            delta[endpoint] = count
+    return delta
+
+
+def _run_phase(name, function, services_url, phases):
+    before = _fake_stats(services_url)
+    started = time.perf_counter()
+    outcome = function()
+    seconds = time.perf_counter() - started
+    after = _fake_stats(services_url)
+    phases[name] = dict(outcome or {}, seconds=round(seconds, 4), peak_rss_mb=peak_rss_mb(),
+                        requests=_request_delta(before, after), calendar_events=after['calendar_events'])
+    print(f"[bench] {name}: {seconds:.3f}s", flush=True)
+    return phases[name]
+
+
+def run_worker(spec):
+    """Runs the phases described by the spec file (written by the driver) and saves their results."""
+    phases = {}
+    services_url = spec['services_url']
+    locations = spec['locations']
+
+    def import_app():
+        import prayer_calendar_manager # noqa: F401 (timed)
+
+    _run_phase('import', import_app, services_url, phases)
+    import prayer_calendar_manager
+    from prayer_time_sources import open_prayer_time_source
+
+    def fetch():
+        latencies = []
+        failures = 0
+        start_date = datetime.now().date()
+        with open_prayer_time_source() as source:
+            for location in locations:
+                dates = [start_date + timedelta(days=i) for i in range(spec['horizon'])]
+                source.prefetch_prayer_times(dates, location)
+                for date in dates:
+                    started = time.perf_counter()
+                    schedule = source.get_prayer_times_with_ends(date, location)
+                    latencies.append(time.perf_counter() - started)
+                    failures += 0 if schedule else 1
+        total = sum(latencies)
+        return {'days': len(latencies), 'failures': failures, 'days_per_second': round(len(latencies) / total, 2) if total else None,
+                'latency_ms': {'p50': round(statistics.median(latencies) * 1000, 2),
+                               'p95': round(sorted(latencies)[math.ceil(len(latencies) * 0.95) - 1] * 1000, 2),
+                               'max': round(max(latencies) * 1000, 2)}}
+
+    def sync():
+        if len(locations) == 1:
+            exit_code = prayer_calendar_manager.run_sync()
+            return {'ok': exit_code == 0}
+        from fleet import run_fleet
+        reports = run_fleet()
+        return {'ok': all(report['status'] == 'ok' for report in reports)}
+
+    _run_phase('fetch', fetch, services_url, phases)
+    for name in ('sync_cold', 'sync_warm'):
+        phase = _run_phase(name, sync, services_url, phases)
+        if os.path.exists('run_metrics.json'): # The app's own phase timings for this sync
+            with open('run_metrics.json', 'r', encoding='utf-8') as f:
+                run_metrics_report = json.load(f)
+            phase['app_phases'] = {span_name: span['self_seconds'] for span_name, span in run_metrics_report['phases'].items()}
+            phase['app_counters'] = run_metrics_report.get('counters', {})
+        writes = sum(count for endpoint, count in phase['requests'].items()
+                     if endpoint.split(' ')[0] in ('calendar.insert', 'calendar.update', 'calendar.patch', 'calendar.delete'))
+        phase['calendar_writes'] = writes
+        phase['events_per_second'] = round(phase['calendar_events'] / phase['seconds'], 2) if phase['seconds'] else None
+        phase['writes_per_second'] = round(writes / phase['seconds'], 2) if phase['seconds'] else None
+
+    with open(spec['result_path'], 'w', encoding='utf-8') as f:
+        json.dump(phases, f, indent=4)
+
+
+# ---------------------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------------------
+
+def write_scratch_config(workdir, services_url, backend, horizon, locations, use_schedule_cache, write_mode):
+    """Writes config.json and a never-expiring OAuth token into the scratch directory."""
+    with open(os.path.join(REPO_ROOT, 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    muwaqqit_query = urllib.parse.urlparse(config.get('muwaqqit_base_url', '')).query
+    device = locations[0]
+    config.update({
+        'calendar_id': 'bench-1@example.com',
+        'target_timezone': device['timezone'],
+        'user_location_address': 'Benchmark City',
+        'location_check_enabled': True,
+        'prayer_time_backend': backend,
+        'muwaqqit_base_url': f"{services_url}/index?{muwaqqit_query}",
+        'processing_days_in_advance': horizon,
+        'calendar_write_mode': write_mode,
+        'fleet_profiles': [{'name': f"Location {index + 1}", 'calendar_id': f"bench-{index + 1}@example.com",
+                            'location': {'latitude': location['latitude'], 'longitude': location['longitude'],
+                                         'timezone': location['timezone']}}
+                           for index, location in enumerate(locations)] if len(locations) > 1 else [],
+    })
+    config['geolocation'] = dict(config.get('geolocation', {}), ip_url=f"{services_url}/ip", geo_url=f"{services_url}/geo/{{ip}}",
+                                 cache_path='geolocation_cache.json')
+    config['schedule_cache'] = dict(config.get('schedule_cache', {}), enabled=use_schedule_cache, path='schedule_cache.sqlite3')
+    config['calendar_mirror'] = dict(config.get('calendar_mirror', {}), path='calendar_mirror.json')
+    config['google_auth'] = dict(config.get('google_auth', {}), token_path='token.json', credentials_path='credentials.json',
+                                 api_root_url=f"{services_url}/")
+    with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4)
+    with open(os.path.join(workdir, 'state.json'), 'w', encoding='utf-8') as f:
+        json.dump({'last_checked_ip': '', 'last_checked_latitude': None, 'last_checked_longitude': None,
+                   'last_checked_timezone': device['timezone']}, f, indent=4)
+
+    from google.oauth2.credentials import Credentials
+    expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=365) # google-auth expects naive UTC
+    with open(os.path.join(workdir, 'token.json'), 'wb') as f:
+        pickle.dump(Credentials(token='bench-token', expiry=expiry), f)
+
+
+def run_combination(services, args, horizon, location_count):
+    """Runs one (horizon, location count) benchmark in a fresh process. Returns its result dict."""
+    urllib.request.urlopen(urllib.request.Request(f"{services.url}/_bench/reset", method='POST'), timeout=10).close()
+    locations = bench_locations(location_count)
+    services.device_location = (locations[0]['latitude'], locations[0]['longitude'], locations[0]['timezone'])
+    workdir = tempfile.mkdtemp(prefix='prayer_bench_')
+    try:
+        write_scratch_config(workdir, services.url, args.backend, horizon, locations, args.schedule_cache, args.write_mode)
+        spec = {'services_url': services.url, 'horizon': horizon, 'locations': locations,
+                'result_path': os.path.join(workdir, 'phases.json')}
+        spec_path = os.path.join(workdir, 'bench_spec.json')
+        with open(spec_path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f)
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])),
+                   PYTHONIOENCODING='utf-8')
+        log_path = os.path.join(workdir, 'run.log')
+        with open(log_path, 'w', encoding='utf-8') as log:
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', spec_path], cwd=workdir, env=env,
+                                       stdout=None if args.verbose else log, stderr=subprocess.STDOUT if not args.verbose else None)
+        if completed.returncode != 0 or not os.path.exists(spec['result_path']):
+            with open(log_path, 'r', encoding='utf-8') as log:
+                tail = log.read()[-3000:]
+            return {'horizon': horizon, 'locations': location_count, 'error': f"worker exited with {completed.returncode}", 'log_tail': tail}
+        with open(spec['result_path'], 'r', encoding='utf-8') as f:
+            phases = json.load(f)
+        return {'horizon': horizon, 'locations': location_count, 'phases': phases}
+    finally:
+        if args.keep_workdirs:
+            print(f"Kept scratch directory {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_run(run):
+    label = f"horizon {run['horizon']:>3} day(s), {run['locations']} location(s)"
+    if 'error' in run:
+        print(f"{label}: FAILED ({run['error']})\n{run['log_tail']}")
+        return
+    print(label)
+    for name, phase in run['phases'].items():
+        line = f"  {name:<10} {phase['seconds'] * 1000:9.1f} ms   peak RSS {phase['peak_rss_mb']} MB"
+        if name == 'fetch':
+            line += (f"   {phase['days_per_second']} day(s)/s, p50 {phase['latency_ms']['p50']} ms, "
+                     f"p95 {phase['latency_ms']['p95']} ms, {phase['failures']} failure(s)")
+        elif name.startswith('sync'):
+            line += (f"   {phase['events_per_second']} event(s)/s, {phase['calendar_writes']} write(s)"
+                     f"{'' if phase['ok'] else ', NOT OK'}")
+        print(line)
+        if phase['requests'] and name != 'import':
+            print("             calls: " + ", ".join(f"{endpoint} x{count}" for endpoint, count in phase['requests'].items()))
+
+
+def print_comparison(results, baseline):
+    """Prints each phase's latency against the matching run of a baseline results file."""
+    baseline_runs = {(run['horizon'], run['locations']): run for run in baseline.get('runs', []) if 'phases' in run}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('started_at')}):")
+    for run in results['runs']:
+        previous = baseline_runs.get((run['horizon'], run['locations']))
+        if 'phases' not in run or previous is None:
+            continue
+        for name, phase in run['phases'].items():
+            before = previous['phases'].get(name)
+            if not before or not before['seconds']:
+                continue
+            change = (phase['seconds'] - before['seconds']) / before['seconds'] * 100
+            print(f"  horizon {run['horizon']:>3}, {run['locations']} location(s), {name:<10} "
+                  f"{before['seconds'] * 1000:9.1f} -> {phase['seconds'] * 1000:9.1f} ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against local stand-ins for muwaqqit.com and Google Calendar.")
+    parser.add_argument('--worker', metavar='SPEC', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', choices=('http', 'local', 'selenium'), default='http',
+                        help="prayer_time_backend to benchmark (selenium needs a local browser).")
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(DEFAULT_HORIZONS), help="Days in advance to sync.")
+    parser.add_argument('--locations', type=int, nargs='+', default=list(DEFAULT_LOCATION_COUNTS),
+                        help="Location counts; more than one runs fleet mode with one calendar per location.")
+    parser.add_argument('--recorded-pages', metavar='DIR', help="Serve these recorded muwaqqit results pages instead of rendered ones.")
+    parser.add_argument('--muwaqqit-latency-ms', type=float, default=0, help="Added delay per results page.")
+    parser.add_argument('--api-latency-ms', type=float, default=0, help="Added delay per Calendar API HTTP request.")
+    parser.add_argument('--api-quota-per-second', type=float, default=0,
+                        help="Calendar API calls per second the fake allows before rate-limiting them (default: unlimited).")
+    parser.add_argument('--schedule-cache', action='store_true', help="Keep the schedule cache enabled (off by default so every phase does real work).")
+    parser.add_argument('--write-mode', choices=('reconcile', 'upsert'), default='reconcile',
+                        help="calendar_write_mode of the synced app (default: reconcile).")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/e2e_<commit>_<time>.json).")
+    parser.add_argument('--compare', metavar='RESULTS', help="An earlier results file to compare against.")
+    parser.add_argument('--keep-workdirs', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show the app's output instead of capturing it.")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        with open(args.worker, 'r', encoding='utf-8') as f:
+            run_worker(json.load(f))
+        return 0
+
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT) # The page renderer reads the repo's config.json
+    from fake_services import FakeServices
+
+    commit, dirty = git_commit()
+    results = {'benchmark': 'e2e', 'commit': commit, 'dirty': dirty, 'started_at': datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'platform': platform.platform(),
+               'settings': {'backend': args.backend, 'recorded_pages': bool(args.recorded_pages), 'schedule_cache': args.schedule_cache,
+                            'write_mode': args.write_mode,
+                            'muwaqqit_latency_ms': args.muwaqqit_latency_ms, 'api_latency_ms': args.api_latency_ms,
+                            'api_quota_per_second': args.api_quota_per_second},
+               'runs': []}
+    with FakeServices(recorded_pages_dir=args.recorded_pages, muwaqqit_latency_ms=args.muwaqqit_latency_ms,
+                      api_latency_ms=args.api_latency_ms, api_quota_per_second=args.api_quota_per_second) as services:
+        print(f"Fake services on {services.url}; backend '{args.backend}'.")
+        for horizon in args.horizons:
+            for location_count in args.locations:
+                run = run_combination(services, args, horizon, location_count)
+                results['runs'].append(run)
+                print_run(run)
+
+    output_path = args.output or os.path.join(
+        RESULTS_DIR, f"e2e_{commit or 'unknown'}{'-dirty' if dirty else ''}_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults saved to {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(results, json.load(f))
+    return 1 if any('error' in run for run in results['runs']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- END OF FILE benchmarks/bench_e2e.py ---
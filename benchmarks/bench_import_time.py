@@ -0,0 +1,103 @@
+# --- START OF FILE benchmarks/bench_import_time.py ---
+
+"""
+Measures how long it takes to import the app's entry point in a fresh interpreter.
+
+Each run starts a new Python process (so nothing is cached in sys.modules) that imports
+the module and reports the elapsed time. The slowest imports are listed from
+'python -X importtime', and the script exits with status 1 if the median exceeds the budget,
+so it can guard startup time in CI.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --module scrape_prayer_times --runs 20 --budget 0.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULE = 'prayer_calendar_manager'
+DEFAULT_RUNS = 10
+DEFAULT_BUDGET_SECONDS = 0.5
+# Imported lazily by design; if one of these shows up at import time, a deferred import regressed.
+HEAVY_MODULES = ('selenium.webdriver', 'webdriver_manager', 'googleapiclient.discovery',
+                 'google_auth_oauthlib', 'geopy', 'numpy')
+
+_TIMING_SNIPPET = (
+    "import sys, time, json\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))\n"
+)
+
+
+def time_import(module):
+    """Imports 'module' in a fresh interpreter; returns (seconds, heavy modules loaded)."""
+    result = subprocess.run(
+        [sys.executable, '-c', _TIMING_SNIPPET.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data['seconds'], data['heavy']
+
+
+def slowest_imports(module, limit=10):
+    """Returns [(cumulative microseconds, module name)] for the slowest imports, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # Format: "import time:  <self us> | <cumulative us> | <indented module name>"
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the import time of the app's entry point.")
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help="Maximum median import time in seconds.")
+    parser.add_argument('--json', dest='json_path', help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    time_import(args.module) # Warm-up: populates __pycache__ and the OS file cache
+    timings = []
+    heavy_loaded = set()
+    for _ in range(args.runs):
+        seconds, heavy = time_import(args.module)
+        timings.append(seconds)
+        heavy_loaded.update(heavy)
+
+    median = statistics.median(timings)
+    print(f"import {args.module}: median {median * 1000:.1f} ms, min {min(timings) * 1000:.1f} ms, "
+          f"max {max(timings) * 1000:.1f} ms over {args.runs} run(s) (budget {args.budget * 1000:.0f} ms)")
+    print("Slowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports(args.module):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    if heavy_loaded:
+        print(f"Warning: heavy modules loaded at import time: {', '.join(sorted(heavy_loaded))}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'module': args.module, 'runs': args.runs, 'median_seconds': median, 'timings_seconds': timings,
+                       'budget_seconds': args.budget, 'heavy_modules_loaded': sorted(heavy_loaded)}, f, indent=4)
+
+    if median > args.budget:
+        print(f"FAIL: median import time exceeds the {args.budget}s budget.")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- END OF FILE benchmarks/bench_import_time.py ---
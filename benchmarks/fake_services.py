@@ -0,0 +1,471 @@
+# --- START OF FILE benchmarks/fake_services.py ---
+
+"""
+Local stand-ins for the services the app talks to, for the end-to-end benchmarks.
+
+One threaded HTTP server answers:
+
+    GET  /index?...                               muwaqqit.com results pages
+    GET  /ip, GET /geo/<ip>                       ipify / ip-api.com style geolocation
+    *    /calendar/v3/calendars/<id>/events[/<id>] Calendar v3 events: list, get, insert, update, patch, delete
+    POST /batch/calendar/v3                       Calendar batch requests (multipart/mixed)
+    GET  /_bench/stats, POST /_bench/reset        Request counters for the benchmark driver
+
+Results pages are either recorded pages from a directory (served round-robin) or pages
+rendered in muwaqqit's results-table layout from the local prayer engine, so the HTTP
+backend parses them exactly like the real site's.
+"""
+
+import email.parser
+import json
+import os
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CALENDAR_PREFIX = '/calendar/v3/calendars/'
+BATCH_PATH = '/batch/calendar/v3'
+DEFAULT_DEVICE_IP = '203.0.113.10' # TEST-NET-3, never a real address
+DEFAULT_DEVICE_LOCATION = (-33.8688, 151.2093, 'Australia/Sydney')
+
+
+class CalendarApiError(Exception):
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+def _parse_rfc3339(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _event_bounds(event):
+    start = event.get('start', {}).get('dateTime') or event.get('start', {}).get('date')
+    end = event.get('end', {}).get('dateTime') or event.get('end', {}).get('date')
+    return _parse_rfc3339(start), _parse_rfc3339(end)
+
+
+class FakeCalendarStore:
+    """
+    In-memory Calendar v3 events, with the behaviour the app relies on: time-window and
+    privateExtendedProperty filters, paging, sync tokens (deletes show up as cancelled
+    events), 404/409/410 errors and client-supplied event IDs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calendars = {} # calendar_id -> {event_id: event}
+        self.sequence = 0 # Bumped on every change; sync tokens are sequence numbers
+
+    def reset(self):
+        with self._lock:
+            self.calendars = {}
+            self.sequence = 0
+
+    def event_count(self):
+        with self._lock:
+            return sum(1 for events in self.calendars.values() for event in events.values() if event['status'] != 'cancelled')
+
+    def _touch(self, event):
+        self.sequence += 1
+        event['_sequence'] = self.sequence
+        event['etag'] = f'"{self.sequence}"'
+        event['updated'] = datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+        return event
+
+    @staticmethod
+    def _public(event):
+        return {key: value for key, value in event.items() if not key.startswith('_')}
+
+    def insert(self, calendar_id, body):
+        with self._lock:
+            events = self.calendars.setdefault(calendar_id, {})
+            event_id = body.get('id') or uuid.uuid4().hex
+            if event_id in events and events[event_id]['status'] != 'cancelled':
+                raise CalendarApiError(409, 'duplicate', 'The requested identifier already exists.')
+            event = dict(body, id=event_id, status=body.get('status', 'confirmed'),
+                         htmlLink=f"https://calendar.example.invalid/event?eid={event_id}")
+            events[event_id] = self._touch(event)
+            return self._public(event)
+
+    def _existing(self, calendar_id, event_id):
+        event = self.calendars.get(calendar_id, {}).get(event_id)
+        if event is None:
+            raise CalendarApiError(404, 'notFound', 'Not Found')
+        return event
+
+    def get(self, calendar_id, event_id):
+        with self._lock:
+            return self._public(self._existing(calendar_id, event_id))
+
+    def update(self, calendar_id, event_id, body, merge=False):
+        with self._lock:
+            existing = self._existing(calendar_id, event_id)
+            event = dict(existing, **body) if merge else dict(body)
+            event.update(id=event_id, htmlLink=existing['htmlLink'], status=event.get('status', 'confirmed'))
+            self.calendars[calendar_id][event_id] = self._touch(event)
+            return self._public(event)
+
+    def delete(self, calendar_id, event_id):
+        with self._lock:
+            event = self._existing(calendar_id, event_id)
+            if event['status'] == 'cancelled':
+                raise CalendarApiError(410, 'deleted', 'Resource has been deleted')
+            event['status'] = 'cancelled'
+            self._touch(event)
+
+    def list(self, calendar_id, query):
+        def param(name, default=None):
+            return query.get(name, [default])[0]
+
+        with self._lock:
+            events = sorted(self.calendars.get(calendar_id, {}).values(), key=lambda event: event['_sequence'])
+            sync_token = param('syncToken')
+            if sync_token is not None:
+                if not sync_token.isdigit() or int(sync_token) > self.sequence:
+                    raise CalendarApiError(410, 'fullSyncRequired', 'Sync token is no longer valid, a full sync is required.')
+                matches = [event if event['status'] != 'cancelled' else {'id': event['id'], 'status': 'cancelled'}
+                           for event in events if event['_sequence'] > int(sync_token)]
+            else:
+                show_deleted = param('showDeleted', 'false') == 'true'
+                time_min = param('timeMin')
+                time_max = param('timeMax')
+                wanted_properties = [item.split('=', 1) for item in query.get('privateExtendedProperty', [])]
+                matches = []
+                for event in events:
+                    if event['status'] == 'cancelled' and not show_deleted:
+                        continue
+                    start, end = _event_bounds(event)
+                    if (time_min and end <= _parse_rfc3339(time_min)) or (time_max and start >= _parse_rfc3339(time_max)):
+                        continue
+                    private = event.get('extendedProperties', {}).get('private', {})
+                    if any(private.get(key) != value for key, value in wanted_properties):
+                        continue
+                    matches.append(event)
+                matches.sort(key=lambda event: _event_bounds(event)[0])
+            current_sequence = self.sequence
+
+        offset = int(param('pageToken') or 0)
+        page_size = max(1, min(int(param('maxResults', 250)), 2500))
+        page = matches[offset:offset + page_size]
+        result = {'kind': 'calendar#events', 'items': [self._public(event) for event in page]}
+        if offset + page_size < len(matches):
+            result['nextPageToken'] = str(offset + page_size)
+        else:
+            result['nextSyncToken'] = str(current_sequence)
+        return result
+
+    def handle(self, method, path, query, body):
+        """Dispatches one Calendar API call. Returns (status, JSON-serializable response or None)."""
+        parts = [urllib.parse.unquote(part) for part in path[len(CALENDAR_PREFIX):].split('/')]
+        if len(parts) < 2 or parts[1] != 'events':
+            raise CalendarApiError(404, 'notFound', f'Unsupported path {path}')
+        calendar_id = parts[0]
+        event_id = parts[2] if len(parts) > 2 else None
+        if event_id is None and method == 'GET':
+            return 200, self.list(calendar_id, query)
+        if event_id is None and method == 'POST':
+            return 200, self.insert(calendar_id, body or {})
+        if event_id is not None and method == 'GET':
+            return 200, self.get(calendar_id, event_id)
+        if event_id is not None and method in ('PUT', 'PATCH'):
+            return 200, self.update(calendar_id, event_id, body or {}, merge=(method == 'PATCH'))
+        if event_id is not None and method == 'DELETE':
+            self.delete(calendar_id, event_id)
+            return 204, None
+        raise CalendarApiError(405, 'methodNotAllowed', f'{method} is not supported on {path}')
+
+
+class MuwaqqitPages:
+    """Produces results pages: recorded ones if a directory is given, otherwise rendered ones."""
+
+    def __init__(self, recorded_pages_dir=None, default_location=DEFAULT_DEVICE_LOCATION):
+        self.default_location = default_location
+        self.recorded_pages = []
+        if recorded_pages_dir:
+            for name in sorted(os.listdir(recorded_pages_dir)):
+                if name.endswith(('.html', '.htm')):
+                    with open(os.path.join(recorded_pages_dir, name), 'r', encoding='utf-8') as f:
+                        self.recorded_pages.append(f.read())
+            if not self.recorded_pages:
+                raise ValueError(f"No .html pages found in '{recorded_pages_dir}'.")
+        self._served = 0
+        self._lock = threading.Lock()
+
+    def page(self, request_url):
+        if self.recorded_pages:
+            with self._lock:
+                self._served += 1
+                return self.recorded_pages[(self._served - 1) % len(self.recorded_pages)]
+        return self.render(request_url)
+
+    def render(self, request_url):
+        from config_loader import get_config
+        from local_prayer_engine import LABEL_CALCULATIONS, compute_label_times, parse_muwaqqit_params
+        from prayer_schedule import schedule_labels
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(request_url).query)
+        latitude, longitude, timezone_str = self.default_location
+        if 'lt' in query and 'ln' in query:
+            latitude, longitude = float(query['lt'][0]), float(query['ln'][0])
+        timezone_str = query.get('tz', [timezone_str])[0]
+        base_date = datetime.strptime(query['d'][0], '%Y-%m-%d').date() if 'd' in query else datetime.now().date()
+        # The configured labels are spelled exactly as the real page spells them.
+        labels = set(LABEL_CALCULATIONS) | schedule_labels(get_config().get('prayer_definitions'))
+        label_times = compute_label_times(base_date, latitude, longitude, timezone_str, labels, parse_muwaqqit_params(request_url))
+        rows = []
+        for label, (time_str, date_offset) in sorted(label_times.items(), key=lambda item: (item[1][1], item[1][0])):
+            marker = {1: ' ▲', -1: ' ▼'}.get(date_offset, '')
+            row_date = base_date + timedelta(days=date_offset)
+            rows.append(f"<tr><td><b>{label}</b></td><td>{time_str}</td><td>{row_date.isoformat()}{marker}</td></tr>")
+        return ("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Muwaqqit</title></head><body>"
+                "<div class=\"container\"><div id=\"results\"><table class=\"table\"><tbody>"
+                + "".join(rows) + "</tbody></table></div></div></body></html>")
+
+
+def _error_body(error):
+    return {'error': {'code': error.status, 'message': str(error), 'errors': [{'reason': error.reason, 'message': str(error)}]}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real services
+    server_version = 'FakeServices/1.0'
+    disable_nagle_algorithm = True # Headers and body are written separately; don't let them wait on delayed ACKs
+
+    def log_message(self, format, *args):
+        pass # The benchmark's output stays readable
+
+    def _send(self, status, body=b'', content_type='application/json; charset=UTF-8'):
+        self.send_response(status)
+        if status != 204:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, b'' if payload is None else json.dumps(payload).encode('utf-8'))
+
+    def _send_json_retry_after(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(429)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _dispatch(self, method):
+        services = self.server.services
+        started = time.perf_counter()
+        parsed = urllib.parse.urlparse(self.path)
+        endpoint = 'other'
+        try:
+            if parsed.path == '/index' and method == 'GET':
+                endpoint = 'muwaqqit'
+                services.delay(services.muwaqqit_latency_seconds)
+                self._send(200, services.pages.page(self.path).encode('utf-8'), 'text/html; charset=utf-8')
+            elif parsed.path == '/ip':
+                endpoint = 'ip'
+                self._send_json(200, {'ip': services.device_ip})
+            elif parsed.path.startswith('/geo/'):
+                endpoint = 'geo'
+                latitude, longitude, timezone_str = services.device_location
+                self._send_json(200, {'status': 'success', 'query': parsed.path[len('/geo/'):],
+                                      'lat': latitude, 'lon': longitude, 'timezone': timezone_str})
+            elif parsed.path == BATCH_PATH and method == 'POST':
+                endpoint = 'calendar.batch'
+                services.delay(services.api_latency_seconds)
+                self._handle_batch()
+            elif parsed.path.startswith(CALENDAR_PREFIX):
+                endpoint = 'calendar.' + services.calendar_call_name(method, parsed.path)
+                services.delay(services.api_latency_seconds)
+                body = self._read_body()
+                try:
+                    if not services.take_quota():
+                        endpoint = 'calendar.rate_limited'
+                        raise CalendarApiError(429, 'rateLimitExceeded', 'Rate Limit Exceeded')
+                    status, payload = services.calendar.handle(method, parsed.path, urllib.parse.parse_qs(parsed.query),
+                                                               json.loads(body) if body else None)
+                except CalendarApiError as e:
+                    status, payload = e.status, _error_body(e)
+                if status == 429:
+                    self._send_json_retry_after(payload)
+                else:
+                    self._send_json(status, payload)
+            elif parsed.path == '/_bench/stats':
+                endpoint = 'bench'
+                self._send_json(200, services.stats())
+            elif parsed.path == '/_bench/reset' and method == 'POST':
+                endpoint = 'bench'
+                services.reset()
+                self._send_json(200, {'reset': True})
+            else:
+                self._send_json(404, {'error': {'code': 404, 'message': f'No fake for {method} {parsed.path}'}})
+        finally:
+            if endpoint != 'bench':
+                services.record(endpoint, time.perf_counter() - started)
+
+    def _handle_batch(self):
+        services = self.server.services
+        content_type = self.headers.get('Content-Type', '')
+        message = email.parser.BytesFeedParser()
+        message.feed(f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + self._read_body())
+        parts = message.close().get_payload()
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        for part in parts:
+            payload = part.get_payload()
+            request_line, _, rest = payload.partition('\n')
+            method, target, _ = request_line.strip().split(' ', 2)
+            separator = '\r\n\r\n' if '\r\n\r\n' in rest else '\n\n'
+            _, _, body = rest.partition(separator)
+            parsed = urllib.parse.urlparse(target)
+            services.record('calendar.' + services.calendar_call_name(method, parsed.path) + ' (batched)', 0.0)
+            try:
+                if not services.take_quota(): # Like Google, every sub-request counts against the quota
+                    services.record('calendar.rate_limited (batched)', 0.0)
+                    raise CalendarApiError(403, 'rateLimitExceeded', 'Rate Limit Exceeded')
+                status, response = services.calendar.handle(method, parsed.path, urllib.parse.parse_qs(parsed.query),
+                                                             json.loads(body) if body.strip() else None)
+            except CalendarApiError as e:
+                status, response = e.status, _error_body(e)
+            response_text = '' if response is None else json.dumps(response)
+            content_id = part['Content-ID'].strip('<>')
+            chunks.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                          f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\nContent-Type: application/json; charset=UTF-8\r\n"
+                          f"Content-Length: {len(response_text.encode('utf-8'))}\r\n\r\n{response_text}\r\n")
+        body = ''.join(chunks) + f"--{boundary}--\r\n"
+        self._send(200, body.encode('utf-8'), f'multipart/mixed; boundary={boundary}')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class FakeServices:
+    """
+    Runs the stand-in services on 127.0.0.1 in a background thread.
+
+    Usage:
+        with FakeServices() as services:
+            services.url  # e.g. http://127.0.0.1:54321
+    """
+
+    def __init__(self, port=0, recorded_pages_dir=None, muwaqqit_latency_ms=0, api_latency_ms=0,
+                 device_ip=DEFAULT_DEVICE_IP, device_location=DEFAULT_DEVICE_LOCATION, api_quota_per_second=0):
+        self.calendar = FakeCalendarStore()
+        self.pages = MuwaqqitPages(recorded_pages_dir, device_location)
+        self.muwaqqit_latency_seconds = muwaqqit_latency_ms / 1000.0
+        self.api_latency_seconds = api_latency_ms / 1000.0
+        self.device_ip = device_ip
+        self.device_location = device_location
+        # Calendar API calls per second (batched sub-requests count one each) before calls are
+        # rejected as rate limited, like Google's per-user quota. 0 means unlimited.
+        self.api_quota_per_second = api_quota_per_second
+        self._quota_tokens = float(api_quota_per_second)
+        self._quota_updated = time.monotonic()
+        self._stats_lock = threading.Lock()
+        self._requests = {} # endpoint -> [count, total server seconds]
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def delay(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def calendar_call_name(method, path):
+        has_event_id = len(path[len(CALENDAR_PREFIX):].split('/')) > 2
+        if not has_event_id:
+            return {'GET': 'list', 'POST': 'insert'}.get(method, method.lower())
+        return {'GET': 'get', 'PUT': 'update', 'PATCH': 'patch', 'DELETE': 'delete'}.get(method, method.lower())
+
+    def take_quota(self):
+        """Spends one unit of the Calendar API quota. Returns False if the call is over the quota."""
+        if not self.api_quota_per_second:
+            return True
+        with self._stats_lock:
+            now = time.monotonic()
+            self._quota_tokens = min(self.api_quota_per_second,
+                                     self._quota_tokens + (now - self._quota_updated) * self.api_quota_per_second)
+            self._quota_updated = now
+            if self._quota_tokens < 1:
+                return False
+            self._quota_tokens -= 1
+            return True
+
+    def record(self, endpoint, seconds):
+        with self._stats_lock:
+            entry = self._requests.setdefault(endpoint, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def stats(self):
+        with self._stats_lock:
+            requests = {endpoint: {'count': count, 'server_seconds': round(seconds, 6)}
+                        for endpoint, (count, seconds) in sorted(self._requests.items())}
+        return {'requests': requests, 'calendar_events': self.calendar.event_count()}
+
+    def reset(self):
+        self.calendar.reset()
+        with self._stats_lock:
+            self._requests = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    with FakeServices(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765) as services:
+        print(f"Fake muwaqqit, geolocation and Calendar API serving on {services.url} (Ctrl+C to stop).")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+# --- END OF FILE benchmarks/fake_services.py ---
@@ -0,0 +1,152 @@
+# --- START OF FILE calendar_batch.py ---
+
+from googleapiclient.errors import HttpError
+from rate_limiter import get_rate_limiter, http_status, is_retryable
+from run_metrics import span, increment
+
+# The Calendar API accepts up to 1000 calls per batch, but Google recommends staying at or
+# below 50 to avoid rate-limit errors on the individual sub-requests.
+CALENDAR_BATCH_LIMIT = 50
+
+
+def fallback_on_status(statuses, make_request):
+    """
+    Returns a fallback for CalendarWriteBatch.add(): when a write fails with one of 'statuses',
+    make_request() builds the request sent in its place (e.g. an insert when an update is 404).
+    """
+    def fallback(exception):
+        return make_request() if http_status(exception) in statuses else None
+    return fallback
+
+
+class CalendarWriteBatch:
+    """
+    Collects Calendar API write requests and sends them as batch HTTP requests.
+
+    Each queued request carries a label (e.g. ("Fajr", "2025-01-01", "create")) so its
+    result or error can be reported against the prayer and date it belongs to. A request may
+    have a fallback that replaces it after an expected error (see fallback_on_status());
+    fallback requests are sent in a further batch. Batches are paced by the shared
+    CalendarRateLimiter, and sub-requests that fail with a retryable error (rate limiting,
+    5xx, network) are sent again in a later batch after backing off, up to its max_retries.
+    """
+
+    def __init__(self, service, batch_size=CALENDAR_BATCH_LIMIT, on_any_success=None, rate_limiter=None):
+        """
+        Args:
+            service: Authenticated Calendar API service.
+            batch_size (int): Requests per batch call, capped at CALENDAR_BATCH_LIMIT.
+            on_any_success (callable, optional): Called with every successful write's response,
+                e.g. to keep a local mirror of the calendar current.
+            rate_limiter (CalendarRateLimiter, optional): Defaults to the process-wide limiter.
+        """
+        self.service = service
+        self.on_any_success = on_any_success
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.batch_size = max(1, min(batch_size, CALENDAR_BATCH_LIMIT))
+        self.pending = [] # (request, label, on_success, fallback, attempt)
+        self.results = {} # label -> API response for successful writes
+        self.errors = {} # label -> exception for writes that failed for good
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, request, label, on_success=None, fallback=None):
+        """
+        Queues a googleapiclient HttpRequest (not yet executed).
+
+        Args:
+            request: e.g. service.events().insert(calendarId=..., body=...).
+            label (tuple): Identifies the write in logs and in results/errors.
+            on_success (callable, optional): Called with the API response when the write succeeds.
+            fallback (callable, optional): Called with the exception if the write fails; returns
+                the request to send instead, or None to treat the failure as an error.
+        """
+        self.pending.append((request, label, on_success, fallback, 0))
+
+    def _record_success(self, label, response, on_success):
+        self.results[label] = response
+        self.errors.pop(label, None)
+        if on_success:
+            on_success(response)
+        if self.on_any_success:
+            self.on_any_success(response)
+
+    def _record_failure(self, item, exception, next_round, retries):
+        """Queues a fallback or a retry for a failed write, or records it as an error."""
+        request, label, on_success, fallback, attempt = item
+        replacement = fallback(exception) if fallback else None
+        if replacement is not None:
+            increment('calendar.write_fallbacks')
+            next_round.append((replacement, label, on_success, None, 0))
+        elif is_retryable(exception) and attempt < self.rate_limiter.max_retries:
+            retries.append(((request, label, on_success, fallback, attempt + 1), exception))
+        else:
+            print(f"{'API' if isinstance(exception, HttpError) else 'Unexpected'} error on write {label}: {exception}")
+            self.errors[label] = exception
+
+    def _send_batches(self, items):
+        """Sends items in chunks of batch_size. Returns the items to send in the next round."""
+        increment('calendar.writes', len(items))
+        next_round = []
+        retries = [] # (item, exception)
+        chunks = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        print(f"Sending {len(items)} calendar write(s) in {len(chunks)} batch request(s)...")
+
+        for chunk in chunks:
+            chunk_by_id = {str(index): item for index, item in enumerate(chunk)}
+            answered = set()
+
+            def callback(request_id, response, exception, chunk_by_id=chunk_by_id, answered=answered):
+                item = chunk_by_id[request_id]
+                answered.add(request_id)
+                if exception is None:
+                    self._record_success(item[1], response, item[2])
+                else:
+                    self._record_failure(item, exception, next_round, retries)
+
+            batch = self.service.new_batch_http_request(callback=callback)
+            for request_id, item in chunk_by_id.items():
+                batch.add(item[0], request_id=request_id)
+            self.rate_limiter.acquire(len(chunk)) # Every sub-request counts against the quota
+            try:
+                with span('calendar.write_batch'):
+                    batch.execute()
+            except Exception as e_batch:
+                # The whole batch call failed (e.g. network error); its unanswered items are retried.
+                print(f"Batch request failed: {e_batch}")
+                for request_id, item in chunk_by_id.items():
+                    if request_id not in answered:
+                        self._record_failure(item, e_batch, next_round, retries)
+
+        if retries:
+            delay = max(self.rate_limiter.back_off(item[4] - 1, exception) for item, exception in retries)
+            print(f"Retrying {len(retries)} write(s) after retryable errors (e.g. {retries[0][1]}) in {delay:.1f}s...")
+            next_round.extend(item for item, _ in retries)
+        return next_round
+
+    def execute(self, full_batches_only=False):
+        """
+        Sends every queued request in chunks of batch_size, then any fallback and retry rounds.
+
+        Args:
+            full_batches_only (bool): Send only as many requests as fill whole batches and keep
+                the rest queued, so writes queued a few at a time still go out in full batches.
+
+        Returns:
+            tuple: (number of successful writes, number of failed writes).
+        """
+        count = len(self.pending) - len(self.pending) % self.batch_size if full_batches_only else len(self.pending)
+        if not count:
+            return 0, 0
+        queued, self.pending = self.pending[:count], self.pending[count:]
+        to_send = queued
+        while to_send:
+            to_send = self._send_batches(to_send)
+
+        succeeded = sum(1 for item in queued if item[1] in self.results)
+        increment('calendar.write_failures', len(queued) - succeeded)
+        print(f"Calendar writes complete: {succeeded} succeeded, {len(queued) - succeeded} failed.")
+        return succeeded, len(queued) - succeeded
+
+# --- END OF FILE calendar_batch.py ---
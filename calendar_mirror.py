@@ -0,0 +1,163 @@
+# --- START OF FILE calendar_mirror.py ---
+
+import json
+import os
+from datetime import datetime, timedelta
+import pytz
+from googleapiclient.errors import HttpError
+from config_loader import write_json_atomically
+from rate_limiter import get_rate_limiter
+
+DEFAULT_MIRROR_PATH = 'calendar_mirror.json'
+MIRROR_FORMAT_VERSION = 2 # 2: events include their reminders
+# Events that ended more than this many days ago are dropped from the mirror to keep it small.
+MIRROR_RETENTION_DAYS = 2
+MIRROR_LIST_FIELDS = "nextPageToken,nextSyncToken,items(id,status,summary,description,start,end,reminders,extendedProperties,htmlLink)"
+
+
+class CalendarMirror:
+    """
+    Local, on-disk copy of the managed prayer events in one calendar, kept current with
+    Calendar API incremental sync (nextSyncToken / syncToken).
+
+    The first refresh does a full listing; later refreshes only download what changed since
+    the previous run. If the server rejects the sync token (HTTP 410 Gone), the mirror is
+    cleared and a full resync is done.
+    """
+
+    def __init__(self, path, calendar_id, is_managed_event):
+        """
+        Args:
+            path (str): JSON file the mirror is persisted to.
+            calendar_id (str): Calendar being mirrored; a mirror of another calendar is discarded.
+            is_managed_event (callable): Returns True for events this app manages. Only those are kept.
+        """
+        self.path = path
+        self.calendar_id = calendar_id
+        self.is_managed_event = is_managed_event
+        self.sync_token = None
+        self.events = {} # event id -> event resource
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read calendar mirror '{self.path}', doing a full sync: {e}")
+            return
+        if data.get('version') != MIRROR_FORMAT_VERSION or data.get('calendar_id') != self.calendar_id:
+            print("Calendar mirror is for another calendar or format; doing a full sync.")
+            return
+        self.sync_token = data.get('sync_token')
+        self.events = data.get('events', {})
+
+    def save(self):
+        """Writes the mirror atomically (temporary file + rename) if it changed."""
+        if not self.dirty:
+            return
+        data = {'version': MIRROR_FORMAT_VERSION, 'calendar_id': self.calendar_id,
+                'sync_token': self.sync_token, 'events': self.events}
+        try:
+            write_json_atomically(self.path, data, ensure_ascii=False)
+            self.dirty = False
+        except Exception as e:
+            print(f"Error saving calendar mirror to '{self.path}': {e}")
+
+    def apply(self, event):
+        """Applies one event resource (from a sync page or from one of our own writes) to the mirror."""
+        if not isinstance(event, dict):
+            return # e.g. the empty response of a delete
+        event_id = event.get('id')
+        if not event_id:
+            return
+        if event.get('status') == 'cancelled' or not self.is_managed_event(event):
+            if self.events.pop(event_id, None) is not None:
+                self.dirty = True
+            return
+        self.events[event_id] = event
+        self.dirty = True
+
+    def remove(self, event_id):
+        """Drops an event this app deleted."""
+        if self.events.pop(event_id, None) is not None:
+            self.dirty = True
+
+    def _prune(self):
+        cutoff = datetime.now(pytz.utc) - timedelta(days=MIRROR_RETENTION_DAYS)
+        for event_id, event in list(self.events.items()):
+            end_str = event.get('end', {}).get('dateTime')
+            try:
+                if end_str and datetime.fromisoformat(end_str) < cutoff:
+                    del self.events[event_id]
+                    self.dirty = True
+            except ValueError:
+                continue
+
+    def _list_pages(self, service, sync_token):
+        page_token = None
+        changed = 0
+        while True:
+            request_args = {'calendarId': self.calendar_id, 'singleEvents': True, 'maxResults': 2500,
+                            'pageToken': page_token, 'fields': MIRROR_LIST_FIELDS}
+            if sync_token:
+                request_args['syncToken'] = sync_token
+            else:
+                request_args['showDeleted'] = False
+            result = get_rate_limiter().execute(service.events().list(**request_args), label='calendar mirror listing')
+            for event in result.get('items', []):
+                self.apply(event)
+                changed += 1
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                self.sync_token = result.get('nextSyncToken')
+                self.dirty = True
+                return changed
+
+    def refresh(self, service):
+        """
+        Brings the mirror up to date, incrementally when a sync token is available.
+
+        Returns:
+            bool: True if the mirror is current, False if syncing failed (the caller should
+                  fall back to a regular listing).
+        """
+        try:
+            if self.sync_token:
+                try:
+                    changed = self._list_pages(service, self.sync_token)
+                    print(f"Calendar mirror refreshed incrementally ({changed} change(s)).")
+                except HttpError as e:
+                    if getattr(e, 'resp', None) is None or e.resp.status != 410:
+                        raise
+                    print("Calendar sync token expired (410 Gone). Doing a full resync of the calendar mirror.")
+                    self.sync_token = None
+                    self.events = {}
+                    self.dirty = True
+            if not self.sync_token:
+                changed = self._list_pages(service, None)
+                print(f"Calendar mirror fully synced ({len(self.events)} managed event(s) of {changed} listed).")
+            self._prune()
+            return True
+        except HttpError as e:
+            print(f"API error syncing calendar mirror: {e}")
+        except Exception as e:
+            print(f"Unexpected error syncing calendar mirror: {e}")
+        return False
+
+    def events_between(self, start_aware, end_aware):
+        """Returns mirrored events that start within [start_aware, end_aware)."""
+        selected = []
+        for event in self.events.values():
+            start_str = event.get('start', {}).get('dateTime')
+            try:
+                if start_str and start_aware <= datetime.fromisoformat(start_str) < end_aware:
+                    selected.append(event)
+            except ValueError:
+                continue
+        return selected
+
+# --- END OF FILE calendar_mirror.py ---
\ No newline at end of file
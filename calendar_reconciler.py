@@ -0,0 +1,482 @@
+# --- START OF FILE calendar_reconciler.py ---
+
+import base64
+import hashlib
+import json
+import sys
+import urllib.parse
+from datetime import datetime, timezone
+from config_loader import get_config
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the calendar reconciler: {e}")
+    sys.exit(1)
+
+CALENDAR_ID = config.get('calendar_id')
+EVENT_REMINDER_MINUTES = config.get('event_reminder_minutes', 0)
+MUWAQQIT_BASE_URL = config.get('muwaqqit_base_url') # Clean base URL (no location parameters), as used by the scraper
+
+# Keys of the extendedProperties.private tags on every event this app writes. Listings filter
+# on the managed flag server-side, and the content hash records what this app last wrote.
+MANAGED_PROPERTY = 'prayerCalendarManaged'
+PRAYER_PROPERTY = 'prayer'
+DATE_PROPERTY = 'date'
+HASH_PROPERTY = 'contentHash'
+MANAGED_EVENT_FILTER = f'{MANAGED_PROPERTY}=1' # privateExtendedProperty filter for events.list
+FINGERPRINTED_FIELDS = ('summary', 'start', 'end', 'reminders', 'description')
+DEFAULT_PROFILE_NAME = 'default' # Event ID namespace of the single-location sync (fleet profiles use their names)
+WRITTEN_EVENTS_STATE_KEY = 'written_events' # state.json: event id -> [start date, content hash] of what this app last wrote
+
+
+def deterministic_event_id(calendar_id, profile_name, date_str, prayer_name):
+    """
+    The Calendar event ID for one prayer on one day, the same on every run.
+
+    The API accepts client-chosen IDs of 5-1024 characters from base32hex ('0'-'9', 'a'-'v'),
+    so the ID is the lowercase base32hex encoding of a SHA-256 over the inputs.
+    """
+    digest = hashlib.sha256('\x1f'.join((calendar_id, profile_name, date_str, prayer_name)).encode('utf-8')).digest()
+    return base64.b32hexencode(digest).decode('ascii').rstrip('=').lower()
+
+
+def event_content_hash(body):
+    """Hash of the event fields this app writes, stable across runs and key order."""
+    content = {field: body.get(field) for field in FINGERPRINTED_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+def managed_event_tags(event):
+    """Returns the private tags of an event this app wrote, or None for any other event."""
+    private_properties = (event.get('extendedProperties') or {}).get('private') or {}
+    return private_properties if private_properties.get(MANAGED_PROPERTY) == '1' else None
+
+
+def is_managed_prayer_event(event, prayer_name_by_summary):
+    """
+    True for a tagged event of one of the managed prayers, or for an untagged event with a
+    managed summary (written before events were tagged, and adopted on the next update).
+    """
+    tags = managed_event_tags(event)
+    if tags is None:
+        return event.get('summary', '') in prayer_name_by_summary
+    return tags.get(PRAYER_PROPERTY) in prayer_name_by_summary.values()
+
+
+def prayer_event_key(event, target_tz_obj, prayer_name_by_summary):
+    """
+    Returns the ('YYYY-MM-DD' start date, prayer_name) key of a managed event, or None.
+
+    Tagged events carry both in their private tags; untagged ones are matched by summary
+    and their start time is converted to target_tz_obj.
+    """
+    tags = managed_event_tags(event)
+    if tags is not None:
+        prayer_name, start_date_str = tags.get(PRAYER_PROPERTY), tags.get(DATE_PROPERTY)
+        if prayer_name not in prayer_name_by_summary.values() or not start_date_str:
+            return None
+        return (start_date_str, prayer_name)
+    prayer_name = prayer_name_by_summary.get(event.get('summary', ''))
+    start_str = event.get('start', {}).get('dateTime')
+    if prayer_name is None or not start_str:
+        return None
+    try:
+        return (datetime.fromisoformat(start_str).astimezone(target_tz_obj).strftime('%Y-%m-%d'), prayer_name)
+    except ValueError:
+        return None
+
+
+def build_prayer_event_body(prayer_name, start_dt_aware, end_dt_aware, date_str_for_desc_url, target_tz_obj, location_data_for_description):
+    """
+    Builds the Google Calendar event resource for one prayer.
+
+    The description links to the muwaqqit.com page for the same location and date. The
+    event is tagged (extendedProperties.private) with the managed flag, the prayer, its
+    start date and a hash of the other fields, see event_content_hash().
+    """
+    url_params_desc = []
+    loc_display_name = "configured location" # Fallback display name
+    loc_tz = target_tz_obj.zone
+
+    if location_data_for_description:
+        loc_tz = location_data_for_description.get("timezone", target_tz_obj.zone) # Fallback to event's timezone
+        if "latitude" in location_data_for_description and "longitude" in location_data_for_description:
+            lat = location_data_for_description["latitude"]
+            lon = location_data_for_description["longitude"]
+            url_params_desc.append(f"lt={lat}")
+            url_params_desc.append(f"ln={lon}")
+            url_params_desc.append(f"tz={urllib.parse.quote_plus(loc_tz)}")
+            loc_display_name = f"Lat {lat}, Lon {lon}"
+        elif "address" in location_data_for_description:
+            address = location_data_for_description["address"]
+            url_params_desc.append(f"add={urllib.parse.quote_plus(address)}")
+            url_params_desc.append(f"tz={urllib.parse.quote_plus(loc_tz)}")
+            loc_display_name = address
+        # If neither, it will just be the base URL + date
+
+    url_params_desc.append(f"d={date_str_for_desc_url}")
+    dynamic_muwaqqit_url = f"{MUWAQQIT_BASE_URL}&{'&'.join(url_params_desc)}"
+
+    event_description = (
+        f"Time for {prayer_name} prayer.\n"
+        f"Prayer times calculated for location: {loc_display_name} (Timezone: {loc_tz})\n"
+        f"URL for this day's times: {dynamic_muwaqqit_url}"
+    )
+
+    body = {
+        'summary': f'{prayer_name} Prayer',
+        'start': {'dateTime': start_dt_aware.isoformat(), 'timeZone': target_tz_obj.zone},
+        'end': {'dateTime': end_dt_aware.isoformat(), 'timeZone': target_tz_obj.zone},
+        'reminders': {
+            'useDefault': False,
+            'overrides': [{'method': 'popup', 'minutes': EVENT_REMINDER_MINUTES}],
+        },
+        'description': event_description,
+        'status': 'confirmed', # Restores the event if an upsert hits a deleted event with the same ID
+    }
+    body['extendedProperties'] = {'private': {
+        MANAGED_PROPERTY: '1',
+        PRAYER_PROPERTY: prayer_name,
+        DATE_PROPERTY: date_str_for_desc_url,
+        HASH_PROPERTY: event_content_hash(body),
+    }}
+    return body
+
+
+def _comparable_fields(event):
+    """
+    The FINGERPRINTED_FIELDS of an event, with start and end reduced to UTC instants, since
+    the API may return a time with another offset than the one it was written with.
+    """
+    fields = {field: event.get(field) for field in FINGERPRINTED_FIELDS}
+    for field in ('start', 'end'):
+        value = fields[field] or {}
+        date_time = value.get('dateTime')
+        try:
+            date_time = datetime.fromisoformat(date_time.replace('Z', '+00:00')).astimezone(timezone.utc).isoformat()
+        except (AttributeError, ValueError):
+            pass
+        fields[field] = {'dateTime': date_time, 'timeZone': value.get('timeZone')}
+    return fields
+
+
+def event_is_current(existing_event, desired_event):
+    """
+    Returns True if an existing event already has the desired content.
+
+    Both the content hash tag and the event's actual fields must match: the tag only records
+    what this app last wrote, so an event edited by hand in Calendar (which keeps the tag) is
+    still repaired. Untagged (legacy) events are never current, so the next update tags them.
+    """
+    tags = managed_event_tags(existing_event)
+    desired_body = desired_event['body']
+    return (tags is not None and tags.get(HASH_PROPERTY) == desired_body['extendedProperties']['private'][HASH_PROPERTY]
+            and _comparable_fields(existing_event) == _comparable_fields(desired_body))
+
+
+class WrittenEventLog:
+    """
+    What this app last wrote to its calendars: deterministic event ID -> (start date, content
+    hash), kept in state.json. plan_upserts() skips events whose desired content was already
+    written, so a warm upsert run sends no writes. Only this app's own writes are known, so
+    an event edited or deleted by hand in Calendar is only repaired by a reconcile run.
+
+    The entries changed since loading are tracked in 'updated' and 'removed', so they can be
+    saved entry by entry (config_loader.update_state_entries()) without overwriting entries
+    another process wrote in the meantime.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = {event_id: tuple(entry) for event_id, entry in (entries or {}).items()}
+        self.updated = {}
+        self.removed = set()
+
+    @property
+    def changed(self):
+        return bool(self.updated or self.removed)
+
+    def record(self, event):
+        """Records a tagged event resource, e.g. the response of a successful write (CalendarWriteBatch on_any_success)."""
+        tags = managed_event_tags(event) if isinstance(event, dict) else None
+        if tags is None or not event.get('id'):
+            return
+        entry = (tags.get(DATE_PROPERTY), tags.get(HASH_PROPERTY))
+        if self.entries.get(event['id']) != entry:
+            self.entries[event['id']] = entry
+            self.updated[event['id']] = entry
+            self.removed.discard(event['id'])
+
+    def forget(self, event_id):
+        """Drops a deleted event."""
+        if self.entries.pop(event_id, None) is not None:
+            self.updated.pop(event_id, None)
+            self.removed.add(event_id)
+
+    def is_written(self, desired_event):
+        """True if the desired event's exact content was last written under its deterministic ID."""
+        entry = self.entries.get(desired_event.get('event_id'))
+        return entry is not None and entry[1] == desired_event['body']['extendedProperties']['private'][HASH_PROPERTY]
+
+    def prune(self, before_date_str):
+        """Forgets events that start before 'before_date_str' ('YYYY-MM-DD'); they are never written again."""
+        for event_id, (date_str, _) in list(self.entries.items()):
+            if not date_str or date_str < before_date_str:
+                self.forget(event_id)
+
+
+def build_desired_events(schedules_by_date, target_tz, location_data_for_description, calendar_id=None,
+                         profile_name=DEFAULT_PROFILE_NAME):
+    """
+    Turns scraped prayer schedules into the set of events the calendar should contain.
+
+    Args:
+        schedules_by_date (dict): 'YYYY-MM-DD' processing date -> prayer schedule, as returned
+                                  by get_prayer_times_with_ends().
+        target_tz (pytz.timezone): Timezone the schedules are expressed in.
+        location_data_for_description (dict): Location used for the event descriptions.
+        calendar_id (str, optional): Calendar the events are written to. If given, each event
+            gets its deterministic_event_id() as 'event_id'.
+        profile_name (str): Event ID namespace, see deterministic_event_id().
+
+    Returns:
+        dict: ('YYYY-MM-DD' start date, prayer_name) -> desired event, a dict with
+              'prayer_name', 'date_str', 'start', 'end' (aware datetimes), 'body' and,
+              with calendar_id, 'event_id'. Prayers with missing or inconsistent times are left out.
+    """
+    desired = {}
+    for processing_date_str, prayer_schedule in schedules_by_date.items():
+        for prayer_name, times_info in prayer_schedule.items():
+            start_time_str = times_info.get('start')
+            end_time_str = times_info.get('end')
+            start_date_str = times_info.get('date_for_start')
+            end_date_str = times_info.get('date_for_end')
+
+            if not all([start_time_str, end_time_str, start_date_str, end_date_str]):
+                print(f"Skipping {prayer_name} for {processing_date_str} due to missing time/date information.")
+                continue
+            try:
+                start_datetime_aware = target_tz.localize(datetime.strptime(f"{start_date_str} {start_time_str}", "%Y-%m-%d %H:%M:%S"))
+                end_datetime_aware = target_tz.localize(datetime.strptime(f"{end_date_str} {end_time_str}", "%Y-%m-%d %H:%M:%S"))
+            except ValueError as ve:
+                print(f"Error parsing date/time for {prayer_name} on {processing_date_str}: {ve}.")
+                continue
+            if end_datetime_aware <= start_datetime_aware:
+                print(f"Warning: End time for {prayer_name} ({end_datetime_aware}) on {start_date_str} is not after start time ({start_datetime_aware}). Skipping.")
+                continue
+
+            key = (start_date_str, prayer_name)
+            if key in desired:
+                # e.g. one day's Isha moved past midnight onto the next day's Isha start date.
+                print(f"Warning: {prayer_name} from {processing_date_str} starts on {start_date_str}, which already has a {prayer_name} event planned. Skipping.")
+                continue
+            desired[key] = {
+                'prayer_name': prayer_name,
+                'date_str': start_date_str,
+                'start': start_datetime_aware,
+                'end': end_datetime_aware,
+                'body': build_prayer_event_body(prayer_name, start_datetime_aware, end_datetime_aware,
+                                                start_date_str, target_tz, location_data_for_description),
+            }
+            if calendar_id:
+                desired[key]['event_id'] = deterministic_event_id(calendar_id, profile_name, start_date_str, prayer_name)
+    return desired
+
+
+class ReconciliationPlan:
+    """
+    The calendar writes needed to bring the processing window to the desired state.
+
+    Attributes:
+        creates (list): Desired events with no existing event (or whose existing event is being
+                        moved to its deterministic ID).
+        updates (list): (desired event, existing event) pairs whose content hash differs (or is missing).
+        noops (list): (desired event, existing event) pairs that are already current. For
+                      upsert plans the existing event is None (it was not listed).
+        deletes (list): Existing events to remove (extra copies of a planned prayer event, or
+                        events replaced by a copy with a deterministic ID).
+        upserts (list): Desired events written blindly, without a listing (see plan_upserts()).
+    """
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.noops = []
+        self.deletes = []
+        self.upserts = []
+
+    def __len__(self):
+        """Number of calendar writes the plan needs."""
+        return len(self.creates) + len(self.updates) + len(self.deletes) + len(self.upserts)
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def extend(self, other):
+        """Adds another plan's actions to this one (e.g. to total per-day plans)."""
+        self.creates.extend(other.creates)
+        self.updates.extend(other.updates)
+        self.noops.extend(other.noops)
+        self.deletes.extend(other.deletes)
+        self.upserts.extend(other.upserts)
+
+    def counts(self):
+        return {'create': len(self.creates), 'update': len(self.updates),
+                'noop': len(self.noops), 'delete': len(self.deletes), 'upsert': len(self.upserts)}
+
+    def print_summary(self, verbose=False):
+        """Prints the write counts and, if verbose, one line per planned action."""
+        counts = self.counts()
+        if self.upserts:
+            print(f"\nUpsert plan: {counts['upsert']} event(s) written without listing the calendar, "
+                  f"{counts['noop']} already written.")
+        else:
+            print(f"\nReconciliation plan: {counts['create']} create(s), {counts['update']} update(s), "
+                  f"{counts['delete']} delete(s), {counts['noop']} already up-to-date.")
+        if not verbose:
+            return
+        for desired_event in self.upserts:
+            print(f"  UPSERT  {desired_event['prayer_name']} on {desired_event['date_str']}: "
+                  f"{desired_event['start'].strftime('%H:%M:%S')} - {desired_event['end'].strftime('%H:%M:%S')}")
+        for desired_event in self.creates:
+            print(f"  CREATE  {desired_event['prayer_name']} on {desired_event['date_str']}: "
+                  f"{desired_event['start'].strftime('%H:%M:%S')} - {desired_event['end'].strftime('%H:%M:%S')}")
+        for desired_event, existing_event in self.updates:
+            print(f"  UPDATE  {desired_event['prayer_name']} on {desired_event['date_str']}: "
+                  f"{existing_event.get('start', {}).get('dateTime')} - {existing_event.get('end', {}).get('dateTime')} -> "
+                  f"{desired_event['start'].isoformat()} - {desired_event['end'].isoformat()}")
+        for existing_event in self.deletes:
+            print(f"  DELETE  {existing_event.get('summary')} at {existing_event.get('start', {}).get('dateTime')} "
+                  f"(id {existing_event.get('id')})")
+        for desired_event, _ in self.noops:
+            print(f"  OK      {desired_event['prayer_name']} on {desired_event['date_str']}")
+
+
+def plan_reconciliation(desired_events, existing_index, existing_duplicates, target_tz, prayer_name_by_summary):
+    """
+    Diffs the desired events against the existing ones.
+
+    Args:
+        desired_events (dict): As returned by build_desired_events().
+        existing_index (dict): (start date, prayer_name) -> existing event, from index_prayer_events().
+        existing_duplicates (list): Extra existing events for already indexed keys.
+        target_tz (pytz.timezone): Timezone used to work out the local start date of untagged events.
+        prayer_name_by_summary (dict): Event summary -> prayer name for managed events.
+
+    Returns:
+        ReconciliationPlan: Only days that were scraped are touched; duplicates are deleted
+                            only for prayers the plan keeps an event for. An existing event
+                            without the desired event's deterministic ID is replaced by one
+                            with it (create + delete), so later runs can use plan_upserts().
+    """
+    plan = ReconciliationPlan()
+    for key in sorted(desired_events):
+        desired_event = desired_events[key]
+        existing_event = existing_index.get(key)
+        if existing_event is None:
+            plan.creates.append(desired_event)
+        elif desired_event.get('event_id') and existing_event.get('id') != desired_event['event_id']:
+            plan.creates.append(desired_event)
+            plan.deletes.append(existing_event)
+        elif event_is_current(existing_event, desired_event):
+            plan.noops.append((desired_event, existing_event))
+        else:
+            plan.updates.append((desired_event, existing_event))
+
+    for duplicate_event in existing_duplicates:
+        if prayer_event_key(duplicate_event, target_tz, prayer_name_by_summary) in desired_events:
+            plan.deletes.append(duplicate_event)
+    return plan
+
+
+def plan_upserts(desired_events, written_events=None):
+    """
+    Plans the desired events as upserts on their deterministic IDs, without listing the calendar.
+
+    Args:
+        desired_events (dict): As returned by build_desired_events() with a calendar_id.
+        written_events (WrittenEventLog, optional): Events whose desired content this app
+            already wrote are planned as no-ops instead of being written again.
+
+    Returns:
+        ReconciliationPlan: With only 'upserts' and 'noops'.
+    """
+    plan = ReconciliationPlan()
+    for key in sorted(desired_events):
+        desired_event = desired_events[key]
+        if written_events is not None and written_events.is_written(desired_event):
+            plan.noops.append((desired_event, None))
+        else:
+            plan.upserts.append(desired_event)
+    return plan
+
+
+def apply_plan(service, plan, write_batch, on_deleted=None, calendar_id=None):
+    """
+    Queues every write in the plan on a CalendarWriteBatch (see queue_plan()) and sends them.
+
+    Returns:
+        tuple: (number of successful writes, number of failed writes).
+    """
+    queue_plan(service, plan, write_batch, on_deleted, calendar_id)
+    return write_batch.execute()
+
+
+def queue_plan(service, plan, write_batch, on_deleted=None, calendar_id=None):
+    """
+    Queues every write in the plan on a CalendarWriteBatch without sending them, so the writes
+    of several plans (e.g. one per day) can share batch requests.
+
+    Creates and upserts insert the event under its deterministic ID when it has one; if that
+    ID already exists (HTTP 409, also for a deleted event), the event is updated instead.
+
+    Args:
+        service: Authenticated Calendar API service.
+        plan (ReconciliationPlan): Plan from plan_reconciliation().
+        write_batch (CalendarWriteBatch): Batch the writes are sent through.
+        on_deleted (callable, optional): Called with the event id of each deleted event.
+        calendar_id (str, optional): Calendar to write to. Defaults to 'calendar_id' from config.json.
+    """
+    from calendar_batch import fallback_on_status # Imported here so planning alone does not load googleapiclient
+    calendar_id = calendar_id or CALENDAR_ID
+    events_api = service.events()
+
+    def insert_request(desired_event):
+        body = desired_event['body']
+        if desired_event.get('event_id'):
+            body = dict(body, id=desired_event['event_id'])
+        return events_api.insert(calendarId=calendar_id, body=body)
+
+    def update_request(desired_event):
+        return events_api.update(calendarId=calendar_id, eventId=desired_event['event_id'], body=desired_event['body'])
+
+    for desired_event in plan.creates:
+        prayer_name, date_str = desired_event['prayer_name'], desired_event['date_str']
+        fallback = None
+        if desired_event.get('event_id'):
+            fallback = fallback_on_status((409,), lambda desired_event=desired_event: update_request(desired_event))
+        write_batch.add(insert_request(desired_event), (prayer_name, date_str, 'create'),
+                        on_success=lambda ev, prayer_name=prayer_name: print(f"Event created for {prayer_name}: {ev.get('htmlLink')}"),
+                        fallback=fallback)
+    for desired_event in plan.upserts:
+        prayer_name, date_str = desired_event['prayer_name'], desired_event['date_str']
+        write_batch.add(insert_request(desired_event), (prayer_name, date_str, 'upsert'),
+                        on_success=lambda ev, prayer_name=prayer_name: print(f"Event written for {prayer_name}: {ev.get('htmlLink')}"),
+                        fallback=fallback_on_status((409,), lambda desired_event=desired_event: update_request(desired_event)))
+    for desired_event, existing_event in plan.updates:
+        prayer_name, date_str = desired_event['prayer_name'], desired_event['date_str']
+        write_batch.add(events_api.update(calendarId=calendar_id, eventId=existing_event['id'], body=desired_event['body']),
+                        (prayer_name, date_str, 'update'),
+                        on_success=lambda ev, prayer_name=prayer_name: print(f"Event updated for {prayer_name}: {ev.get('htmlLink')}"))
+    for existing_event in plan.deletes:
+        event_id = existing_event['id']
+        def on_delete_success(_, event_id=event_id, summary=existing_event.get('summary')):
+            print(f"Deleted event {summary} ({event_id}).")
+            if on_deleted:
+                on_deleted(event_id)
+        write_batch.add(events_api.delete(calendarId=calendar_id, eventId=event_id),
+                        (existing_event.get('summary'), event_id, 'delete'), on_success=on_delete_success)
+
+# --- END OF FILE calendar_reconciler.py ---
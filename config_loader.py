@@ -1,9 +1,55 @@
 # --- START OF FILE config_loader.py ---
 
+import atexit
+import contextlib
 import json
 import os
+import tempfile
+import threading
+import time
 
 CONFIG_FILE_PATH = 'config.json'
+DEFAULT_STATE_FILE_PATH = 'state.json'
+# Runtime state the app writes itself. Older versions kept these in config.json; they are
+# read from there once if state.json does not have them yet.
+LEGACY_STATE_KEYS = ('last_checked_ip', 'last_checked_latitude', 'last_checked_longitude', 'last_checked_timezone')
+STATE_LOCK_TIMEOUT_SECONDS = 10.0 # How long flush_state() waits for another process's flush
+STATE_LOCK_STALE_SECONDS = 60.0 # A lock file this old was left by a crashed process and is removed
+
+_config_cache = None # ((path, mtime_ns, size), FrozenConfig)
+_config_cache_lock = threading.Lock()
+_state_cache = None # ((path, mtime_ns, size), dict as read from disk)
+_pending_state = {} # Updates not yet written; see update_state()
+_pending_entries = {} # key -> {entry: value or _REMOVED} not yet written; see update_state_entries()
+_REMOVED = object()
+_state_lock = threading.RLock()
+
+
+class FrozenConfig(dict):
+    """
+    Read-only dict for the parsed configuration (nested objects are FrozenConfig too,
+    arrays are tuples). Still a dict, so .get(), iteration and json.dumps() work as before;
+    any attempt to modify it raises TypeError. Use load_config() for an editable copy.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("The shared configuration is read-only; use load_config() for an editable copy.")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenConfig((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
 
 def load_config():
     """Loads configuration from config.json."""
@@ -19,15 +65,225 @@ def load_config():
     except Exception as e:
         raise RuntimeError(f"Could not load configuration from '{CONFIG_FILE_PATH}': {e}")
 
+def get_config():
+    """
+    Returns the shared, read-only configuration, parsing config.json only when the file
+    has changed (by modification time and size) since the last call.
+
+    Every module reads its settings through this, so one run parses the file once.
+    """
+    global _config_cache
+    try:
+        stat = os.stat(CONFIG_FILE_PATH)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Configuration file '{CONFIG_FILE_PATH}' not found. Please create it.")
+    signature = (os.path.abspath(CONFIG_FILE_PATH), stat.st_mtime_ns, stat.st_size)
+    with _config_cache_lock:
+        if _config_cache is None or _config_cache[0] != signature:
+            config = load_config()
+            if not isinstance(config, dict):
+                raise ValueError(f"'{CONFIG_FILE_PATH}' must contain a JSON object at the top level.")
+            _config_cache = (signature, _freeze(config))
+        return _config_cache[1]
+
+class AtomicFile:
+    """
+    A text file written under a temporary name next to 'path' and renamed over 'path' by
+    commit(), after it is flushed to disk, so readers never see a partial or empty file.
+    abort() discards it. Used as a context manager, it yields the file object and commits
+    on success or aborts on an exception.
+    """
+
+    def __init__(self, path, encoding='utf-8', newline=None):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self.tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+        self.file = os.fdopen(fd, 'w', encoding=encoding, newline=newline)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def commit(self):
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.replace(self.tmp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def write_json_atomically(path, data, **json_kwargs):
+    """Writes 'data' as JSON to 'path' through an AtomicFile. json_kwargs go to json.dump()."""
+    with AtomicFile(path) as f:
+        json.dump(data, f, **json_kwargs)
+
 def save_config(config_data):
-    """Saves the current configuration data back to config.json."""
+    """Saves the current configuration data back to config.json (atomically)."""
+    global _config_cache
     try:
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=4) # Use indent for pretty printing
+        write_json_atomically(CONFIG_FILE_PATH, config_data, indent=4)
+        _config_cache = None # Also covers writes within the filesystem's mtime resolution
     except Exception as e:
         print(f"Error saving configuration to '{CONFIG_FILE_PATH}': {e}")
         # Consider re-raising or handling more gracefully depending on desired behavior
 
+def _state_path():
+    return get_config().get('state_path', DEFAULT_STATE_FILE_PATH)
+
+def _read_state_file(path):
+    """Returns the state on disk, reparsed only when the file changed. Missing or unreadable -> {}."""
+    global _state_cache
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _state_cache = None
+        return {}
+    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if _state_cache is None or _state_cache[0] != signature:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read state from '{path}', ignoring it: {e}")
+            state = {}
+        _state_cache = (signature, state if isinstance(state, dict) else {})
+    return _state_cache[1]
+
+def get_state():
+    """
+    Returns the app's mutable runtime state (e.g. the last checked location) as a read-only
+    dict: state.json (or 'state_path'), cached by modification time, plus any updates not
+    yet flushed. Keys missing from the state file fall back to the same keys in config.json,
+    where older versions stored them.
+    """
+    with _state_lock:
+        state = dict(_read_state_file(_state_path()))
+        config = get_config()
+        for key in LEGACY_STATE_KEYS:
+            if key not in state and key in config:
+                state[key] = config[key]
+        state.update(_pending_state)
+        for key, entries in _pending_entries.items():
+            state[key] = _merge_entries(state.get(key), entries)
+        return _freeze(state)
+
+def update_state(**changes):
+    """
+    Records state changes. They are visible to get_state() at once, but written only by
+    flush_state() (called at the end of a run and at exit), so repeated updates during a
+    run cost one write. Each key is replaced as a whole; for dict-valued keys that several
+    processes add to, use update_state_entries().
+    """
+    with _state_lock:
+        _pending_state.update(changes)
+
+def update_state_entries(key, changes=None, removed=()):
+    """
+    Records changes to single entries of a dict-valued state key (e.g. one per calendar).
+    flush_state() applies them entry by entry to the key's value on disk, so processes that
+    change different entries of the same key keep each other's.
+
+    Args:
+        key (str): State key holding a dict.
+        changes (dict, optional): Entries to set.
+        removed (iterable): Entries to delete.
+    """
+    with _state_lock:
+        entries = _pending_entries.setdefault(key, {})
+        entries.update(changes or {})
+        entries.update((entry, _REMOVED) for entry in removed)
+
+def _merge_entries(current, entries):
+    merged = dict(current) if isinstance(current, dict) else {}
+    for entry, value in entries.items():
+        if value is _REMOVED:
+            merged.pop(entry, None)
+        else:
+            merged[entry] = value
+    return merged
+
+@contextlib.contextmanager
+def _state_file_lock(path):
+    """
+    Holds a lock file next to the state file (created with O_CREAT | O_EXCL) so only one
+    process at a time reads, merges and rewrites it.
+
+    Raises:
+        TimeoutError: If another process holds the lock for longer than STATE_LOCK_TIMEOUT_SECONDS.
+    """
+    lock_path = path + '.lock'
+    deadline = time.monotonic() + STATE_LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STATE_LOCK_STALE_SECONDS:
+                    print(f"Warning: Removing stale state lock '{lock_path}'.")
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue # Released in the meantime
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"'{lock_path}' is held by another process.")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def flush_state():
+    """
+    Writes pending state updates atomically. Under a lock file, they are merged into the
+    file's current contents: keys from update_state() replace the stored value, and entries
+    from update_state_entries() are applied one by one, so other processes' keys and entries
+    (e.g. a daemon and a fleet run) are kept. Returns True if anything was written.
+    """
+    global _state_cache
+    with _state_lock:
+        if not _pending_state and not _pending_entries:
+            return False
+        path = _state_path()
+        try:
+            with _state_file_lock(path):
+                _state_cache = None # Another process may have written it within the mtime resolution
+                state = dict(_read_state_file(path))
+                for key in LEGACY_STATE_KEYS: # Carry over what older versions kept in config.json
+                    if key not in state and key in get_config():
+                        state[key] = get_config()[key]
+                state.update(_pending_state)
+                for key, entries in _pending_entries.items():
+                    state[key] = _merge_entries(state.get(key), entries)
+                write_json_atomically(path, state, indent=4)
+        except Exception as e:
+            print(f"Error saving state to '{path}': {e}")
+            return False
+        _pending_state.clear()
+        _pending_entries.clear()
+        _state_cache = None # Also covers writes within the filesystem's mtime resolution
+        return True
+
+atexit.register(flush_state)
+
 if __name__ == '__main__':
     # Test loading the config
     try:
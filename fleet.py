@@ -0,0 +1,278 @@
+# --- START OF FILE fleet.py ---
+
+import re
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+import pytz
+from google_calendar_setup import authenticate_google_calendar
+from calendar_batch import CalendarWriteBatch
+from calendar_mirror import CalendarMirror
+from calendar_reconciler import WRITTEN_EVENTS_STATE_KEY, WrittenEventLog, is_managed_prayer_event
+from config_loader import get_state
+from schedule_cache import location_key
+from run_pipeline import run_window_pipeline
+from run_metrics import span, start_run, finish_run
+from prayer_time_sources import open_prayer_time_source
+from prayer_calendar_manager import (
+    config, get_existing_prayer_events_for_window, get_existing_prayer_events_from_mirror,
+    calendar_write_mode, sync_callbacks, record_sync_result,
+    MANAGED_PRAYER_NAMES, TARGET_TIMEZONE_STR, DAYS_TO_PROCESS_IN_ADVANCE, CALENDAR_BATCH_SIZE, CALENDAR_MIRROR_CONFIG,
+    CALENDAR_WRITE_MODE,
+)
+
+FLEET_PROFILES = config.get('fleet_profiles', [])
+
+
+def load_fleet_profiles(raw_profiles=None):
+    """
+    Validates the 'fleet_profiles' entries from config.json.
+
+    Each profile needs a 'calendar_id' and a 'location' ({'latitude', 'longitude'} or
+    {'address'}, plus 'timezone'). 'prayer_definitions' optionally limits the profile to
+    some of the globally defined prayers; the backends calculate every prayer from the
+    global definitions, so a profile cannot redefine a prayer's start/end labels.
+
+    A profile's name is the namespace of its deterministic event IDs, so two profiles with
+    the same name and calendar would overwrite each other's events; the later one is left out.
+
+    Returns:
+        list[dict]: Normalized profiles ('name', 'calendar_id', 'location', 'timezone', 'prayer_names').
+                    Invalid profiles are reported and left out.
+    """
+    raw_profiles = FLEET_PROFILES if raw_profiles is None else raw_profiles
+    global_definitions = config.get('prayer_definitions', {})
+    profiles = []
+    seen_names = set() # (calendar_id, name)
+    for number, raw in enumerate(raw_profiles, start=1):
+        name = raw.get('name') or f"profile {number}"
+        location = dict(raw.get('location') or {})
+        has_coordinates = location.get('latitude') is not None and location.get('longitude') is not None
+        if not raw.get('calendar_id') or not (has_coordinates or location.get('address')):
+            print(f"Warning: Fleet profile '{name}' needs a calendar_id and a location (latitude/longitude or address). Skipping it.")
+            continue
+        if (raw['calendar_id'], name) in seen_names:
+            print(f"Warning: Fleet profile '{name}' has the same name and calendar_id as an earlier profile, "
+                  f"so their events would share IDs and overwrite each other. Give it a unique name. Skipping it.")
+            continue
+        timezone_str = location.get('timezone') or TARGET_TIMEZONE_STR
+        try:
+            pytz.timezone(timezone_str)
+        except pytz.UnknownTimeZoneError:
+            print(f"Warning: Fleet profile '{name}' has an unknown timezone '{timezone_str}'. Skipping it.")
+            continue
+        location['timezone'] = timezone_str
+        location.setdefault('address_for_display', location.get('address') or f"Lat {location.get('latitude')}, Lon {location.get('longitude')}")
+
+        prayer_names = [p for p in MANAGED_PRAYER_NAMES if p in global_definitions]
+        if raw.get('prayer_definitions'):
+            prayer_names = []
+            for prayer_name, definition in raw['prayer_definitions'].items():
+                if global_definitions.get(prayer_name) != definition:
+                    print(f"Warning: Fleet profile '{name}' defines {prayer_name} differently from 'prayer_definitions'; "
+                          f"only the global definitions can be calculated. Leaving {prayer_name} out.")
+                    continue
+                prayer_names.append(prayer_name)
+        seen_names.add((raw['calendar_id'], name))
+        profiles.append({'name': name, 'calendar_id': raw['calendar_id'], 'location': location,
+                         'timezone': timezone_str, 'prayer_names': prayer_names})
+    return profiles
+
+
+class CoalescingPrayerTimeSource:
+    """
+    Shares fetched schedules between fleet profiles.
+
+    Requests for the same location and date are fetched once; a request made while an
+    identical one is in flight waits for that fetch instead of starting its own.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._results = {} # (location_key, date) -> Future
+
+    @property
+    def fetches(self):
+        return len(self._results)
+
+    def prefetch_prayer_times(self, dates, location_params):
+        self.source.prefetch_prayer_times(dates, location_params)
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        key = (location_key(location_params), target_date_obj_override)
+        with self._lock:
+            self.requests += 1
+            future = self._results.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._results[key] = Future()
+        if is_owner:
+            try:
+                future.set_result(self.source.get_prayer_times_with_ends(target_date_obj_override, location_params))
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+        else:
+            print(f"Reusing the schedule already fetched for {target_date_obj_override} ({key[0]}).")
+        return future.result()
+
+
+class _ProfilePrayerTimeSource:
+    """A profile's view of the shared source, limited to the prayers the profile syncs."""
+
+    def __init__(self, shared_source, prayer_names):
+        self.shared_source = shared_source
+        self.prayer_names = prayer_names
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        prayer_schedule = self.shared_source.get_prayer_times_with_ends(target_date_obj_override, location_params)
+        if not prayer_schedule:
+            return prayer_schedule
+        return {p: times for p, times in prayer_schedule.items() if p in self.prayer_names}
+
+
+def _profile_window(profile):
+    target_tz = pytz.timezone(profile['timezone'])
+    window_start_date = datetime.now(target_tz).date()
+    return target_tz, window_start_date, [window_start_date + timedelta(days=i) for i in range(DAYS_TO_PROCESS_IN_ADVANCE)]
+
+
+def _mirror_path(profile):
+    base_path = CALENDAR_MIRROR_CONFIG.get('path', 'calendar_mirror.json')
+    stem, dot, extension = base_path.rpartition('.')
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', profile['name']).strip('_').lower() or 'profile'
+    return f"{stem}_{slug}.{extension}" if dot else f"{base_path}_{slug}"
+
+
+def run_profile(profile, service, shared_source, dry_run=False):
+    """
+    Syncs one fleet profile's calendar through the shared service and prayer time source.
+
+    Returns:
+        dict: The profile's report ('name', 'status', 'plan' counts, writes and 'error').
+    """
+    report = {'name': profile['name'], 'calendar_id': profile['calendar_id'], 'status': 'ok',
+              'plan': None, 'writes_succeeded': 0, 'writes_failed': 0, 'error': None}
+    print(f"\n===== Fleet profile: {profile['name']} ({profile['location']['address_for_display']}) =====")
+    target_tz, window_start_date, window_dates = _profile_window(profile)
+    prayer_name_by_summary = {f'{prayer_name} Prayer': prayer_name for prayer_name in profile['prayer_names']}
+
+    write_mode = calendar_write_mode(profile['calendar_id'], profile['name'])
+    calendar_mirror = None
+    if CALENDAR_MIRROR_CONFIG.get('enabled', False) and write_mode == 'reconcile':
+        calendar_mirror = CalendarMirror(_mirror_path(profile), profile['calendar_id'],
+                                         is_managed_event=lambda event: is_managed_prayer_event(event, prayer_name_by_summary))
+    written_events = WrittenEventLog(get_state().get(WRITTEN_EVENTS_STATE_KEY))
+    on_write_success, on_deleted = sync_callbacks(written_events, calendar_mirror)
+    write_batch = CalendarWriteBatch(service, batch_size=CALENDAR_BATCH_SIZE, on_any_success=on_write_success)
+
+    def list_existing_events():
+        existing_events_listing = None
+        if calendar_mirror:
+            existing_events_listing = get_existing_prayer_events_from_mirror(
+                calendar_mirror, service, window_start_date, DAYS_TO_PROCESS_IN_ADVANCE, target_tz, prayer_name_by_summary)
+        if existing_events_listing is None:
+            existing_events_listing = get_existing_prayer_events_for_window(
+                service, window_start_date, DAYS_TO_PROCESS_IN_ADVANCE, target_tz,
+                calendar_id=profile['calendar_id'], prayer_name_by_summary=prayer_name_by_summary,
+                include_untagged=write_mode != CALENDAR_WRITE_MODE)
+        return existing_events_listing
+
+    try:
+        run_result = run_window_pipeline(
+            service, _ProfilePrayerTimeSource(shared_source, profile['prayer_names']), window_dates,
+            profile['location'], target_tz, list_existing_events if write_mode == 'reconcile' else None,
+            prayer_name_by_summary, write_batch, dry_run=dry_run, on_deleted=on_deleted,
+            calendar_id=profile['calendar_id'], profile_name=profile['name'], written_events=written_events
+        )
+    except Exception as e:
+        print(f"An unexpected error occurred while syncing fleet profile '{profile['name']}': {e}")
+        report.update(status='failed', error=str(e))
+        return report
+    finally:
+        if calendar_mirror:
+            calendar_mirror.save()
+
+    if not dry_run:
+        record_sync_result(run_result, write_mode, written_events, profile['calendar_id'], window_start_date, profile['name'])
+    run_result['plan'].print_summary(verbose=dry_run)
+    report.update(plan=run_result['plan'].counts(), writes_succeeded=run_result['writes_succeeded'],
+                  writes_failed=run_result['writes_failed'])
+    if run_result['listing_failed']:
+        report.update(status='failed', error="could not list existing events")
+    elif run_result['scraping_failed']:
+        report.update(status='failed', error="prayer times could not be fetched for every day")
+    elif run_result['writes_failed']:
+        report.update(status='failed', error=f"{run_result['writes_failed']} calendar write(s) failed")
+    return report
+
+
+def print_fleet_report(reports):
+    print("\n===== Fleet report =====")
+    for report in reports:
+        plan = report['plan']
+        if not plan:
+            plan_text = "no plan"
+        elif plan['upsert']:
+            plan_text = f"{plan['upsert']} upsert"
+        else:
+            plan_text = f"{plan['create']} create, {plan['update']} update, {plan['delete']} delete, {plan['noop']} unchanged"
+        line = f"  [{report['status'].upper()}] {report['name']}: {plan_text}; {report['writes_succeeded']} write(s) ok"
+        if report['error']:
+            line += f" - {report['error']}"
+        print(line)
+
+
+def run_fleet(profiles=None, dry_run=False):
+    """
+    Syncs every fleet profile in one process.
+
+    One Calendar API client and one prayer time backend (e.g. the browser pool) are shared
+    by all profiles, every profile's dates are queued on the backend up front, and
+    profiles with the same location and date share a single fetch.
+
+    Returns:
+        list[dict]: One report per profile, as returned by run_profile().
+    """
+    profiles = load_fleet_profiles() if profiles is None else profiles
+    if not profiles:
+        print("No valid fleet profiles configured in 'fleet_profiles'.")
+        return []
+    start_run('fleet-dry-run' if dry_run else 'fleet')
+    reports = []
+    try:
+        reports = _run_fleet_profiles(profiles, dry_run)
+    finally:
+        finish_run('ok' if reports and all(report['status'] == 'ok' for report in reports) else 'failed')
+    return reports
+
+
+def _run_fleet_profiles(profiles, dry_run):
+    with span('auth'):
+        service = authenticate_google_calendar()
+    if not service:
+        print("Failed to authenticate with Google Calendar.")
+        return [{'name': p['name'], 'calendar_id': p['calendar_id'], 'status': 'failed', 'plan': None,
+                 'writes_succeeded': 0, 'writes_failed': 0, 'error': "authentication failed"} for p in profiles]
+
+    reports = []
+    with open_prayer_time_source() as prayer_time_source:
+        shared_source = CoalescingPrayerTimeSource(prayer_time_source)
+        dates_by_location = {}
+        for profile in profiles:
+            _, _, window_dates = _profile_window(profile)
+            location, dates = dates_by_location.setdefault(location_key(profile['location']), (profile['location'], set()))
+            dates.update(window_dates)
+        for location, dates in dates_by_location.values():
+            shared_source.prefetch_prayer_times(sorted(dates), location)
+
+        for profile in profiles:
+            reports.append(run_profile(profile, service, shared_source, dry_run=dry_run))
+        print(f"\nFetched {shared_source.fetches} unique schedule(s) for {shared_source.requests} profile-day request(s).")
+
+    print_fleet_report(reports)
+    return reports
+
+# --- END OF FILE fleet.py ---
@@ -0,0 +1,153 @@
+# --- START OF FILE geolocation.py ---
+
+import json
+import os
+import sys
+import time
+import requests
+from config_loader import get_config, write_json_atomically
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for IP geolocation: {e}")
+    sys.exit(1)
+
+GEOLOCATION_CONFIG = config.get('geolocation', {})
+DEFAULT_IP_URL = "https://api.ipify.org?format=json"
+DEFAULT_GEO_URL = "http://ip-api.com/json/{ip}" # Free for non-commercial use, up to 45 requests/minute
+DEFAULT_CACHE_PATH = 'geolocation_cache.json'
+DEFAULT_CACHE_TTL_SECONDS = 6 * 3600
+REQUEST_TIMEOUT_SECONDS = 5
+
+
+class IpApiProvider:
+    """
+    Looks up the public IP with an ipify-style endpoint and geolocates it with an
+    ip-api.com-style endpoint. Both URLs are configurable, e.g. to point at a local stub server.
+    """
+
+    def __init__(self, ip_url=DEFAULT_IP_URL, geo_url=DEFAULT_GEO_URL):
+        self.ip_url = ip_url
+        self.geo_url = geo_url
+
+    def public_ip(self, session):
+        response = session.get(self.ip_url, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json().get("ip")
+
+    def geolocate(self, session, ip):
+        """Returns (latitude, longitude, timezone), or None if the provider has no location for the IP."""
+        response = session.get(self.geo_url.format(ip=ip), timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        geo_data = response.json()
+        if geo_data.get("status") != "success":
+            print(f"IP geolocation failed for {ip}: {geo_data.get('message', 'Unknown error')}")
+            return None
+        return geo_data.get("lat"), geo_data.get("lon"), geo_data.get("timezone")
+
+
+class IpGeolocator:
+    """
+    Resolves the device's public IP to (latitude, longitude, timezone).
+
+    All requests share one keep-alive requests.Session. IP -> location lookups are
+    cached on disk for ttl_seconds, and the geolocation call is skipped entirely when the
+    IP matches the last checked IP, so repeated and fleet-style runs stay well under the
+    provider's rate limit.
+    """
+
+    def __init__(self, provider=None, session=None, cache_path=None, ttl_seconds=None):
+        self.provider = provider or IpApiProvider(
+            GEOLOCATION_CONFIG.get('ip_url', DEFAULT_IP_URL), GEOLOCATION_CONFIG.get('geo_url', DEFAULT_GEO_URL))
+        self.session = session or requests.Session()
+        self.cache_path = cache_path if cache_path is not None else GEOLOCATION_CONFIG.get('cache_path', DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else GEOLOCATION_CONFIG.get('cache_ttl_seconds', DEFAULT_CACHE_TTL_SECONDS)
+        self._cache = None
+
+    def _load_cache(self):
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_path and os.path.exists(self.cache_path):
+                try:
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        self._cache = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Warning: Could not read geolocation cache '{self.cache_path}': {e}")
+        return self._cache
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        now = time.time()
+        self._cache = {ip: entry for ip, entry in self._cache.items() if now - entry.get('fetched_at', 0) <= self.ttl_seconds}
+        try:
+            write_json_atomically(self.cache_path, self._cache)
+        except Exception as e:
+            print(f"Error saving geolocation cache to '{self.cache_path}': {e}")
+
+    def cached_location(self, ip):
+        """Returns the cached (latitude, longitude, timezone) for an IP, or None if absent or expired."""
+        entry = self._load_cache().get(ip)
+        if entry and time.time() - entry.get('fetched_at', 0) <= self.ttl_seconds:
+            return entry['latitude'], entry['longitude'], entry['timezone']
+        return None
+
+    def locate(self, last_known=None):
+        """
+        Returns (ip, latitude, longitude, timezone). Unknown values are None.
+
+        Args:
+            last_known (dict, optional): 'ip', 'latitude', 'longitude' and 'timezone' from the
+                previous run. If the public IP is unchanged, these are returned without a lookup.
+        """
+        print("Attempting to get current device location via IP geolocation...")
+        try:
+            ip = self.provider.public_ip(self.session)
+            print(f"Public IP address: {ip}")
+        except Exception as e:
+            print(f"Error getting public IP: {e}")
+            return None, None, None, None
+        if not ip:
+            return None, None, None, None
+
+        last_known = last_known or {}
+        if (ip == last_known.get('ip') and last_known.get('latitude') is not None
+                and last_known.get('longitude') is not None and last_known.get('timezone')):
+            print("Public IP is unchanged since the last check. Skipping geolocation lookup.")
+            return ip, last_known['latitude'], last_known['longitude'], last_known['timezone']
+
+        cached = self.cached_location(ip)
+        if cached is not None:
+            print(f"Using cached geolocation for {ip}: Lat={cached[0]}, Lon={cached[1]}, Timezone={cached[2]}")
+            return (ip,) + tuple(cached)
+
+        try:
+            location = self.provider.geolocate(self.session, ip)
+        except Exception as e:
+            print(f"Error during IP geolocation for {ip}: {e}")
+            return ip, None, None, None
+        if location is None or None in location:
+            return ip, None, None, None
+        latitude, longitude, timezone = location
+        print(f"Geolocation successful: Lat={latitude}, Lon={longitude}, Timezone={timezone}")
+        self._load_cache()[ip] = {'latitude': latitude, 'longitude': longitude, 'timezone': timezone, 'fetched_at': time.time()}
+        self._save_cache()
+        return ip, latitude, longitude, timezone
+
+    def close(self):
+        self.session.close()
+
+
+_default_geolocator = None
+
+
+def get_geolocator():
+    """Returns the process-wide IpGeolocator, so every lookup reuses one HTTP session and cache."""
+    global _default_geolocator
+    if _default_geolocator is None:
+        _default_geolocator = IpGeolocator()
+    return _default_geolocator
+
+# --- END OF FILE geolocation.py ---
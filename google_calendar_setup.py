@@ -1,16 +1,17 @@
 # --- START OF FILE google_calendar_setup.py ---
 
+import json
 import os
 import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from datetime import datetime, timedelta, timezone
 from googleapiclient.errors import HttpError
-from config_loader import load_config # Import the loader
+from config_loader import get_config # Import the loader
+# google_auth_oauthlib, google.auth.transport.requests and googleapiclient.discovery are imported
+# inside authenticate_google_calendar(): they are slow to import and only needed once we connect.
 
 # Load configuration
 try:
-    config = load_config()
+    config = get_config()
     google_auth_config = config.get('google_auth', {})
 except Exception as e:
     print(f"FATAL: Could not load configuration for Google Calendar setup: {e}")
@@ -30,63 +31,138 @@ except Exception as e:
 
 
 # Use values from config
-SCOPES = google_auth_config.get('scopes', ['https://www.googleapis.com/auth/calendar'])
+SCOPES = list(google_auth_config.get('scopes', ['https://www.googleapis.com/auth/calendar']))
 TOKEN_PATH = google_auth_config.get('token_path', 'token.json')
 CREDENTIALS_PATH = google_auth_config.get('credentials_path', 'credentials.json')
 REDIRECT_URI = google_auth_config.get('redirect_uri', 'http://localhost:8080/')
 SERVER_PORT = google_auth_config.get('server_port', 8080)
+TOKEN_REFRESH_MARGIN_SECONDS = google_auth_config.get('token_refresh_margin_seconds', 300) # Refresh this long before expiry
+HTTP_TIMEOUT_SECONDS = google_auth_config.get('http_timeout_seconds', 30)
+API_ROOT_URL = google_auth_config.get('api_root_url') # e.g. a local Calendar API stand-in; None means Google
 
+# Warm client state, reused by every call in this process (fleet mode, long-running runs).
+_calendar_discovery_document = None
+_cached_service = None
+_cached_credentials = None
+_refresh_request = None
 
-def authenticate_google_calendar():
+
+def _load_credentials():
+    if not os.path.exists(TOKEN_PATH):
+        return None
+    with open(TOKEN_PATH, 'rb') as token:
+        return pickle.load(token)
+
+
+def _save_credentials(creds):
+    with open(TOKEN_PATH, 'wb') as token:
+        pickle.dump(creds, token)
+
+
+def _token_expires_soon(creds):
+    # google-auth keeps expiry as a naive UTC datetime.
+    if creds.expiry is None:
+        return False
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS) <= now_utc
+
+
+def _ensure_fresh_credentials(creds):
+    """
+    Refreshes the credentials if they are invalid or expire within TOKEN_REFRESH_MARGIN_SECONDS,
+    so no API call has to wait for a refresh mid-run.
+
+    Returns:
+        bool: True if the credentials are usable; False if a new authorization is needed.
+    """
+    global _refresh_request
+    if creds is None:
+        return False
+    if creds.valid and not _token_expires_soon(creds):
+        return True
+    if not creds.refresh_token:
+        return False
+    try:
+        from google.auth.transport.requests import Request
+        if _refresh_request is None:
+            _refresh_request = Request() # Reuses one requests.Session for every refresh
+        creds.refresh(_refresh_request)
+        _save_credentials(creds)
+        return True
+    except Exception as e:
+        print(f"Error refreshing token: {e}")
+        print(f"Deleting problematic {TOKEN_PATH} and asking for new authorization.")
+        if os.path.exists(TOKEN_PATH):
+            os.remove(TOKEN_PATH)
+        return False
+
+
+def _build_calendar_service(creds):
+    """Builds the Calendar v3 client from the discovery document bundled with googleapiclient (no network)."""
+    global _calendar_discovery_document
+    import httplib2
+    import google_auth_httplib2
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+
+    if _calendar_discovery_document is None:
+        _calendar_discovery_document = json.loads(get_static_doc('calendar', 'v3'))
+    discovery_document = _calendar_discovery_document
+    if API_ROOT_URL:
+        # rootUrl (unlike client_options' api_endpoint) also moves the batch endpoint.
+        root_url = API_ROOT_URL.rstrip('/') + '/'
+        discovery_document = dict(discovery_document, rootUrl=root_url, mtlsRootUrl=root_url,
+                                  baseUrl=root_url + discovery_document['servicePath'])
+    # One keep-alive httplib2 connection pool, authorized with the credentials (refreshed on a 401 as well).
+    authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+    return build_from_document(discovery_document, http=authorized_http)
+
+
+def authenticate_google_calendar(force_rebuild=False):
     """
     Authenticates with the Google Calendar API.
     
     It attempts to load existing credentials from TOKEN_PATH.
-    If expired, it refreshes the token. If no valid token exists,
+    If they are expired or about to expire, it refreshes the token. If no valid token exists,
     it initiates the OAuth 2.0 flow to obtain new credentials via a local server.
-    
+
+    The service is cached: later calls in the same process return the same client (after
+    refreshing the token if it is close to expiry), so they cost next to nothing.
+
+    Args:
+        force_rebuild (bool): Build a new client even if one is cached.
+
     Returns:
         googleapiclient.discovery.Resource: A Google Calendar API service object if authentication is successful,
                                            otherwise None.
     """
-    creds = None
-    if os.path.exists(TOKEN_PATH):
-        with open(TOKEN_PATH, 'rb') as token:
-            creds = pickle.load(token)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                print(f"Deleting problematic {TOKEN_PATH} and asking for new authorization.")
-                if os.path.exists(TOKEN_PATH):
-                    os.remove(TOKEN_PATH)
-                creds = None
-        
-        if not creds: 
-            if not os.path.exists(CREDENTIALS_PATH):
-                print(f"Error: {CREDENTIALS_PATH} not found. Please ensure it's in the correct location and defined in config.json.")
-                return None
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CREDENTIALS_PATH, SCOPES)
-            flow.redirect_uri = REDIRECT_URI
-            creds = flow.run_local_server(port=SERVER_PORT)
-        
-        with open(TOKEN_PATH, 'wb') as token:
-            pickle.dump(creds, token)
+    global _cached_service, _cached_credentials
+    if _cached_service is not None and not force_rebuild and _ensure_fresh_credentials(_cached_credentials):
+        return _cached_service
+
+    creds = _cached_credentials or _load_credentials()
+    if not _ensure_fresh_credentials(creds):
+        if not os.path.exists(CREDENTIALS_PATH):
+            print(f"Error: {CREDENTIALS_PATH} not found. Please ensure it's in the correct location and defined in config.json.")
+            return None
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(
+            CREDENTIALS_PATH, SCOPES)
+        flow.redirect_uri = REDIRECT_URI
+        creds = flow.run_local_server(port=SERVER_PORT)
+        _save_credentials(creds)
 
     try:
-        service = build('calendar', 'v3', credentials=creds)
+        service = _build_calendar_service(creds)
         print("Successfully connected to Google Calendar API.")
-        return service
     except HttpError as error:
         print(f'An API error occurred: {error}')
         return None
     except Exception as e:
         print(f'An unexpected error occurred during service build: {e}')
         return None
+    _cached_service, _cached_credentials = service, creds
+    return service
 
 if __name__ == '__main__':
     service = authenticate_google_calendar()
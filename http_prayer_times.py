@@ -0,0 +1,225 @@
+# --- START OF FILE http_prayer_times.py ---
+
+import time
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from scrape_prayer_times import (
+    ScraperSession, build_muwaqqit_url, resolve_location, resolve_target_date,
+    ALL_TIME_LABELS_TO_SCRAPE, LABEL_INDEX, PRAYER_DEFINITIONS, PAGE_LOAD_TIMEOUT_SECONDS, BROWSER_USER_AGENT,
+)
+from prayer_schedule import parse_results_rows, build_prayer_schedule
+from run_metrics import span
+
+HTTP_POOL_SIZE = 4
+HTTP_RETRY_TOTAL = 2
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class _ResultsTableParser(HTMLParser):
+    """
+    Collects the rows of muwaqqit.com's results table from static HTML.
+
+    Mirrors RESULTS_TABLE_BODY_XPATH: rows of the <tbody> of a <table class="table">
+    inside <div id="results">. If the table has no explicit <tbody>, its direct rows are
+    used, as a browser would wrap them in one.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.table_found = False
+        self.rows = [] # (label, time cell text, date cell text, in_tbody)
+        self._open_divs = 0
+        self._results_div_level = None
+        self._table_depth = 0 # Nesting depth of tables, counted only inside the results table
+        self._in_tbody = False
+        self._row = None
+        self._cell = None
+
+    def _close_cell(self):
+        if self._row is not None and self._cell is not None:
+            self._row.append(self._cell)
+        self._cell = None
+
+    def close_row(self):
+        self._close_cell()
+        if self._row is not None:
+            cells = self._row
+            # Same filter as the browser scraper: at least 3 <td> cells and a <b> label in the first.
+            if len(cells) >= 3 and cells[0]["bold"] is not None:
+                self.rows.append((_collapse(cells[0]["bold"]), _collapse(cells[1]["text"]),
+                                  _collapse(cells[2]["text"]), self._in_tbody))
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self._open_divs += 1
+            if self._results_div_level is None and dict(attrs).get("id") == "results":
+                self._results_div_level = self._open_divs
+            return
+        if self._results_div_level is None:
+            return
+        if tag == "table":
+            if self._table_depth == 0 and dict(attrs).get("class") == "table":
+                self.table_found = True
+                self._table_depth = 1
+            elif self._table_depth:
+                self._table_depth += 1
+            return
+        if self._table_depth == 1 and tag == "tbody":
+            self._in_tbody = True
+        elif self._table_depth == 1 and tag == "tr":
+            self.close_row()
+            self._row = []
+        elif self._table_depth == 1 and tag == "td" and self._row is not None:
+            self._close_cell()
+            self._cell = {"text": [], "bold": None, "bold_depth": 0, "bold_closed": False}
+        elif self._cell is None:
+            return
+        elif tag == "b":
+            self._cell["bold_depth"] += 1
+            if self._cell["bold"] is None:
+                self._cell["bold"] = []
+        elif tag in VOID_ELEMENTS:
+            self._cell["text"].append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "div":
+            if self._results_div_level is not None and self._open_divs == self._results_div_level:
+                self.close_row()
+                self._results_div_level = None
+                self._table_depth = 0
+            self._open_divs = max(0, self._open_divs - 1)
+            return
+        if self._results_div_level is None or not self._table_depth:
+            return
+        if tag == "table":
+            if self._table_depth == 1:
+                self.close_row()
+            self._table_depth -= 1
+        elif self._table_depth == 1 and tag == "tbody":
+            self.close_row()
+            self._in_tbody = False
+        elif self._table_depth == 1 and tag == "tr":
+            self.close_row()
+        elif self._table_depth == 1 and tag == "td":
+            self._close_cell()
+        elif tag == "b" and self._cell is not None and self._cell["bold_depth"]:
+            self._cell["bold_depth"] -= 1
+            # Only the first <b> is the label, like find_element(By.XPATH, ".//b").
+            self._cell["bold_closed"] = self._cell["bold_depth"] == 0
+
+    def handle_data(self, data):
+        if self._cell is None:
+            return
+        self._cell["text"].append(data)
+        if self._cell["bold_depth"] and not self._cell["bold_closed"]:
+            self._cell["bold"].append(data)
+
+    def data_rows(self):
+        """Returns (label, time text, date text) rows, restricted to <tbody> rows when the table has one."""
+        has_tbody = any(row[3] for row in self.rows)
+        return [row[:3] for row in self.rows if row[3] or not has_tbody]
+
+
+def _collapse(parts):
+    """Joins text fragments and normalizes whitespace within each line, like WebElement.text."""
+    if parts is None:
+        return ""
+    lines = "".join(parts).split("\n")
+    return "\n".join(" ".join(line.split()) for line in lines if line.strip())
+
+
+def parse_results_html(html):
+    """
+    Extracts the results-table rows from a muwaqqit.com page.
+
+    Returns:
+        tuple: (rows, table_found). rows is a list of (label, time cell text, date cell text).
+    """
+    parser = _ResultsTableParser()
+    parser.feed(html)
+    parser.close()
+    parser.close_row()
+    return parser.data_rows(), parser.table_found
+
+
+class HttpScraperSession:
+    """
+    Browserless muwaqqit.com backend: fetches the results page over a pooled, keep-alive
+    requests.Session and parses the table from the static HTML.
+
+    Has the same interface as ScraperSession. When the results table is not present in the
+    static HTML (e.g. the page starts rendering it client-side), that date is scraped with
+    the fallback Selenium session instead, which is only launched if it is actually needed.
+    """
+
+    def __init__(self, fallback_session=None, pool_size=HTTP_POOL_SIZE):
+        self.fallback_session = fallback_session if fallback_session is not None else ScraperSession()
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=HTTP_RETRY_TOTAL, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                              allowed_methods=frozenset(["GET"]))
+        )
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.http.headers.update({"User-Agent": BROWSER_USER_AGENT, "Accept": "text/html"})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        try:
+            self.http.close()
+        finally:
+            self.fallback_session.close()
+
+    def prefetch_prayer_times(self, dates, location_params):
+        """Pages are fetched on demand; there is nothing to prepare."""
+        return None
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        """
+        Fetches prayer start and end times for a date and location without a browser.
+
+        Args and return value match scrape_prayer_times.get_prayer_times_with_ends().
+        """
+        try:
+            _, _, op_timezone_str, op_address_for_display = resolve_location(location_params)
+            base_date_obj = resolve_target_date(target_date_obj_override, op_timezone_str)
+            url_to_fetch = build_muwaqqit_url(base_date_obj, location_params)
+            print(f"Fetching times over HTTP for location \"{op_address_for_display}\" (Timezone: {op_timezone_str}) for date: {base_date_obj.strftime('%Y-%m-%d')}")
+            started = time.time()
+            with span('http.fetch'):
+                response = self.http.get(url_to_fetch, timeout=PAGE_LOAD_TIMEOUT_SECONDS)
+                response.raise_for_status()
+            if not response.encoding or response.encoding.lower() == "iso-8859-1":
+                response.encoding = "utf-8" # requests' default for text/html without a charset would garble the labels
+            with span('http.parse'):
+                rows, table_found = parse_results_html(response.text)
+            print(f"Fetched and parsed page in {time.time() - started:.2f}s ({len(rows)} rows).")
+        except KeyboardInterrupt:
+            print("\nHTTP fetch interrupted by user (Ctrl+C).")
+            return None
+        except requests.RequestException as e:
+            print(f"HTTP error fetching prayer times: {e}")
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred during HTTP fetch: {e}")
+            return None
+
+        if not table_found or not rows:
+            print("Results table not found in the static HTML. Falling back to the browser scraper for this date.")
+            return self.fallback_session.get_prayer_times_with_ends(target_date_obj_override, location_params)
+
+        label_times = parse_results_rows(rows, ALL_TIME_LABELS_TO_SCRAPE)
+        return build_prayer_schedule(label_times, base_date_obj, PRAYER_DEFINITIONS, label_index=LABEL_INDEX)
+
+
+# --- END OF FILE http_prayer_times.py ---
\ No newline at end of file
@@ -0,0 +1,235 @@
+# --- START OF FILE ics_export.py ---
+
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+import pytz
+from config_loader import AtomicFile, get_config, get_state
+from calendar_reconciler import build_desired_events
+from schedule_cache import location_key
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the ICS export: {e}")
+    sys.exit(1)
+
+TARGET_TIMEZONE_STR = config.get('target_timezone')
+USER_LOCATION_ADDRESS_FALLBACK = config.get('user_location_address')
+ICS_PRODUCT_ID = "-//Prayer Calendar Manager//Prayer Times Export//EN"
+ICS_MAX_LINE_OCTETS = 75 # RFC 5545 3.1: lines longer than this are folded
+DEFAULT_EXPORT_DAYS = 365
+
+
+def _escape_text(value):
+    """Escapes a TEXT property value (RFC 5545 3.3.11)."""
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Splits a content line into 75-octet pieces without breaking a UTF-8 character."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= ICS_MAX_LINE_OCTETS:
+        return [line]
+    pieces = []
+    start = 0
+    limit = ICS_MAX_LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80: # Don't split a multi-byte character
+            end -= 1
+        pieces.append(encoded[start:end].decode('utf-8'))
+        start = end
+        limit = ICS_MAX_LINE_OCTETS - 1 # Continuation lines start with a space
+    return [pieces[0]] + [' ' + piece for piece in pieces[1:]]
+
+
+def _utc_stamp(aware_datetime):
+    return aware_datetime.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_uid(prayer_name, date_str, location_params):
+    """Stable UID, so re-importing an updated export replaces events instead of duplicating them."""
+    location = re.sub(r'[^A-Za-z0-9.-]+', '_', location_key(location_params)).strip('_')
+    return f"{prayer_name.lower()}-{date_str}-{location}@prayer-calendar-manager"
+
+
+class IcsWriter:
+    """
+    Streams VEVENTs into an RFC 5545 .ics file as they are produced, so an export of any
+    length never holds more than one event in memory.
+
+    The file is written to a temporary name and moved into place on close(), so an
+    interrupted export never leaves a truncated calendar behind.
+    """
+
+    def __init__(self, path, calendar_name=None, timezone_str=None):
+        self.path = path
+        self.events_written = 0
+        self._dtstamp = _utc_stamp(datetime.now(timezone.utc))
+        self._atomic_file = AtomicFile(path, newline='')
+        self._file = self._atomic_file.file
+        self._write('BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{ICS_PRODUCT_ID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH')
+        if calendar_name:
+            self._write(f'X-WR-CALNAME:{_escape_text(calendar_name)}')
+        if timezone_str:
+            self._write(f'X-WR-TIMEZONE:{timezone_str}') # Display hint only; event times are in UTC
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _write(self, *lines):
+        for line in lines:
+            for piece in _fold(line):
+                self._file.write(piece + '\r\n')
+
+    def write_event(self, body, uid, start_aware, end_aware):
+        """
+        Writes one event.
+
+        Args:
+            body (dict): Event resource from calendar_reconciler.build_prayer_event_body().
+            uid (str): Unique, stable identifier (see event_uid()).
+            start_aware (datetime): Timezone-aware start.
+            end_aware (datetime): Timezone-aware end.
+        """
+        self._write('BEGIN:VEVENT', f'UID:{uid}', f'DTSTAMP:{self._dtstamp}',
+                    f'DTSTART:{_utc_stamp(start_aware)}', f'DTEND:{_utc_stamp(end_aware)}',
+                    f"SUMMARY:{_escape_text(body['summary'])}", f"DESCRIPTION:{_escape_text(body.get('description', ''))}",
+                    'TRANSP:OPAQUE')
+        for override in body.get('reminders', {}).get('overrides', []):
+            self._write('BEGIN:VALARM', 'ACTION:DISPLAY', f"DESCRIPTION:{_escape_text(body['summary'])}",
+                        f"TRIGGER:-PT{int(override.get('minutes', 0))}M", 'END:VALARM')
+        self._write('END:VEVENT')
+        self.events_written += 1
+
+    def close(self):
+        """Finishes the calendar and moves it into place."""
+        self._write('END:VCALENDAR')
+        self._atomic_file.commit()
+
+    def abort(self):
+        """Discards a partially written export."""
+        self._atomic_file.abort()
+
+
+def export_ics(output_path, dates, location_params, prayer_time_source, calendar_name=None):
+    """
+    Writes the prayer events for 'dates' at one location to an .ics file.
+
+    The events have the same summary, times, reminder and description (with the muwaqqit.com
+    link) as the ones synced to Google Calendar. Days are fetched and written one at a time.
+
+    Args:
+        output_path (str): .ics file to write.
+        dates (list[datetime.date]): Days to export, in order.
+        location_params (dict): Location, as passed to get_prayer_times_with_ends().
+        prayer_time_source: Any prayer time backend; the local engine works fully offline.
+        calendar_name (str, optional): Calendar name shown by calendar apps.
+
+    Returns:
+        dict: 'events' written and 'failed_dates' (days whose times could not be fetched).
+    """
+    timezone_str = location_params.get('timezone', TARGET_TIMEZONE_STR)
+    target_tz = pytz.timezone(timezone_str)
+    failed_dates = []
+    written_keys = set()
+    prayer_time_source.prefetch_prayer_times(dates, location_params)
+    with IcsWriter(output_path, calendar_name=calendar_name, timezone_str=timezone_str) as writer:
+        for day in dates:
+            date_str = day.strftime('%Y-%m-%d')
+            prayer_schedule = prayer_time_source.get_prayer_times_with_ends(day, location_params)
+            if not prayer_schedule:
+                print(f"Could not get prayer times for {date_str}. Leaving that day out of the export.")
+                failed_dates.append(date_str)
+                continue
+            for key, event in build_desired_events({date_str: prayer_schedule}, target_tz, location_params).items():
+                if key in written_keys: # e.g. a late Isha that moved onto the next day's start date
+                    continue
+                written_keys.add(key)
+                writer.write_event(event['body'], event_uid(event['prayer_name'], event['date_str'], location_params),
+                                   event['start'], event['end'])
+        events_written = writer.events_written
+    return {'events': events_written, 'failed_dates': failed_dates}
+
+
+def _default_location():
+    """The last IP-based location from state.json, or the configured address."""
+    state = get_state()
+    if state.get('last_checked_latitude') is not None and state.get('last_checked_longitude') is not None:
+        timezone_str = state.get('last_checked_timezone') or TARGET_TIMEZONE_STR
+        return {'latitude': state['last_checked_latitude'], 'longitude': state['last_checked_longitude'], 'timezone': timezone_str,
+                'address_for_display': f"Last Known: Lat {state['last_checked_latitude']}, Lon {state['last_checked_longitude']}"}
+    return {'address': USER_LOCATION_ADDRESS_FALLBACK, 'timezone': TARGET_TIMEZONE_STR,
+            'address_for_display': USER_LOCATION_ADDRESS_FALLBACK}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports prayer times as an .ics calendar file, without Google Calendar.")
+    parser.add_argument('--output', default='prayer_times.ics', help="File to write (default: prayer_times.ics).")
+    parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="First day, YYYY-MM-DD (default: today in the location's timezone).")
+    parser.add_argument('--days', type=int, default=DEFAULT_EXPORT_DAYS, help=f"Number of days (default: {DEFAULT_EXPORT_DAYS}).")
+    parser.add_argument('--latitude', type=float)
+    parser.add_argument('--longitude', type=float)
+    parser.add_argument('--address', help="Address-based location (needs a scraping backend).")
+    parser.add_argument('--timezone', help="IANA timezone of the location (default: target_timezone).")
+    parser.add_argument('--backend', choices=('local', 'http', 'selenium'), default='local',
+                        help="Where the times come from (default: local, which works offline).")
+    parser.add_argument('--name', default='Prayer Times', help="Calendar name shown by calendar apps.")
+    args = parser.parse_args(argv)
+
+    if args.days < 1:
+        parser.error("--days must be at least 1.")
+    if (args.latitude is None) != (args.longitude is None):
+        parser.error("--latitude and --longitude must be given together.")
+    if args.latitude is not None:
+        timezone_str = args.timezone or TARGET_TIMEZONE_STR
+        location_params = {'latitude': args.latitude, 'longitude': args.longitude, 'timezone': timezone_str,
+                           'address_for_display': f"Lat {args.latitude}, Lon {args.longitude}"}
+    elif args.address:
+        timezone_str = args.timezone or TARGET_TIMEZONE_STR
+        location_params = {'address': args.address, 'timezone': timezone_str, 'address_for_display': args.address}
+    else:
+        location_params = _default_location()
+        if args.timezone:
+            location_params['timezone'] = args.timezone
+    try:
+        pytz.timezone(location_params['timezone'])
+    except pytz.UnknownTimeZoneError:
+        parser.error(f"Unknown timezone '{location_params['timezone']}'.")
+
+    start_date = args.start or datetime.now(pytz.timezone(location_params['timezone'])).date()
+    dates = [start_date + timedelta(days=i) for i in range(args.days)]
+    print(f"Exporting {args.days} day(s) from {start_date} for {location_params['address_for_display']} to {args.output}...")
+
+    from prayer_time_sources import open_prayer_time_source
+    started = datetime.now()
+    try:
+        with open_prayer_time_source(args.backend) as prayer_time_source:
+            result = export_ics(args.output, dates, location_params, prayer_time_source, calendar_name=args.name)
+    except KeyboardInterrupt:
+        print("\nExport interrupted by user (Ctrl+C). No file was written.")
+        return 1
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Wrote {result['events']} event(s) to {args.output} in {elapsed:.2f}s.")
+    if result['failed_dates']:
+        print(f"Warning: {len(result['failed_dates'])} day(s) could not be exported: {', '.join(result['failed_dates'])}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- END OF FILE ics_export.py ---
@@ -0,0 +1,390 @@
+# --- START OF FILE local_prayer_engine.py ---
+
+import math
+import sys
+import unicodedata
+import urllib.parse
+from datetime import datetime, timedelta
+import pytz
+from config_loader import get_config
+from prayer_schedule import schedule_label_index, build_prayer_schedule
+from run_metrics import span
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the local prayer time engine: {e}")
+    sys.exit(1)
+
+BASE_URL = config.get('muwaqqit_base_url')
+TARGET_TIMEZONE_STR = config.get('target_timezone')
+PRAYER_DEFINITIONS = config.get('prayer_definitions')
+HIGH_LATITUDE_RULE = config.get('high_latitude_rule', 'angle_based')
+
+EARTH_RADIUS_M = 6371000.0
+SOLAR_SEMI_DIAMETER_DEG = 16.0 / 60.0
+STANDARD_HORIZON_REFRACTION_DEG = 34.5 / 60.0 # At 1010 hPa and 10 °C
+SOLVER_ITERATIONS = 4
+
+# Where twilight never reaches a label's angle (e.g. Fajr and ʿIshāʾ at -19° in London in
+# June), or reaches it further from sunset/sunrise than a fraction of the night (sunset to
+# sunrise), the time is placed at that fraction instead ('high_latitude_rule'):
+#   none                - no adjustment; such labels are left out and the date fails
+#   middle_of_the_night - half the night
+#   one_seventh         - one seventh of the night
+#   angle_based         - angle/60 of the night (e.g. 19/60 for -19°)
+HIGH_LATITUDE_RULES = ('none', 'middle_of_the_night', 'one_seventh', 'angle_based')
+
+if HIGH_LATITUDE_RULE not in HIGH_LATITUDE_RULES:
+    print(f"FATAL: 'high_latitude_rule' must be one of {HIGH_LATITUDE_RULES}. Found: {HIGH_LATITUDE_RULE}. Exiting.")
+    sys.exit(1)
+
+# Defaults match the calculation parameters shipped in config.json's muwaqqit_base_url.
+DEFAULT_MUWAQQIT_PARAMS = {
+    "fa": -19.0,   # Fajr solar depression angle
+    "ea": -19.0,   # ʿIshāʾ (white twilight / al-Thānī) angle
+    "era": -16.0,  # ʿIshāʾ al-Awwal (red twilight) angle
+    "isn": -10.0,  # Ishtibāk al-Nujūm angle
+    "ia": 4.5,     # Ishrāq / Karāhah solar altitude
+    "eh": 0.0,     # Observer elevation above the horizon (m), used for horizon dip
+    "k": 0.155,    # Terrestrial refraction coefficient, used for horizon dip
+    "p": 1010.0,   # Air pressure (hPa), scales atmospheric refraction
+    "t": 10.0,     # Air temperature (°C), scales atmospheric refraction
+}
+
+# How each muwaqqit.com label is calculated. Kinds:
+#   ("altitude", side, param) - sun crosses the solar altitude given by that muwaqqit parameter
+#   ("horizon", side)         - apparent sunrise/sunset (refraction, semi-diameter and dip)
+#   ("transit",)              - solar noon
+#   ("asr", shadow_factor)    - shadow length equals shadow_factor x object + noon shadow
+#   ("half_night",)           - midpoint of Maghrib and the next day's Fajr (the sharʿī night)
+LABEL_CALCULATIONS = {
+    "Fajr": ("altitude", "morning", "fa"),
+    "Shurūq/Sunrise": ("horizon", "morning"),
+    "Ishrāq": ("altitude", "morning", "ia"),
+    "Ẓuhr": ("transit",),
+    "ʿAṣr al-Mithl al‑Awwal": ("asr", 1.0),
+    "ʿAṣr al-Mithl al‑Thānī": ("asr", 2.0),
+    "Karāhah": ("altitude", "evening", "ia"),
+    "Maghrib/Sunset": ("horizon", "evening"),
+    "Ishtibāk al‑Nujūm": ("altitude", "evening", "isn"),
+    "ʿIshāʾ al-Awwal": ("altitude", "evening", "era"),
+    "ʿIshāʾ al-Thānī": ("altitude", "evening", "ea"),
+    "Half sharʿī night": ("half_night",),
+}
+
+
+def high_latitude_night_fraction(rule, angle):
+    """
+    The fraction of the night a twilight label may lie from sunset/sunrise under 'rule'
+    (see HIGH_LATITUDE_RULES), or None when the rule is 'none'.
+    """
+    if rule == 'middle_of_the_night':
+        return 0.5
+    if rule == 'one_seventh':
+        return 1.0 / 7.0
+    if rule == 'angle_based':
+        return abs(angle) / 60.0
+    return None
+
+
+def _normalize_label(label):
+    """Normalizes a label so composed/decomposed accents and hyphen variants match."""
+    return unicodedata.normalize("NFC", label).replace("‑", "-")
+
+_LABEL_CALCULATIONS_BY_NORMALIZED = {_normalize_label(label): calc for label, calc in LABEL_CALCULATIONS.items()}
+
+
+def parse_muwaqqit_params(base_url):
+    """
+    Extracts the numeric calculation parameters from a muwaqqit.com URL.
+
+    Args:
+        base_url (str): e.g. config.json's muwaqqit_base_url.
+
+    Returns:
+        dict: DEFAULT_MUWAQQIT_PARAMS overlaid with every numeric query parameter in the URL.
+    """
+    params = dict(DEFAULT_MUWAQQIT_PARAMS)
+    query = urllib.parse.urlparse(base_url or "").query
+    for key, values in urllib.parse.parse_qs(query).items():
+        try:
+            params[key] = float(values[0])
+        except (ValueError, IndexError):
+            continue
+    return params
+
+
+def _julian_day(aware_datetime):
+    return 2440587.5 + aware_datetime.timestamp() / 86400.0
+
+
+def solar_declination_and_equation_of_time(julian_day):
+    """
+    Low-precision solar coordinates (NOAA / Meeus), good to well under a minute of time.
+
+    Returns:
+        tuple: (declination in degrees, equation of time in minutes)
+    """
+    T = (julian_day - 2451545.0) / 36525.0
+    mean_long = math.radians((280.46646 + T * (36000.76983 + 0.0003032 * T)) % 360.0)
+    mean_anom = math.radians(357.52911 + T * (35999.05029 - 0.0001537 * T))
+    eccentricity = 0.016708634 - T * (0.000042037 + 0.0000001267 * T)
+    center = (math.sin(mean_anom) * (1.914602 - T * (0.004817 + 0.000014 * T))
+              + math.sin(2 * mean_anom) * (0.019993 - 0.000101 * T)
+              + math.sin(3 * mean_anom) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * T)
+    apparent_long = math.radians(math.degrees(mean_long) + center - 0.00569 - 0.00478 * math.sin(omega))
+    mean_obliquity = 23.0 + (26.0 + (21.448 - T * (46.815 + T * (0.00059 - T * 0.001813))) / 60.0) / 60.0
+    obliquity = math.radians(mean_obliquity + 0.00256 * math.cos(omega))
+
+    declination = math.degrees(math.asin(math.sin(obliquity) * math.sin(apparent_long)))
+    y = math.tan(obliquity / 2.0) ** 2
+    equation_of_time = 4.0 * math.degrees(
+        y * math.sin(2 * mean_long)
+        - 2 * eccentricity * math.sin(mean_anom)
+        + 4 * eccentricity * y * math.sin(mean_anom) * math.cos(2 * mean_long)
+        - 0.5 * y * y * math.sin(4 * mean_long)
+        - 1.25 * eccentricity * eccentricity * math.sin(2 * mean_anom)
+    )
+    return declination, equation_of_time
+
+
+def horizon_altitude(params):
+    """
+    Apparent solar altitude (degrees) at sunrise/sunset for the given muwaqqit parameters.
+
+    Combines atmospheric refraction scaled by pressure 'p' and temperature 't', the solar
+    semi-diameter, and the horizon dip for observer elevation 'eh' with terrestrial refraction 'k'.
+    """
+    refraction = STANDARD_HORIZON_REFRACTION_DEG * (params["p"] / 1010.0) * (283.0 / (273.0 + params["t"]))
+    elevation = max(0.0, params.get("eh", 0.0))
+    dip = math.degrees(math.sqrt(2.0 * elevation * (1.0 - params["k"]) / EARTH_RADIUS_M))
+    return -(refraction + SOLAR_SEMI_DIAMETER_DEG + dip)
+
+
+def _hour_angle(latitude, declination, altitude):
+    """Hour angle (degrees) at which the sun reaches 'altitude', or None if it never does that day."""
+    lat_r, dec_r = math.radians(latitude), math.radians(declination)
+    cos_h = (math.sin(math.radians(altitude)) - math.sin(lat_r) * math.sin(dec_r)) / (math.cos(lat_r) * math.cos(dec_r))
+    if cos_h < -1.0 or cos_h > 1.0:
+        return None
+    return math.degrees(math.acos(cos_h))
+
+
+def _asr_altitude(latitude, declination, shadow_factor):
+    return math.degrees(math.atan(1.0 / (shadow_factor + math.tan(math.radians(abs(latitude - declination))))))
+
+
+def _event_utc_hours(calc, utc_midnight, latitude, longitude, params):
+    """
+    Solves one label for the UTC day starting at utc_midnight.
+
+    Returns:
+        float or None: Hours after utc_midnight (may be negative or exceed 24), or None
+                       if the sun never reaches the required altitude.
+    """
+    kind = calc[0]
+    hours = 12.0 - longitude / 15.0
+    for _ in range(SOLVER_ITERATIONS):
+        declination, equation_of_time = solar_declination_and_equation_of_time(
+            _julian_day(utc_midnight + timedelta(hours=hours)))
+        transit = 12.0 - longitude / 15.0 - equation_of_time / 60.0
+        if kind == "transit":
+            hours = transit
+            continue
+        if kind == "asr":
+            altitude, side = _asr_altitude(latitude, declination, calc[1]), "evening"
+        elif kind == "horizon":
+            altitude, side = horizon_altitude(params), calc[1]
+        else:
+            altitude, side = params[calc[2]], calc[1]
+        hour_angle = _hour_angle(latitude, declination, altitude)
+        if hour_angle is None:
+            return None
+        hours = transit - hour_angle / 15.0 if side == "morning" else transit + hour_angle / 15.0
+    return hours
+
+
+def _twilight_event_utc_hours(calc, utc_midnight, latitude, longitude, params, rule):
+    """
+    _event_utc_hours() for "altitude" labels, with the high-latitude rule applied to those
+    below the horizon: when the sun never reaches the angle, or reaches it further from
+    sunrise (morning) or sunset (evening) than the rule's fraction of the night, the time
+    is moved to that limit.
+    """
+    event_hours = _event_utc_hours(calc, utc_midnight, latitude, longitude, params)
+    angle = params[calc[2]]
+    fraction = high_latitude_night_fraction(rule, angle) if angle < 0 else None
+    if fraction is None:
+        return event_hours
+    sunrise = _event_utc_hours(LABEL_CALCULATIONS["Shurūq/Sunrise"], utc_midnight, latitude, longitude, params)
+    sunset = _event_utc_hours(LABEL_CALCULATIONS["Maghrib/Sunset"], utc_midnight, latitude, longitude, params)
+    if sunrise is None or sunset is None: # Polar day or night: there is no night to divide
+        return event_hours
+    portion = fraction * (sunrise + 24.0 - sunset)
+    if calc[1] == "morning":
+        if event_hours is None or sunrise - event_hours > portion:
+            return sunrise - portion
+    elif event_hours is None or event_hours - sunset > portion:
+        return sunset + portion
+    return event_hours
+
+
+def compute_label_times(base_date_obj, latitude, longitude, timezone_str, labels, params, high_latitude_rule=None):
+    """
+    Calculates muwaqqit.com-style label times for one date and location.
+
+    Args:
+        base_date_obj (datetime.date): The local date to calculate for.
+        latitude (float): Latitude in degrees.
+        longitude (float): Longitude in degrees (east positive).
+        timezone_str (str): IANA timezone the times are reported in.
+        labels (iterable): Labels to calculate (see LABEL_CALCULATIONS).
+        params (dict): Calculation parameters, e.g. from parse_muwaqqit_params().
+        high_latitude_rule (str, optional): One of HIGH_LATITUDE_RULES. Defaults to the configured rule.
+
+    Returns:
+        dict: label -> ("HH:MM:SS", date_offset), the same shape as the scraper's table
+              extraction. date_offset is 1/-1 when the time falls on the next/previous
+              local day (muwaqqit's ▲/▼). Labels that cannot be calculated are omitted.
+    """
+    local_tz = pytz.timezone(timezone_str)
+    rule = high_latitude_rule or HIGH_LATITUDE_RULE
+    utc_midnight = datetime(base_date_obj.year, base_date_obj.month, base_date_obj.day, tzinfo=pytz.utc)
+    next_utc_midnight = utc_midnight + timedelta(days=1)
+
+    def solve(calc, midnight):
+        if calc[0] == "altitude":
+            return _twilight_event_utc_hours(calc, midnight, latitude, longitude, params, rule)
+        return _event_utc_hours(calc, midnight, latitude, longitude, params)
+
+    def to_label_time(event_utc_hours):
+        event_utc = utc_midnight + timedelta(seconds=round(event_utc_hours * 3600.0))
+        event_local = event_utc.astimezone(local_tz)
+        return event_local.strftime("%H:%M:%S"), (event_local.date() - base_date_obj).days
+
+    label_times = {}
+    for label in labels:
+        calc = _LABEL_CALCULATIONS_BY_NORMALIZED.get(_normalize_label(label))
+        if calc is None:
+            print(f"Warning: The local prayer time engine does not know how to calculate '{label}'.")
+            continue
+        if calc[0] == "half_night":
+            sunset = solve(LABEL_CALCULATIONS["Maghrib/Sunset"], utc_midnight)
+            next_fajr = solve(LABEL_CALCULATIONS["Fajr"], next_utc_midnight)
+            if sunset is None or next_fajr is None:
+                continue
+            event_hours = (sunset + next_fajr + 24.0) / 2.0
+        else:
+            event_hours = solve(calc, utc_midnight)
+            if event_hours is None:
+                print(f"Warning: The sun does not reach the altitude for '{label}' on {base_date_obj.strftime('%Y-%m-%d')} at this latitude.")
+                continue
+        label_times[label] = to_label_time(event_hours)
+    return label_times
+
+
+class LocalPrayerEngine:
+    """
+    In-process prayer time calculator that mirrors the muwaqqit.com parameters in config.json.
+
+    It exposes the same get_prayer_times_with_ends() interface and context-manager protocol
+    as scrape_prayer_times.ScraperSession, so the two are interchangeable as backends.
+    Address-only locations cannot be calculated offline; for those the engine delegates
+    to 'fallback_session' (typically a ScraperSession) when one is given.
+    """
+
+    def __init__(self, base_url=None, prayer_definitions=None, fallback_session=None, high_latitude_rule=None):
+        self.params = parse_muwaqqit_params(base_url or BASE_URL)
+        self.high_latitude_rule = high_latitude_rule or HIGH_LATITUDE_RULE
+        self.prayer_definitions = prayer_definitions or PRAYER_DEFINITIONS
+        self.label_index = schedule_label_index(self.prayer_definitions)
+        self.labels = set(self.label_index)
+        self.fallback_session = fallback_session
+        self.prefetched = {} # (date, latitude, longitude, timezone) -> prayer schedule
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if self.fallback_session is not None:
+            self.fallback_session.close()
+
+    def prefetch_prayer_times(self, dates, location_params):
+        """
+        Calculates every date in one vectorized batch (see batch_prayer_engine) so the
+        following get_prayer_times_with_ends() calls for those dates are served from memory.
+        Does nothing for address-only locations or when NumPy is unavailable.
+        """
+        location_params = location_params or {}
+        latitude, longitude = location_params.get("latitude"), location_params.get("longitude")
+        if latitude is None or longitude is None:
+            if self.fallback_session is not None:
+                self.fallback_session.prefetch_prayer_times(dates, location_params)
+            return
+        try:
+            from batch_prayer_engine import compute_batch
+        except ImportError as e:
+            print(f"Batch calculation unavailable ({e}); calculating each date separately.")
+            return
+        timezone_str = location_params.get("timezone", TARGET_TIMEZONE_STR)
+        dates = list(dates)
+        with span('local.batch_compute'):
+            batch = compute_batch(dates, [(latitude, longitude, timezone_str)], labels=self.labels, params=self.params,
+                                  high_latitude_rule=self.high_latitude_rule)
+            for d, day in enumerate(dates):
+                schedule = batch.prayer_schedule(d, 0, self.prayer_definitions)
+                if schedule is not None:
+                    self.prefetched[(day, float(latitude), float(longitude), timezone_str)] = schedule
+        print(f"Calculated {len(dates)} day(s) of prayer times locally in one batch.")
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        """
+        Calculates prayer start and end times for a date and location.
+
+        Args and return value match scrape_prayer_times.get_prayer_times_with_ends().
+        """
+        location_params = location_params or {}
+        timezone_str = location_params.get("timezone", TARGET_TIMEZONE_STR)
+        latitude = location_params.get("latitude")
+        longitude = location_params.get("longitude")
+        if latitude is None or longitude is None:
+            if self.fallback_session is not None:
+                print("Local prayer time engine needs coordinates; using the fallback scraper for this address-based location.")
+                return self.fallback_session.get_prayer_times_with_ends(target_date_obj_override, location_params)
+            print("Error: The local prayer time engine needs latitude/longitude; address-only locations are not supported offline.")
+            return None
+
+        base_date_obj = target_date_obj_override or datetime.now(pytz.timezone(timezone_str)).date()
+        prefetched = self.prefetched.get((base_date_obj, float(latitude), float(longitude), timezone_str))
+        if prefetched is not None:
+            return prefetched
+        print(f"Calculating times locally for Lat {latitude}, Lon {longitude} (Timezone: {timezone_str}) for date: {base_date_obj.strftime('%Y-%m-%d')}")
+        try:
+            with span('local.compute'):
+                label_times = compute_label_times(base_date_obj, float(latitude), float(longitude), timezone_str, self.labels, self.params,
+                                                  self.high_latitude_rule)
+        except Exception as e:
+            print(f"An unexpected error occurred during local prayer time calculation: {e}")
+            return None
+        for label, (time_str, date_offset) in label_times.items():
+            print(f"Calculated: '{label}' -> {time_str}" + (f" (day offset {date_offset:+d})" if date_offset else ""))
+        return build_prayer_schedule(label_times, base_date_obj, self.prayer_definitions, label_index=self.label_index)
+
+
+if __name__ == '__main__':
+    # Quick check for Sydney CBD in the configured timezone.
+    engine = LocalPrayerEngine()
+    schedule = engine.get_prayer_times_with_ends(
+        location_params={"latitude": -33.8688, "longitude": 151.2093, "timezone": TARGET_TIMEZONE_STR})
+    if schedule:
+        for prayer, times in schedule.items():
+            print(f"{prayer}: Start: {times.get('start')} on {times.get('date_for_start')}, End: {times.get('end')} on {times.get('date_for_end')}")
+
+# --- END OF FILE local_prayer_engine.py ---
\ No newline at end of file
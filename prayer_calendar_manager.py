@@ -1,18 +1,29 @@
 # --- START OF FILE prayer_calendar_manager.py ---
 
-from google_calendar_setup import authenticate_google_calendar, HttpError
-from scrape_prayer_times import get_prayer_times_with_ends # This will be called for each day
+from googleapiclient.errors import HttpError
+from prayer_time_sources import open_prayer_time_source, PRAYER_TIME_BACKEND, PRAYER_TIME_BACKENDS
+from calendar_batch import CalendarWriteBatch
+from calendar_mirror import CalendarMirror
+from rate_limiter import get_rate_limiter
+from calendar_reconciler import (
+    MANAGED_EVENT_FILTER, DEFAULT_PROFILE_NAME, WRITTEN_EVENTS_STATE_KEY, WrittenEventLog,
+    managed_event_tags, is_managed_prayer_event, prayer_event_key,
+)
+from run_pipeline import run_window_pipeline
+from run_metrics import span, start_run, finish_run
 from datetime import datetime, timedelta, time as dt_time
 import pytz
-from config_loader import load_config, save_config
+from config_loader import get_config, get_state, update_state, update_state_entries, flush_state
 import sys
-import requests # for IP lookup
-from geopy.distance import geodesic # for distance calculation
-import urllib.parse
+import argparse
+import contextlib
+# The prayer time backends (selenium, webdriver-manager, numpy), the Google client
+# (googleapiclient.discovery, google-auth-oauthlib), geolocation and geopy are imported
+# where they are used, so only the ones a run actually needs are loaded.
 
 # Load configuration
 try:
-    config = load_config()
+    config = get_config()
 except Exception as e:
     print(f"FATAL: Could not load configuration for Calendar Manager: {e}")
     sys.exit(1)
@@ -24,14 +35,20 @@ TARGET_TIMEZONE_STR = config.get('target_timezone') # Still used as a fallback/d
 MANAGED_PRAYER_NAMES = config.get('managed_prayer_names')
 MUWAQQIT_BASE_URL_FOR_DESC = config.get('muwaqqit_base_url') # Base URL for description, still needed
 DAYS_TO_PROCESS_IN_ADVANCE = config.get('processing_days_in_advance', 1)
+CALENDAR_BATCH_SIZE = config.get('calendar_batch_size', 50) # Writes per Calendar API batch request
+CALENDAR_MIRROR_CONFIG = config.get('calendar_mirror', {})
+CALENDAR_WRITE_MODE = config.get('calendar_write_mode', 'reconcile') # 'reconcile' (list, then diff) or 'upsert' (blind writes, no listing)
+CALENDAR_WRITE_MODES = ('reconcile', 'upsert')
+RECONCILED_CALENDARS_STATE_KEY = 'reconciled_calendars' # state.json: "calendar_id/profile" -> when it was reconciled onto deterministic IDs
 
 # --- LOCATION-RELATED CONFIGS ---
 LOCATION_CHECK_ENABLED = config.get('location_check_enabled', False)
 LOCATION_THRESHOLD_KM = config.get('location_threshold_km', 20.0)
-LAST_CHECKED_IP = config.get('last_checked_ip')
-LAST_CHECKED_LATITUDE = config.get('last_checked_latitude')
-LAST_CHECKED_LONGITUDE = config.get('last_checked_longitude')
-LAST_CHECKED_TIMEZONE = config.get('last_checked_timezone')
+_state = get_state() # Last checked location, kept in state.json rather than config.json
+LAST_CHECKED_IP = _state.get('last_checked_ip')
+LAST_CHECKED_LATITUDE = _state.get('last_checked_latitude')
+LAST_CHECKED_LONGITUDE = _state.get('last_checked_longitude')
+LAST_CHECKED_TIMEZONE = _state.get('last_checked_timezone')
 # ------------------------------------
 
 # Validate critical configurations
@@ -48,207 +65,235 @@ for key, value in critical_configs.items():
 if not isinstance(DAYS_TO_PROCESS_IN_ADVANCE, int) or DAYS_TO_PROCESS_IN_ADVANCE < 1:
     print(f"FATAL: 'processing_days_in_advance' must be an integer >= 1. Found: {DAYS_TO_PROCESS_IN_ADVANCE}. Exiting.")
     sys.exit(1)
+PRAYER_NAME_BY_SUMMARY = {f'{prayer_name} Prayer': prayer_name for prayer_name in MANAGED_PRAYER_NAMES}
+if PRAYER_TIME_BACKEND not in PRAYER_TIME_BACKENDS:
+    print(f"FATAL: 'prayer_time_backend' must be one of {PRAYER_TIME_BACKENDS}. Found: {PRAYER_TIME_BACKEND}. Exiting.")
+    sys.exit(1)
+if CALENDAR_WRITE_MODE not in CALENDAR_WRITE_MODES:
+    print(f"FATAL: 'calendar_write_mode' must be one of {CALENDAR_WRITE_MODES}. Found: {CALENDAR_WRITE_MODE}. Exiting.")
+    sys.exit(1)
 
-def get_current_device_location():
+def get_current_device_location(last_known=None):
     """
     Fetches the current public IP and geolocates it to get latitude, longitude, and timezone.
     Returns (ip, latitude, longitude, timezone) or (None, None, None, None) on failure.
+
+    If last_known ('ip', 'latitude', 'longitude', 'timezone') has the same IP, its location
+    is reused without a geolocation request; see geolocation.IpGeolocator.
     """
-    print("Attempting to get current device location via IP geolocation...")
-    ip = None
-    try:
-        # Get public IP address
-        ip_response = requests.get("https://api.ipify.org?format=json", timeout=5)
-        ip_response.raise_for_status()
-        ip = ip_response.json().get("ip")
-        print(f"Public IP address: {ip}")
-    except Exception as e:
-        print(f"Error getting public IP: {e}")
-        return None, None, None, None
+    from geolocation import get_geolocator
+    with span('geolocation'):
+        return get_geolocator().locate(last_known)
 
-    if not ip:
-        return None, None, None, None
+def index_prayer_events(events, target_tz, prayer_name_by_summary=None):
+    """
+    Indexes managed prayer events by (local start date, prayer name).
 
-    # Geocode IP to location
-    # Using ip-api.com, which is free for non-commercial use, up to 45 requests/minute
-    try:
-        geo_response = requests.get(f"http://ip-api.com/json/{ip}", timeout=5)
-        geo_response.raise_for_status()
-        geo_data = geo_response.json()
-
-        if geo_data.get("status") == "success":
-            latitude = geo_data.get("lat")
-            longitude = geo_data.get("lon")
-            timezone = geo_data.get("timezone") # e.g., "America/New_York"
-            print(f"Geolocation successful: Lat={latitude}, Lon={longitude}, Timezone={timezone}")
-            return ip, latitude, longitude, timezone
+    Events are identified by their private tags (see calendar_reconciler.managed_event_tags()).
+    Untagged events, written before events were tagged, are matched by summary instead and
+    indexed for any key no tagged event has, so a partly migrated window still finds them:
+    they are adopted (tagged) by the next reconciliation, and legacy copies of a key that
+    already has a tagged event are reported as duplicates.
+
+    Args:
+        events (iterable): Google Calendar event resources.
+        target_tz (pytz.timezone): Timezone used to work out the local start date of untagged events.
+        prayer_name_by_summary (dict, optional): Event summary -> prayer name for managed events.
+            Defaults to the prayers in 'managed_prayer_names'.
+
+    Returns:
+        tuple: (index, duplicates). index maps ('YYYY-MM-DD', prayer_name) to the event
+               resource; duplicates lists any further events found for a key already indexed.
+    """
+    prayer_name_by_summary = prayer_name_by_summary or PRAYER_NAME_BY_SUMMARY
+    events = [event for event in events if event.get('status') != 'cancelled']
+    tagged_events = [event for event in events if managed_event_tags(event) is not None]
+    legacy_events = [event for event in events if managed_event_tags(event) is None]
+    index = {}
+    duplicates = []
+    for event in tagged_events + legacy_events: # Tagged events take precedence for a key
+        key = prayer_event_key(event, target_tz, prayer_name_by_summary)
+        if key is None:
+            continue
+        if key in index:
+            duplicates.append(event)
         else:
-            print(f"IP geolocation failed for {ip}: {geo_data.get('message', 'Unknown error')}")
-            return ip, None, None, None
-    except Exception as e:
-        print(f"Error during IP geolocation for {ip}: {e}")
-        return ip, None, None, None
+            index[key] = event
+    return index, duplicates
 
-def get_existing_prayer_events_for_day(service, target_date_obj, target_tz):
+def get_existing_prayer_events_for_window(service, start_date_obj, days, target_tz, calendar_id=None, prayer_name_by_summary=None,
+                                          include_untagged=False):
     """
-    Retrieves existing managed prayer events from the Google Calendar for a specific day.
+    Retrieves existing managed prayer events for the whole processing window with one listing.
+
+    The listing is filtered server-side to the events this app tagged, so user-created events
+    are never downloaded. If it finds none, the window is listed again unfiltered once, to
+    pick up (and adopt) events written before events were tagged.
 
     Args:
         service (googleapiclient.discovery.Resource): The authenticated Google Calendar API service.
-        target_date_obj (datetime.date): The date object for which to fetch events.
-        target_tz (pytz.timezone): The timezone object for the target date.
+        start_date_obj (datetime.date): First day of the window.
+        days (int): Number of days in the window.
+        target_tz (pytz.timezone): The timezone object for the window's dates.
+        calendar_id (str, optional): Calendar to list. Defaults to 'calendar_id' from config.json.
+        prayer_name_by_summary (dict, optional): Passed on to index_prayer_events().
+        include_untagged (bool): List the window unfiltered right away, so untagged events are
+            found even next to tagged ones (see calendar_write_mode()).
 
     Returns:
-        dict: A dictionary where keys are event summaries (e.g., 'Fajr Prayer')
-              and values are the Google Calendar event resource objects for
-              existing managed prayer events on that day. Returns an empty dict
-              if an error occurs or no events are found.
+        tuple or None: (index, duplicates) as returned by index_prayer_events(), or None if the
+                       listing failed (so the caller does not create duplicates blindly).
     """
-    print(f"Listing existing prayer events on {target_date_obj.strftime('%Y-%m-%d')}...")
-    day_start_naive = datetime.combine(target_date_obj, dt_time.min)
-    day_end_naive = datetime.combine(target_date_obj, dt_time.max)
-    day_start_aware = target_tz.localize(day_start_naive)
-    day_end_aware = target_tz.localize(day_end_naive)
-
-    existing_events_map = {}
+    window_end_date_obj = start_date_obj + timedelta(days=days)
+    print(f"Listing existing prayer events from {start_date_obj.strftime('%Y-%m-%d')} to {window_end_date_obj.strftime('%Y-%m-%d')}...")
+    window_start_aware = target_tz.localize(datetime.combine(start_date_obj, dt_time.min))
+    # One extra day so events that start just after midnight (e.g. a late Isha) are included.
+    window_end_aware = target_tz.localize(datetime.combine(window_end_date_obj + timedelta(days=1), dt_time.min))
+
+    events = _list_window_events(service, calendar_id or CALENDAR_ID, window_start_aware, window_end_aware,
+                                 None if include_untagged else MANAGED_EVENT_FILTER)
+    if events == [] and not include_untagged:
+        print("No tagged prayer events in the processing window. Looking for untagged ones to adopt...")
+        events = _list_window_events(service, calendar_id or CALENDAR_ID, window_start_aware, window_end_aware)
+    if events is None:
+        return None
+
+    index, duplicates = index_prayer_events(events, target_tz, prayer_name_by_summary)
+    print(f"Found {len(index)} managed prayer events in the processing window ({len(events)} events listed).")
+    if duplicates:
+        print(f"Warning: Found {len(duplicates)} duplicate managed prayer event(s) in the processing window.")
+    return index, duplicates
+
+def _list_window_events(service, calendar_id, window_start_aware, window_end_aware, private_property_filter=None):
+    """Lists every event in the window, optionally filtered by a private extended property. None on error."""
+    list_kwargs = {'privateExtendedProperty': private_property_filter} if private_property_filter else {}
+    events = []
     page_token = None
     while True:
         try:
-            events_result = service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=day_start_aware.isoformat(),
-                timeMax=day_end_aware.isoformat(),
-                singleEvents=True,
-                orderBy='startTime',
-                pageToken=page_token
-            ).execute()
-            events = events_result.get('items', [])
-
-            for event in events:
-                summary = event.get('summary', '')
-                is_managed_prayer_event = any(f'{prayer_name} Prayer' == summary for prayer_name in MANAGED_PRAYER_NAMES)
-                if is_managed_prayer_event:
-                    existing_events_map[summary] = event
-
+            with span('calendar.list'):
+                events_result = get_rate_limiter().execute(service.events().list(
+                    calendarId=calendar_id,
+                    timeMin=window_start_aware.isoformat(),
+                    timeMax=window_end_aware.isoformat(),
+                    singleEvents=True,
+                    maxResults=2500,
+                    pageToken=page_token,
+                    **list_kwargs
+                ), label='window listing')
+            events.extend(events_result.get('items', []))
             page_token = events_result.get('nextPageToken')
             if not page_token:
-                break
+                return events
         except HttpError as e:
-            print(f"API error listing events for {target_date_obj.strftime('%Y-%m-%d')}: {e}")
-            return {}
+            print(f"API error listing events for the processing window: {e}")
+            return None
         except Exception as e_list:
-            print(f"Unexpected error listing events for {target_date_obj.strftime('%Y-%m-%d')}: {e_list}")
-            return {}
-
-    print(f"Found {len(existing_events_map)} managed prayer events for {target_date_obj.strftime('%Y-%m-%d')}.")
-    return existing_events_map
-
-def create_or_update_prayer_event(service, prayer_name, start_dt_aware, end_dt_aware, date_str_for_desc_url, target_tz_obj, location_data_for_description, existing_event_data=None):
-    event_summary = f'{prayer_name} Prayer'
-
-    # --- Construct dynamic description URL ---
-    # MUWAQQIT_BASE_URL_FOR_DESC should be the clean base URL from config
-    # (the one without any location parameters, same as used by scraper)
-    
-    # Load the clean base URL, as MUWAQQIT_BASE_URL_FOR_DESC might be the old full one if not updated
-    # Best to rely on the already cleaned BASE_URL from config used by scraper for consistency
-    # For simplicity here, we'll assume MUWAQQIT_BASE_URL_FOR_DESC is the cleaned one.
-    # If not, you should use config.get('muwaqqit_base_url') here too.
-    
-    base_desc_url = config.get('muwaqqit_base_url') # Use the cleaned base URL
-    
-    url_params_desc = []
-    loc_display_name = "configured location" # Fallback display name
-
-    if location_data_for_description:
-        loc_tz = location_data_for_description.get("timezone", target_tz_obj.zone) # Fallback to event's timezone
-        if "latitude" in location_data_for_description and "longitude" in location_data_for_description:
-            lat = location_data_for_description["latitude"]
-            lon = location_data_for_description["longitude"]
-            url_params_desc.append(f"lt={lat}")
-            url_params_desc.append(f"ln={lon}")
-            url_params_desc.append(f"tz={urllib.parse.quote_plus(loc_tz)}")
-            loc_display_name = f"Lat {lat}, Lon {lon}"
-        elif "address" in location_data_for_description:
-            address = location_data_for_description["address"]
-            url_params_desc.append(f"add={urllib.parse.quote_plus(address)}")
-            url_params_desc.append(f"tz={urllib.parse.quote_plus(loc_tz)}")
-            loc_display_name = address
-        # If neither, it will just be the base_desc_url + date
-    
-    url_params_desc.append(f"d={date_str_for_desc_url}")
-    dynamic_muwaqqit_url = f"{base_desc_url}&{'&'.join(url_params_desc)}"
-    # --- End of dynamic URL construction ---
-
-    event_description = (
-        f"Time for {prayer_name} prayer.\n"
-        f"Prayer times calculated for location: {loc_display_name} (Timezone: {loc_tz})\n"
-        f"URL for this day's times: {dynamic_muwaqqit_url}"
-    )
-
-    event_body = {
-        'summary': event_summary,
-        'start': {'dateTime': start_dt_aware.isoformat(), 'timeZone': target_tz_obj.zone},
-        'end': {'dateTime': end_dt_aware.isoformat(), 'timeZone': target_tz_obj.zone},
-        'reminders': {
-            'useDefault': False,
-            'overrides': [{'method': 'popup', 'minutes': EVENT_REMINDER_MINUTES}],
-        },
-        'description': event_description,
-    }
-
-    if existing_event_data:
-        try:
-            existing_start_str = existing_event_data.get('start', {}).get('dateTime')
-            existing_end_str = existing_event_data.get('end', {}).get('dateTime')
-            existing_start_dt = datetime.fromisoformat(existing_start_str).astimezone(target_tz_obj)
-            existing_end_dt = datetime.fromisoformat(existing_end_str).astimezone(target_tz_obj)
-            needs_update = (
-                existing_start_dt != start_dt_aware or
-                existing_end_dt != end_dt_aware or
-                existing_event_data.get('description') != event_description # Also check if description changed
-            )
-        except Exception as e_comp:
-            print(f"Error comparing event data for {event_summary} on {date_str_for_desc_url}, forcing update: {e_comp}")
-            needs_update = True
-
-        if needs_update:
-            try:
-                print(f"Updating event for {prayer_name} on {date_str_for_desc_url}...")
-                updated_event = service.events().update(
-                    calendarId=CALENDAR_ID, eventId=existing_event_data['id'], body=event_body).execute()
-                print(f"Event updated for {prayer_name}: {updated_event.get('htmlLink')}")
-            except HttpError as e:
-                print(f"API error updating event for {prayer_name} on {date_str_for_desc_url}: {e}")
-            except Exception as e_upd:
-                print(f"Unexpected error updating event for {prayer_name} on {date_str_for_desc_url}: {e_upd}")
-        else:
-            print(f"Event for {prayer_name} on {date_str_for_desc_url} is already up-to-date. No action taken.")
-    else:
-        try:
-            print(f"Creating new event for {prayer_name} on {date_str_for_desc_url}...")
-            created_event = service.events().insert(calendarId=CALENDAR_ID, body=event_body).execute()
-            print(f"Event created for {prayer_name}: {created_event.get('htmlLink')}")
-        except HttpError as e:
-            print(f"API error creating event for {prayer_name} on {date_str_for_desc_url}: {e}")
-        except Exception as e_crt:
-            print(f"Unexpected error creating event for {prayer_name} on {date_str_for_desc_url}: {e_crt}")
+            print(f"Unexpected error listing events for the processing window: {e_list}")
+            return None
+
+def get_existing_prayer_events_from_mirror(mirror, service, start_date_obj, days, target_tz, prayer_name_by_summary=None):
+    """
+    Same contract as get_existing_prayer_events_for_window(), but answered from the local
+    CalendarMirror after an incremental sync (typically one small delta request).
 
-def main():
-    print("Starting Prayer Calendar Manager...")
+    Returns None if the mirror could not be synced.
+    """
+    with span('calendar.mirror_refresh'):
+        mirror_is_current = mirror.refresh(service)
+    if not mirror_is_current:
+        return None
+    window_start_aware = target_tz.localize(datetime.combine(start_date_obj, dt_time.min))
+    window_end_aware = target_tz.localize(datetime.combine(start_date_obj + timedelta(days=days + 1), dt_time.min))
+    index, duplicates = index_prayer_events(mirror.events_between(window_start_aware, window_end_aware), target_tz, prayer_name_by_summary)
+    print(f"Found {len(index)} managed prayer events in the processing window (from the calendar mirror).")
+    if duplicates:
+        print(f"Warning: Found {len(duplicates)} duplicate managed prayer event(s) in the processing window.")
+    return index, duplicates
+
+def calendar_write_mode(calendar_id, profile_name=DEFAULT_PROFILE_NAME):
+    """
+    Returns the write mode to use for one calendar (and fleet profile).
+
+    'upsert' only writes deterministic IDs, so older events with random IDs would stay next
+    to them as duplicates. Until a reconcile run has moved a calendar's events onto their
+    deterministic IDs (see record_sync_result()), 'reconcile' is used instead.
+    """
+    reconciled = get_state().get(RECONCILED_CALENDARS_STATE_KEY, {})
+    if CALENDAR_WRITE_MODE == 'upsert' and f'{calendar_id}/{profile_name}' not in reconciled:
+        print("Upsert mode: reconciling this calendar once first, to move existing events onto deterministic IDs.")
+        return 'reconcile'
+    return CALENDAR_WRITE_MODE
+
+def sync_callbacks(written_events, calendar_mirror=None):
+    """Returns the (on_any_success, on_deleted) callbacks that keep the written-event log and the mirror current."""
+    def on_write_success(event):
+        written_events.record(event)
+        if calendar_mirror:
+            calendar_mirror.apply(event)
+
+    def on_deleted(event_id):
+        written_events.forget(event_id)
+        if calendar_mirror:
+            calendar_mirror.remove(event_id)
+    return on_write_success, on_deleted
+
+def record_sync_result(run_result, write_mode, written_events, calendar_id, window_start_date, profile_name=DEFAULT_PROFILE_NAME):
+    """
+    Saves what a (non dry) run wrote to state.json: the written-event log, including events a
+    reconciliation found already current, and whether a reconcile run completed cleanly,
+    which allows 'upsert' mode for that calendar from then on. Both are saved entry by
+    entry, so runs for other calendars (e.g. fleet profiles or another process) are kept.
+    """
+    for _, existing_event in run_result['plan'].noops:
+        if existing_event is not None:
+            written_events.record(existing_event)
+    written_events.prune((window_start_date - timedelta(days=1)).strftime('%Y-%m-%d'))
+    if written_events.changed:
+        update_state_entries(WRITTEN_EVENTS_STATE_KEY, written_events.updated, removed=written_events.removed)
+    calendar_key = f'{calendar_id}/{profile_name}'
+    if (write_mode == 'reconcile' and calendar_key not in get_state().get(RECONCILED_CALENDARS_STATE_KEY, {})
+            and not run_result['listing_failed'] and not run_result['scraping_failed'] and not run_result['writes_failed']):
+        update_state_entries(RECONCILED_CALENDARS_STATE_KEY, {calendar_key: datetime.now().isoformat(timespec='seconds')})
+
+def run_sync(dry_run=False, prayer_time_source=None):
+    """
+    Runs one sync of the processing window: works out the location, fetches the prayer
+    times and reconciles the calendar. Phase timings are saved as a run metrics report
+    (see run_metrics.finish_run()).
+
+    Args:
+        dry_run (bool): Print the plan without writing to the calendar or state.json.
+        prayer_time_source (optional): An already open backend to reuse (e.g. by the daemon,
+            which keeps its browser warm between runs). If None, one is opened and closed here.
+
+    Returns:
+        int: Process exit code, 0 on success and 1 on failure.
+    """
+    start_run('dry-run' if dry_run else 'sync')
+    exit_code = 1
+    try:
+        exit_code = _run_sync(dry_run, prayer_time_source)
+    finally:
+        flush_state()
+        finish_run('ok' if exit_code == 0 else 'failed')
+    return exit_code
+
+def _run_sync(dry_run, prayer_time_source):
     gcal_service = None
 
-    current_app_config = load_config()
+    current_app_config = get_config()
+    current_state = get_state()
     global LOCATION_CHECK_ENABLED, LOCATION_THRESHOLD_KM
     global LAST_CHECKED_IP, LAST_CHECKED_LATITUDE, LAST_CHECKED_LONGITUDE, LAST_CHECKED_TIMEZONE
     global USER_LOCATION_ADDRESS_FALLBACK, TARGET_TIMEZONE_STR
 
     LOCATION_CHECK_ENABLED = current_app_config.get('location_check_enabled', False)
     LOCATION_THRESHOLD_KM = current_app_config.get('location_threshold_km', 20.0)
-    LAST_CHECKED_IP = current_app_config.get('last_checked_ip')
-    LAST_CHECKED_LATITUDE = current_app_config.get('last_checked_latitude')
-    LAST_CHECKED_LONGITUDE = current_app_config.get('last_checked_longitude')
-    LAST_CHECKED_TIMEZONE = current_app_config.get('last_checked_timezone')
+    LAST_CHECKED_IP = current_state.get('last_checked_ip')
+    LAST_CHECKED_LATITUDE = current_state.get('last_checked_latitude')
+    LAST_CHECKED_LONGITUDE = current_state.get('last_checked_longitude')
+    LAST_CHECKED_TIMEZONE = current_state.get('last_checked_timezone')
     USER_LOCATION_ADDRESS_FALLBACK = current_app_config.get('user_location_address')
     TARGET_TIMEZONE_STR = current_app_config.get('target_timezone')
 
@@ -261,7 +306,10 @@ def main():
         location_data_for_scraper = {}
 
         if LOCATION_CHECK_ENABLED:
-            current_ip, current_latitude, current_longitude, current_timezone = get_current_device_location()
+            current_ip, current_latitude, current_longitude, current_timezone = get_current_device_location({
+                'ip': LAST_CHECKED_IP, 'latitude': LAST_CHECKED_LATITUDE,
+                'longitude': LAST_CHECKED_LONGITUDE, 'timezone': LAST_CHECKED_TIMEZONE
+            })
 
             if current_ip is None or current_latitude is None or current_longitude is None or current_timezone is None:
                 print("Could not determine current location accurately via IP geolocation.")
@@ -284,6 +332,7 @@ def main():
             elif LAST_CHECKED_LATITUDE is not None and LAST_CHECKED_LONGITUDE is not None and LAST_CHECKED_TIMEZONE is not None:
                 old_coords = (LAST_CHECKED_LATITUDE, LAST_CHECKED_LONGITUDE)
                 new_coords = (current_latitude, current_longitude)
+                from geopy.distance import geodesic # for distance calculation
                 distance_km = geodesic(old_coords, new_coords).km
                 print(f"Distance from last known location: {distance_km:.2f} km.")
 
@@ -311,14 +360,12 @@ def main():
                     "address_for_display": f"Current IP Location: Lat {current_latitude}, Lon {current_longitude}"
                 }
             
-            if location_changed_or_first_run and current_latitude is not None: # Only save if we got valid current geo data and it's a change/first run
-                updated_config = load_config()
-                updated_config['last_checked_ip'] = current_ip
-                updated_config['last_checked_latitude'] = current_latitude
-                updated_config['last_checked_longitude'] = current_longitude
-                updated_config['last_checked_timezone'] = current_timezone
-                save_config(updated_config)
-                print("Updated last known location in config.json with current IP-based location.")
+            if location_changed_or_first_run and current_latitude is not None and dry_run:
+                print("Dry run: not saving the new location to state.json.")
+            elif location_changed_or_first_run and current_latitude is not None: # Only save if we got valid current geo data and it's a change/first run
+                update_state(last_checked_ip=current_ip, last_checked_latitude=current_latitude,
+                             last_checked_longitude=current_longitude, last_checked_timezone=current_timezone)
+                print("Updated last known location with current IP-based location (saved to state.json at the end of the run).")
         
         else: # Location check is disabled
             print("Location check disabled. Using configured user_location_address and target_timezone.")
@@ -336,82 +383,97 @@ def main():
         print(f"Using effective timezone for operations: {effective_timezone_for_ops}")
         target_tz = pytz.timezone(effective_timezone_for_ops)
 
-        gcal_service = authenticate_google_calendar()
+        from google_calendar_setup import authenticate_google_calendar
+        with span('auth'):
+            gcal_service = authenticate_google_calendar()
         if not gcal_service:
             print("Failed to authenticate with Google Calendar. Exiting.")
-            sys.exit(1)
-
-        for i in range(DAYS_TO_PROCESS_IN_ADVANCE):
-            # It will use the `location_data_for_scraper` and `target_tz` determined above.
-            current_processing_date = (datetime.now(target_tz) + timedelta(days=i)).date()
-            current_processing_date_str = current_processing_date.strftime('%Y-%m-%d')
-            print(f"\n--- Processing for date: {current_processing_date_str} ---")
-            existing_events_on_this_day = get_existing_prayer_events_for_day(gcal_service, current_processing_date, target_tz)
-            print(f"Scraping prayer times for {current_processing_date_str} for location: {location_data_for_scraper.get('address_for_display', 'N/A')}")
-            
-            prayer_schedule_for_this_day = get_prayer_times_with_ends(
-                target_date_obj_override=current_processing_date,
-                location_params=location_data_for_scraper
+            return 1
+
+        write_mode = calendar_write_mode(CALENDAR_ID)
+        calendar_mirror = None
+        if CALENDAR_MIRROR_CONFIG.get('enabled', False) and write_mode == 'reconcile':
+            calendar_mirror = CalendarMirror(
+                CALENDAR_MIRROR_CONFIG.get('path', 'calendar_mirror.json'), CALENDAR_ID,
+                is_managed_event=lambda event: is_managed_prayer_event(event, PRAYER_NAME_BY_SUMMARY)
+            )
+        written_events = WrittenEventLog(get_state().get(WRITTEN_EVENTS_STATE_KEY))
+        on_write_success, on_deleted = sync_callbacks(written_events, calendar_mirror)
+        write_batch = CalendarWriteBatch(gcal_service, batch_size=CALENDAR_BATCH_SIZE, on_any_success=on_write_success)
+        window_start_date = datetime.now(target_tz).date()
+        window_dates = [window_start_date + timedelta(days=i) for i in range(DAYS_TO_PROCESS_IN_ADVANCE)]
+
+        def list_existing_events():
+            existing_events_listing = None
+            if calendar_mirror:
+                existing_events_listing = get_existing_prayer_events_from_mirror(calendar_mirror, gcal_service, window_start_date, DAYS_TO_PROCESS_IN_ADVANCE, target_tz)
+            if existing_events_listing is None:
+                existing_events_listing = get_existing_prayer_events_for_window(gcal_service, window_start_date, DAYS_TO_PROCESS_IN_ADVANCE, target_tz,
+                                                                                include_untagged=write_mode != CALENDAR_WRITE_MODE)
+            return existing_events_listing
+
+        source_context = contextlib.nullcontext(prayer_time_source) if prayer_time_source is not None else open_prayer_time_source()
+        with source_context as prayer_time_source:
+            prayer_time_source.prefetch_prayer_times(window_dates, location_data_for_scraper)
+            run_result = run_window_pipeline(
+                gcal_service, prayer_time_source, window_dates, location_data_for_scraper, target_tz,
+                list_existing_events if write_mode == 'reconcile' else None, PRAYER_NAME_BY_SUMMARY, write_batch, dry_run=dry_run,
+                on_deleted=on_deleted, written_events=written_events
             )
 
-            if prayer_schedule_for_this_day is None:
-                print(f"Scraping for {current_processing_date_str} was interrupted or failed. Aborting further processing.")
-                sys.exit(1)
-            if not prayer_schedule_for_this_day:
-                print(f"Failed to scrape prayer times for {current_processing_date_str}. Skipping this day.")
-                continue
-
-            print(f"\nPrayer Schedule to Process for {current_processing_date_str}:")
-            for p, t_info in prayer_schedule_for_this_day.items():
-                 print(f"  {p}: Start: {t_info.get('start')} on {t_info.get('date_for_start')}, End: {t_info.get('end')} on {t_info.get('date_for_end')}")
-
-            print(f"\nProcessing and creating/updating Google Calendar events for {current_processing_date_str}...")
-            for prayer_name, times_info in prayer_schedule_for_this_day.items():
-                start_time_str = times_info.get('start')
-                end_time_str = times_info.get('end')
-                start_date_str = times_info.get('date_for_start')
-                end_date_str = times_info.get('date_for_end')
-
-                if not all([start_time_str, end_time_str, start_date_str, end_date_str]):
-                    print(f"Skipping {prayer_name} for {current_processing_date_str} due to missing time/date information.")
-                    continue
-                try:
-                    start_datetime_naive = datetime.strptime(f"{start_date_str} {start_time_str}", "%Y-%m-%d %H:%M:%S")
-                    end_datetime_naive = datetime.strptime(f"{end_date_str} {end_time_str}", "%Y-%m-%d %H:%M:%S")
-                    start_datetime_aware = target_tz.localize(start_datetime_naive)
-                    end_datetime_aware = target_tz.localize(end_datetime_naive)
-                    if end_datetime_aware <= start_datetime_aware:
-                        print(f"Warning: End time for {prayer_name} ({end_datetime_aware}) on {start_date_str} is not after start time ({start_datetime_aware}). Skipping.")
-                        continue
-                    event_summary_key = f'{prayer_name} Prayer'
-                    existing_event_to_update = existing_events_on_this_day.get(event_summary_key)
-                    create_or_update_prayer_event(
-                        gcal_service,
-                        prayer_name,
-                        start_datetime_aware,
-                        end_datetime_aware,
-                        start_date_str,
-                        target_tz,
-                        location_data_for_scraper,
-                        existing_event_data=existing_event_to_update
-                    )
-
-                except ValueError as ve:
-                    print(f"Error parsing date/time for {prayer_name} on {current_processing_date_str}: {ve}.")
-                except Exception as e:
-                    print(f"An unexpected error occurred while processing {prayer_name} on {current_processing_date_str}: {e}")
+        if calendar_mirror:
+            calendar_mirror.save()
+        if not dry_run:
+            record_sync_result(run_result, write_mode, written_events, CALENDAR_ID, window_start_date)
+        if run_result['listing_failed']:
+            return 1
+        run_result['plan'].print_summary(verbose=dry_run)
+        if dry_run:
+            print("Dry run: no changes were written to Google Calendar.")
+        elif run_result['plan'].is_empty():
+            print("Calendar is already up-to-date. No writes needed.")
+        else:
+            print(f"Calendar writes: {run_result['writes_succeeded']} succeeded, {run_result['writes_failed']} failed.")
+        if run_result['scraping_failed']:
+            return 1
 
-    except KeyboardInterrupt:
-        print("\nProcess interrupted by user (Ctrl+C). Exiting gracefully.")
-        sys.exit(0)
     except Exception as e:
         print(f"\nAn unexpected error occurred in the main process: {e}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
+        return 1
 
     print("\nPrayer Calendar Manager finished all processing days.")
-    sys.exit(0)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adds the upcoming prayer times to Google Calendar.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the planned creates/updates/deletes without writing anything.")
+    parser.add_argument('--fleet', action='store_true',
+                        help="Sync every profile in 'fleet_profiles' instead of the single configured calendar.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Stay resident and re-sync after local midnight and on location changes.")
+    args = parser.parse_args(argv)
+
+    print("Starting Prayer Calendar Manager..." + (" (dry run)" if args.dry_run else ""))
+    if args.fleet:
+        from fleet import run_fleet # Imported here because fleet.py builds on this module
+        try:
+            reports = run_fleet(dry_run=args.dry_run)
+        except KeyboardInterrupt:
+            print("\nProcess interrupted by user (Ctrl+C). Exiting gracefully.")
+            sys.exit(0)
+        sys.exit(0 if reports and all(report['status'] == 'ok' for report in reports) else 1)
+    if args.daemon:
+        from prayer_daemon import run_daemon # Imported here because prayer_daemon.py builds on this module
+        sys.exit(run_daemon(dry_run=args.dry_run))
+    try:
+        exit_code = run_sync(dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        print("\nProcess interrupted by user (Ctrl+C). Exiting gracefully.")
+        sys.exit(0)
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main()
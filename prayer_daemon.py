@@ -0,0 +1,200 @@
+# --- START OF FILE prayer_daemon.py ---
+
+import gc
+import heapq
+import itertools
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, time as dt_time
+import pytz
+from config_loader import get_config, get_state
+from prayer_time_sources import open_prayer_time_source
+from prayer_calendar_manager import run_sync, get_current_device_location
+
+# Longest single sleep. Waking up at least this often lets the scheduler notice wall-clock
+# jumps (e.g. the laptop resuming from sleep past midnight) instead of oversleeping.
+MAX_SLEEP_SECONDS = 60.0
+JOB_SYNC = 'sync'
+JOB_LOCATION_CHECK = 'location_check'
+JOB_RECYCLE = 'recycle'
+
+
+def _daemon_settings():
+    daemon_config = get_config().get('daemon', {})
+    return {
+        'wake_after_midnight_seconds': daemon_config.get('wake_after_midnight_seconds', 60),
+        'location_check_minutes': daemon_config.get('location_check_minutes', 30),
+        'retry_minutes': daemon_config.get('retry_minutes', 15),
+        'recycle_source_days': daemon_config.get('recycle_source_days', 7),
+    }
+
+
+def _operational_timezone():
+    config = get_config()
+    timezone_str = config.get('target_timezone')
+    if config.get('location_check_enabled', False) and get_state().get('last_checked_timezone'):
+        timezone_str = get_state().get('last_checked_timezone')
+    return pytz.timezone(timezone_str)
+
+
+def next_local_midnight(target_tz, delay_seconds=0, now=None):
+    """Returns the epoch time of the next local midnight in target_tz, plus delay_seconds."""
+    now = now or datetime.now(target_tz)
+    next_date = now.astimezone(target_tz).date() + timedelta(days=1)
+    midnight = target_tz.localize(datetime.combine(next_date, dt_time.min))
+    return midnight.timestamp() + delay_seconds
+
+
+class JobScheduler:
+    """
+    Min-heap of (due epoch time, job name). Each job has at most one live entry:
+    rescheduling a job supersedes its earlier entry, which is skipped when popped.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._live = {} # job -> sequence number of its live heap entry
+
+    def schedule(self, job, due_epoch):
+        """(Re)schedules a job; an earlier pending time for the same job wins."""
+        current = self._live.get(job)
+        if current is not None and current[0] <= due_epoch:
+            return
+        sequence = next(self._counter)
+        self._live[job] = (due_epoch, sequence)
+        heapq.heappush(self._heap, (due_epoch, sequence, job))
+
+    def next_due(self):
+        """Returns the epoch time of the next live job, or None if nothing is scheduled."""
+        while self._heap and self._live.get(self._heap[0][2], (None, None))[1] != self._heap[0][1]:
+            heapq.heappop(self._heap) # Superseded entry
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Removes and returns the next job if it is due, otherwise None."""
+        due = self.next_due()
+        if due is None or due > now:
+            return None
+        _, _, job = heapq.heappop(self._heap)
+        del self._live[job]
+        return job
+
+
+class PrayerDaemon:
+    """
+    Keeps the app resident: re-syncs just after local midnight and when the device's
+    location changes, reusing one prayer time backend (browser, HTTP pool, schedule cache),
+    the cached Calendar client and the geolocation cache across runs.
+
+    SIGINT/SIGTERM stop it gracefully after the current job; a second signal forces an exit.
+    Memory stays bounded over long uptimes: the backend (and its browser) is recycled every
+    'recycle_source_days', and each job drops its references before the next sleep.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.settings = _daemon_settings()
+        self.scheduler = JobScheduler()
+        self.stop_event = threading.Event()
+        self.prayer_time_source = None
+        self.runs = 0
+
+    def _handle_signal(self, signum, frame):
+        if self.stop_event.is_set():
+            raise KeyboardInterrupt # Second signal: stop waiting for the current job
+        print(f"\nReceived signal {signum}. Shutting down after the current job (signal again to force).")
+        self.stop_event.set()
+
+    def _install_signal_handlers(self):
+        for signal_name in ('SIGINT', 'SIGTERM', 'SIGBREAK'): # SIGBREAK is Ctrl+Break on Windows
+            if hasattr(signal, signal_name):
+                signal.signal(getattr(signal, signal_name), self._handle_signal)
+
+    def _source(self):
+        if self.prayer_time_source is None:
+            self.prayer_time_source = open_prayer_time_source()
+        return self.prayer_time_source
+
+    def _close_source(self):
+        if self.prayer_time_source is not None:
+            try:
+                self.prayer_time_source.close()
+            except Exception as e:
+                print(f"Error closing the prayer time backend: {e}")
+            self.prayer_time_source = None
+
+    def _run_sync_job(self):
+        self.runs += 1
+        print(f"\n===== Daemon sync #{self.runs} at {datetime.now().isoformat(timespec='seconds')} =====")
+        exit_code = run_sync(dry_run=self.dry_run, prayer_time_source=self._source())
+        now = time.time()
+        if exit_code != 0:
+            print(f"Sync failed; retrying in {self.settings['retry_minutes']} minute(s).")
+            self.scheduler.schedule(JOB_SYNC, now + self.settings['retry_minutes'] * 60)
+        # The timezone may have changed with the location, so midnight is recomputed after every run.
+        self.scheduler.schedule(JOB_SYNC, next_local_midnight(_operational_timezone(), self.settings['wake_after_midnight_seconds']))
+
+    def _location_changed(self):
+        config = get_config()
+        state = get_state()
+        last_known = {'ip': state.get('last_checked_ip'), 'latitude': state.get('last_checked_latitude'),
+                      'longitude': state.get('last_checked_longitude'), 'timezone': state.get('last_checked_timezone')}
+        _, latitude, longitude, timezone_str = get_current_device_location(last_known)
+        if latitude is None or longitude is None:
+            return False
+        if last_known['latitude'] is None or last_known['longitude'] is None or timezone_str != last_known['timezone']:
+            return True
+        from geopy.distance import geodesic
+        distance_km = geodesic((last_known['latitude'], last_known['longitude']), (latitude, longitude)).km
+        return distance_km >= config.get('location_threshold_km', 20.0)
+
+    def _run_location_check_job(self):
+        try:
+            if self._location_changed():
+                print("Location change detected by the daemon. Syncing now.")
+                self.scheduler.schedule(JOB_SYNC, time.time())
+        except Exception as e:
+            print(f"Error during the daemon's location check: {e}")
+        self.scheduler.schedule(JOB_LOCATION_CHECK, time.time() + self.settings['location_check_minutes'] * 60)
+
+    def _run_recycle_job(self):
+        print("Recycling the prayer time backend to release browser and cache memory.")
+        self._close_source()
+        self.scheduler.schedule(JOB_RECYCLE, time.time() + self.settings['recycle_source_days'] * 86400)
+
+    def run(self):
+        """Runs until stopped. Returns the process exit code."""
+        self._install_signal_handlers()
+        now = time.time()
+        self.scheduler.schedule(JOB_SYNC, now)
+        if get_config().get('location_check_enabled', False) and self.settings['location_check_minutes'] > 0:
+            self.scheduler.schedule(JOB_LOCATION_CHECK, now + self.settings['location_check_minutes'] * 60)
+        if self.settings['recycle_source_days'] > 0:
+            self.scheduler.schedule(JOB_RECYCLE, now + self.settings['recycle_source_days'] * 86400)
+        jobs = {JOB_SYNC: self._run_sync_job, JOB_LOCATION_CHECK: self._run_location_check_job, JOB_RECYCLE: self._run_recycle_job}
+
+        print("Prayer Calendar Manager daemon started. Press Ctrl+C to stop.")
+        try:
+            while not self.stop_event.is_set():
+                job = self.scheduler.pop_due(time.time())
+                if job is not None:
+                    jobs[job]()
+                    gc.collect()
+                    continue
+                next_due = self.scheduler.next_due()
+                wait_seconds = MAX_SLEEP_SECONDS if next_due is None else max(0.0, next_due - time.time())
+                self.stop_event.wait(min(wait_seconds, MAX_SLEEP_SECONDS))
+        except KeyboardInterrupt:
+            print("\nForced shutdown.")
+        finally:
+            self._close_source()
+        print("Prayer Calendar Manager daemon stopped.")
+        return 0
+
+
+def run_daemon(dry_run=False):
+    return PrayerDaemon(dry_run=dry_run).run()
+
+# --- END OF FILE prayer_daemon.py ---
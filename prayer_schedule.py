@@ -0,0 +1,119 @@
+# --- START OF FILE prayer_schedule.py ---
+
+from datetime import timedelta
+
+
+def schedule_label_index(prayer_definitions):
+    """
+    Maps each page label to the prayer slots it fills, e.g. {'Fajr': (('Fajr', 'start'),)}.
+    A label can fill several slots (one prayer's end is often the next one's start).
+    Build it once and pass it to build_prayer_schedule() when converting many pages.
+    """
+    index = {}
+    if prayer_definitions:
+        for prayer_key, definition in prayer_definitions.items():
+            for label_key, slot in (("start_text", "start"), ("end_text", "end")):
+                label = definition.get(label_key)
+                if label is not None:
+                    index[label] = index.get(label, ()) + ((prayer_key, slot),)
+    return index
+
+
+def schedule_labels(prayer_definitions):
+    """Returns the set of page labels (start_text/end_text) needed by the given prayer definitions."""
+    return set(schedule_label_index(prayer_definitions))
+
+
+def parse_results_rows(rows, labels):
+    """
+    Extracts label times from the rows of muwaqqit.com's results table.
+
+    Shared by every scraping backend so the label/time/▲▼ extraction is identical
+    whether the table was read through a browser or from static HTML.
+
+    Args:
+        rows (iterable): (label_text, time_cell_text, date_cell_text) tuples, one per
+            table row whose first cell has a bold label.
+        labels (set): Labels to keep (see schedule_labels()).
+
+    Returns:
+        dict: label -> ("HH:MM:SS", date_offset), as expected by build_prayer_schedule().
+    """
+    label_times = {}
+    for item_label_on_page, time_cell_text, date_cell_text in rows:
+        item_label_on_page = item_label_on_page.strip()
+        if item_label_on_page not in labels:
+            continue
+        time_cell_text = time_cell_text.strip()
+        time_parts = time_cell_text.split()
+        actual_time = time_parts[0] if time_parts else ''
+        if '—' in actual_time:
+            actual_time = actual_time.split('—')[0]
+        if ':' in actual_time and len(actual_time.split(':')) == 3:
+            print(f"Scraped: '{item_label_on_page}' -> {actual_time}")
+            date_cell_text = date_cell_text.strip()
+            date_offset_value = 0
+            if '▲' in date_cell_text: date_offset_value = 1
+            elif '▼' in date_cell_text: date_offset_value = -1
+            label_times[item_label_on_page] = (actual_time, date_offset_value)
+        else:
+            print(f"Warning: Extracted text '{actual_time}' for '{item_label_on_page}' doesn't look like a valid time. Cell text: '{time_cell_text}'")
+    return label_times
+
+
+def empty_prayer_schedule(prayer_definitions):
+    """Returns a prayer schedule dict with every prayer present but no times filled in."""
+    return {
+        prayer_key: {"start": None, "end": None, "start_date_offset": 0, "end_date_offset": 0, "date_for_start": None, "date_for_end": None}
+        for prayer_key in prayer_definitions.keys()
+    } if prayer_definitions else {}
+
+
+def build_prayer_schedule(label_times, base_date_obj, prayer_definitions, verbose=True, label_index=None):
+    """
+    Maps raw label times onto the prayer schedule shape used throughout the app.
+
+    Every backend (browser scraping, local calculation, ...) produces the same
+    label -> (time, day offset) mapping, and this is the single place that turns it
+    into per-prayer start/end entries.
+
+    Args:
+        label_times (dict): Maps a page label (e.g. 'Fajr') to a tuple of
+            ("HH:MM:SS", date_offset), where date_offset is 1 for a '▲' (next day),
+            -1 for a '▼' (previous day) and 0 otherwise.
+        base_date_obj (datetime.date): The date the times were fetched for.
+        prayer_definitions (dict): The 'prayer_definitions' section of config.json.
+        verbose (bool): Print per-label warnings and the summary line (off for bulk conversions).
+        label_index (dict, optional): schedule_label_index(prayer_definitions), if already built.
+
+    Returns:
+        dict or None: Prayer schedule, or None if any start/end time is missing.
+    """
+    prayer_schedule = empty_prayer_schedule(prayer_definitions)
+    if label_index is None:
+        label_index = schedule_label_index(prayer_definitions)
+    for label, slots in label_index.items():
+        found = label_times.get(label)
+        if not found or not found[0]:
+            continue
+        time_str, date_offset = found
+        date_str = (base_date_obj + timedelta(days=date_offset)).strftime("%Y-%m-%d")
+        for prayer_key, slot in slots:
+            prayer_schedule[prayer_key][slot] = time_str
+            prayer_schedule[prayer_key][f"{slot}_date_offset"] = date_offset
+            prayer_schedule[prayer_key][f"date_for_{slot}"] = date_str
+
+    all_times_found = True
+    for prayer_key, entry in prayer_schedule.items():
+        for slot, label_key in (("start", "start_text"), ("end", "end_text")):
+            if entry[slot] is None:
+                if verbose: print(f"Warning: Could not find {slot.upper()} time for {prayer_key} (label: '{prayer_definitions[prayer_key].get(label_key)}')")
+                all_times_found = False
+
+    if verbose:
+        if all_times_found: print("Successfully extracted all required start and end times.")
+        else: print("Could not extract all required start and end times. Check warnings.")
+    if not all_times_found: return None
+    return prayer_schedule
+
+# --- END OF FILE prayer_schedule.py ---
\ No newline at end of file
@@ -0,0 +1,75 @@
+# --- START OF FILE prayer_time_sources.py ---
+
+import sys
+from config_loader import get_config
+from schedule_cache import ScheduleCache, CachedPrayerTimeSource, calculation_params_hash
+# Each backend (selenium, requests, numpy) is imported only when it is opened, so this
+# module stays cheap to import for tools that never touch Google Calendar (e.g. ics_export).
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the prayer time backends: {e}")
+    sys.exit(1)
+
+PRAYER_TIME_BACKEND = config.get('prayer_time_backend', 'selenium') # 'selenium' (browser), 'http' (no browser) or 'local' (offline calculation)
+PRAYER_TIME_BACKENDS = ('selenium', 'http', 'local')
+SCHEDULE_CACHE_CONFIG = config.get('schedule_cache', {})
+LOCATION_THRESHOLD_KM = config.get('location_threshold_km', 20.0)
+
+
+def open_prayer_time_source(backend=None):
+    """
+    Returns the configured prayer time backend (or 'backend', one of PRAYER_TIME_BACKENDS)
+    as a context manager.
+
+    All backends expose get_prayer_times_with_ends(target_date_obj_override, location_params)
+    and return the same prayer schedule shape. The browser backend uses a pool of browsers
+    when 'browser_pool' allows more than one. The HTTP backend falls back to the browser
+    when the results table is not in the static HTML, and the local engine falls back to
+    scraping for address-only locations, which it cannot calculate offline. When 'schedule_cache' is
+    enabled, the backend is wrapped so unchanged days are served from disk.
+
+    Raises:
+        ValueError: If the backend is not one of PRAYER_TIME_BACKENDS.
+    """
+    backend = backend or PRAYER_TIME_BACKEND
+    if backend not in PRAYER_TIME_BACKENDS:
+        raise ValueError(f"Unknown prayer time backend '{backend}'; expected one of {PRAYER_TIME_BACKENDS}.")
+    from scrape_prayer_times import ScraperSession # One browser session is reused for every day
+    if backend == 'local':
+        from local_prayer_engine import LocalPrayerEngine
+        print("Using the local prayer time engine (offline calculation).")
+        source = LocalPrayerEngine(fallback_session=ScraperSession())
+    elif backend == 'http':
+        from http_prayer_times import HttpScraperSession
+        print("Using the browserless HTTP backend for muwaqqit.com.")
+        source = HttpScraperSession(fallback_session=ScraperSession())
+    else:
+        from scraper_pool import ScraperPool, effective_pool_size
+        if effective_pool_size() > 1:
+            source = ScraperPool() # Several browsers scrape the window's dates concurrently
+        else:
+            source = ScraperSession()
+
+    if not SCHEDULE_CACHE_CONFIG.get('enabled', False):
+        return source
+    try:
+        cache = ScheduleCache(
+            SCHEDULE_CACHE_CONFIG.get('path', 'schedule_cache.sqlite3'),
+            max_age_days=SCHEDULE_CACHE_CONFIG.get('max_age_days', 30),
+            max_entries=SCHEDULE_CACHE_CONFIG.get('max_entries', 5000)
+        )
+    except Exception as e:
+        print(f"Warning: Could not open the schedule cache, continuing without it: {e}")
+        return source
+    params_hash = calculation_params_hash(config.get('muwaqqit_base_url'), config.get('prayer_definitions'),
+                                          high_latitude_rule=source.high_latitude_rule if backend == 'local' else None)
+    return CachedPrayerTimeSource(
+        source, cache, params_hash, backend,
+        coordinate_decimals=SCHEDULE_CACHE_CONFIG.get('coordinate_decimals', 3),
+        snap_km=SCHEDULE_CACHE_CONFIG.get('snap_km', LOCATION_THRESHOLD_KM)
+    )
+
+# --- END OF FILE prayer_time_sources.py ---
@@ -0,0 +1,218 @@
+# --- START OF FILE rate_limiter.py ---
+
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+from config_loader import get_config
+from run_metrics import current_run, increment
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the API rate limiter: {e}")
+    sys.exit(1)
+
+RATE_LIMIT_CONFIG = config.get('calendar_rate_limit', {})
+DEFAULT_REQUESTS_PER_MINUTE = 500 # Below the Calendar API's default per-user quota of 600 requests/minute
+DEFAULT_BURST = 50 # One full batch request
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE_SECONDS = 1.0
+DEFAULT_BACKOFF_MAX_SECONDS = 64.0
+RETRYABLE_STATUSES = frozenset((429, 500, 502, 503, 504))
+# 403 reasons that mean "slow down" rather than "not allowed" or "daily quota used up".
+RATE_LIMIT_REASONS = frozenset(('rateLimitExceeded', 'userRateLimitExceeded'))
+
+
+def http_status(exception):
+    """The HTTP status of a googleapiclient HttpError, or None for any other exception."""
+    response = getattr(exception, 'resp', None) if isinstance(exception, HttpError) else None
+    return getattr(response, 'status', None)
+
+
+def error_reasons(exception):
+    """The 'reason' codes of a Google API error response, e.g. ['rateLimitExceeded']."""
+    details = getattr(exception, 'error_details', None)
+    if isinstance(details, list):
+        reasons = [detail.get('reason') for detail in details if isinstance(detail, dict) and detail.get('reason')]
+        if reasons:
+            return reasons
+    try:
+        error = json.loads(exception.content.decode('utf-8')).get('error', {})
+        return [item.get('reason') for item in error.get('errors', []) if item.get('reason')]
+    except Exception:
+        return []
+
+
+def is_rate_limited(exception):
+    status = http_status(exception)
+    return status == 429 or (status == 403 and bool(RATE_LIMIT_REASONS.intersection(error_reasons(exception))))
+
+
+def is_retryable(exception):
+    """
+    True for errors a later attempt can fix: rate limiting (429, 403 rateLimitExceeded),
+    server errors (5xx) and network failures. Other API errors (400, 404, 409, a 403 for a
+    used-up daily quota, ...) are not retried.
+    """
+    if isinstance(exception, HttpError):
+        return http_status(exception) in RETRYABLE_STATUSES or is_rate_limited(exception)
+    if isinstance(exception, OSError): # Connection resets, timeouts, DNS failures
+        return True
+    # httplib2 is slow to import and only loaded by the Calendar client, so it is not imported
+    # here: if nothing has loaded it, the exception cannot be one of its errors.
+    httplib2 = sys.modules.get('httplib2')
+    return httplib2 is not None and isinstance(exception, httplib2.HttpLib2Error)
+
+
+def retry_after_seconds(exception):
+    """The server's Retry-After (delta-seconds or HTTP-date) in seconds, or None."""
+    response = getattr(exception, 'resp', None)
+    value = response.get('retry-after') if hasattr(response, 'get') else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at 'rate' tokens per second up to 'capacity'.
+
+    A request for more tokens than the capacity waits for a full bucket and leaves it in
+    debt, so a large batch delays the requests after it instead of never being allowed.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until 'tokens' can be spent. Returns the seconds waited."""
+        waited = 0.0
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CalendarRateLimiter:
+    """
+    Paces Calendar API requests and retries the ones that fail with retryable errors.
+
+    Every request spends quota units from a token bucket (a batch spends one per
+    sub-request, which is how Google counts them). A retryable error backs off with
+    exponential backoff and full jitter, but never sooner than the server's Retry-After,
+    and the pause applies to every caller sharing the limiter. Units, retries, rate-limit
+    responses and time spent waiting are recorded in the current run's metrics.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base_seconds=DEFAULT_BACKOFF_BASE_SECONDS, backoff_max_seconds=DEFAULT_BACKOFF_MAX_SECONDS):
+        """
+        Args:
+            requests_per_minute (float): Sustained rate. 0 or None disables pacing (retries still apply).
+            burst (int): Units that may be spent at once after an idle period.
+            max_retries (int): Retries per request after its first attempt.
+            backoff_base_seconds (float): Backoff ceiling of the first retry; doubles per retry.
+            backoff_max_seconds (float): Largest backoff ceiling.
+        """
+        self.bucket = TokenBucket(requests_per_minute / 60.0, max(1, burst)) if requests_per_minute else None
+        self.max_retries = max(0, max_retries)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, units=1):
+        """Waits until 'units' requests may be sent."""
+        increment('api.quota_units', units)
+        increment('api.http_requests')
+        waited = 0.0
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+            waited += pause
+        if self.bucket is not None:
+            waited += self.bucket.acquire(units)
+        if waited > 0:
+            current_run().record('api.throttle_wait', waited)
+
+    def backoff_delay(self, attempt, exception=None):
+        """Full-jitter exponential backoff for retry number 'attempt' (0-based), at least Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+        retry_after = retry_after_seconds(exception) if exception is not None else None
+        return max(delay, retry_after or 0.0)
+
+    def back_off(self, attempt, exception):
+        """Pauses every caller of this limiter before retry 'attempt'. Returns the delay in seconds."""
+        delay = self.backoff_delay(attempt, exception)
+        increment('api.retries')
+        if is_rate_limited(exception):
+            increment('api.rate_limited')
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def execute(self, request, label='request'):
+        """
+        Executes a googleapiclient request, retrying retryable errors up to max_retries times.
+
+        Raises:
+            The last error if it is not retryable or the retries are used up.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return request.execute()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.back_off(attempt, e)
+                attempt += 1
+                print(f"Retryable error on {label} ({e}). Retrying in {delay:.1f}s (retry {attempt}/{self.max_retries}).")
+
+
+_default_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Returns the process-wide CalendarRateLimiter, so every caller shares one quota budget."""
+    global _default_rate_limiter
+    if _default_rate_limiter is None:
+        _default_rate_limiter = CalendarRateLimiter(
+            requests_per_minute=RATE_LIMIT_CONFIG.get('requests_per_minute', DEFAULT_REQUESTS_PER_MINUTE),
+            burst=RATE_LIMIT_CONFIG.get('burst', DEFAULT_BURST),
+            max_retries=RATE_LIMIT_CONFIG.get('max_retries', DEFAULT_MAX_RETRIES),
+            backoff_base_seconds=RATE_LIMIT_CONFIG.get('backoff_base_seconds', DEFAULT_BACKOFF_BASE_SECONDS),
+            backoff_max_seconds=RATE_LIMIT_CONFIG.get('backoff_max_seconds', DEFAULT_BACKOFF_MAX_SECONDS),
+        )
+    return _default_rate_limiter
+
+# --- END OF FILE rate_limiter.py ---
@@ -0,0 +1,198 @@
+# --- START OF FILE run_metrics.py ---
+
+import json
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config_loader import AtomicFile, get_config, write_json_atomically
+
+DEFAULT_METRICS_PATH = 'run_metrics.json'
+DEFAULT_HISTORY_PATH = 'run_metrics_history.jsonl'
+DEFAULT_HISTORY_MAX_ENTRIES = 1000
+# A run is reported as a possible regression when it takes this much longer than the
+# median of the previous runs of the same kind in the history store.
+REGRESSION_FACTOR = 1.5
+REGRESSION_WINDOW = 20
+SUMMARY_TOP_PHASES = 5
+
+
+def _metrics_settings():
+    metrics_config = get_config().get('run_metrics', {})
+    return {
+        'enabled': metrics_config.get('enabled', True),
+        'path': metrics_config.get('path', DEFAULT_METRICS_PATH),
+        'history_enabled': metrics_config.get('history_enabled', False),
+        'history_path': metrics_config.get('history_path', DEFAULT_HISTORY_PATH),
+        'history_max_entries': metrics_config.get('history_max_entries', DEFAULT_HISTORY_MAX_ENTRIES),
+    }
+
+
+class RunMetrics:
+    """
+    Timing spans and counters for one run.
+
+    Spans with the same name are aggregated. Spans may nest (a scrape contains the page
+    navigation, the fixed delay, ...); each span's 'self' time excludes the spans nested
+    inside it on the same thread, so the self times point at where the time actually went.
+    Spans on different threads (e.g. the pipeline's fetch and calendar stages) overlap, so
+    their totals can add up to more than the run's wall time.
+    """
+
+    def __init__(self, label='sync'):
+        self.label = label
+        self.started_at = datetime.now().astimezone()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.phases = {} # name -> {'count', 'total', 'self', 'max'}
+        self.counters = {}
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, name, seconds, self_seconds=None):
+        """Adds one measured duration to the phase 'name'."""
+        with self._lock:
+            phase = self.phases.setdefault(name, {'count': 0, 'total': 0.0, 'self': 0.0, 'max': 0.0})
+            phase['count'] += 1
+            phase['total'] += seconds
+            phase['self'] += seconds if self_seconds is None else self_seconds
+            phase['max'] = max(phase['max'], seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        """Times the enclosed block as one occurrence of the phase 'name'."""
+        stack = self._stack()
+        frame = [0.0] # Time spent in spans nested inside this one
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += seconds
+            self.record(name, seconds, max(0.0, seconds - frame[0]))
+
+    def report(self, status=None):
+        """Returns the run's metrics as a JSON-serializable dict, phases ordered by self time."""
+        wall_seconds = time.perf_counter() - self._started
+        with self._lock:
+            phases = {name: {'count': phase['count'], 'total_seconds': round(phase['total'], 4),
+                             'self_seconds': round(phase['self'], 4),
+                             'mean_ms': round(phase['total'] / phase['count'] * 1000, 2),
+                             'max_ms': round(phase['max'] * 1000, 2)}
+                      for name, phase in sorted(self.phases.items(), key=lambda item: -item[1]['self'])}
+            counters = dict(sorted(self.counters.items()))
+        return {'label': self.label, 'status': status, 'started_at': self.started_at.isoformat(timespec='seconds'),
+                'wall_seconds': round(wall_seconds, 4), 'dominant_phase': next(iter(phases), None),
+                'phases': phases, 'counters': counters}
+
+
+_current_run = RunMetrics(label='unscoped')
+
+
+def start_run(label='sync'):
+    """Starts collecting metrics for a new run; spans recorded from now on belong to it."""
+    global _current_run
+    _current_run = RunMetrics(label)
+    return _current_run
+
+
+def current_run():
+    return _current_run
+
+
+def span(name):
+    """Times a block in the current run: 'with span("browser.launch"): ...'."""
+    return _current_run.span(name)
+
+
+def increment(name, amount=1):
+    """Adds to a counter of the current run (e.g. calendar writes sent)."""
+    _current_run.increment(name, amount)
+
+
+def load_history(path=None):
+    """Returns the reports in the history store, oldest first. Unreadable lines are skipped."""
+    path = path or _metrics_settings()['history_path']
+    if not os.path.exists(path):
+        return []
+    history = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                history.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return history
+
+
+def _append_history(path, report, max_entries):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report) + '\n')
+    history = load_history(path)
+    if len(history) > max_entries * 1.1: # Trim in steps rather than rewriting the file on every run
+        with AtomicFile(path) as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in history[-max_entries:])
+    return history
+
+
+def _check_regression(report, history):
+    previous = [entry['wall_seconds'] for entry in history[:-1]
+                if entry.get('label') == report['label'] and entry.get('status') == 'ok'][-REGRESSION_WINDOW:]
+    if len(previous) < 3 or report['status'] != 'ok':
+        return
+    baseline = statistics.median(previous)
+    if baseline > 0 and report['wall_seconds'] > baseline * REGRESSION_FACTOR:
+        print(f"Warning: This run took {report['wall_seconds']:.2f}s, {report['wall_seconds'] / baseline:.1f}x the median "
+              f"of the last {len(previous)} '{report['label']}' run(s) ({baseline:.2f}s).")
+
+
+def print_summary(report):
+    wall_seconds = report['wall_seconds']
+    print(f"\nRun timings ({report['label']}, wall {wall_seconds:.2f}s), by self time:")
+    for name, phase in list(report['phases'].items())[:SUMMARY_TOP_PHASES]:
+        share = phase['self_seconds'] / wall_seconds * 100 if wall_seconds else 0.0
+        print(f"  {name:<24} {phase['self_seconds']:8.2f}s  ({share:4.0f}% of wall, {phase['count']}x, max {phase['max_ms']:.0f} ms)")
+    if report['counters']:
+        print("  Counters: " + ", ".join(f"{name} {value}" for name, value in report['counters'].items()))
+
+
+def finish_run(status='ok'):
+    """
+    Ends the current run: prints the dominant phases, writes the metrics file and, if
+    enabled, appends the report to the history store and compares it with earlier runs.
+
+    Returns:
+        dict: The run's report (see RunMetrics.report()).
+    """
+    report = _current_run.report(status)
+    settings = _metrics_settings()
+    if not settings['enabled']:
+        return report
+    print_summary(report)
+    try:
+        write_json_atomically(settings['path'], report, indent=4)
+    except Exception as e:
+        print(f"Error saving run metrics to '{settings['path']}': {e}")
+    if settings['history_enabled']:
+        try:
+            history = _append_history(settings['history_path'], report, settings['history_max_entries'])
+            _check_regression(report, history)
+        except Exception as e:
+            print(f"Error updating run metrics history '{settings['history_path']}': {e}")
+    return report
+
+# --- END OF FILE run_metrics.py ---
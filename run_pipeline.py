@@ -0,0 +1,164 @@
+# --- START OF FILE run_pipeline.py ---
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from calendar_reconciler import (
+    CALENDAR_ID, DEFAULT_PROFILE_NAME, ReconciliationPlan, build_desired_events, plan_reconciliation, plan_upserts, queue_plan,
+)
+from run_metrics import span
+
+# How many fetched days may wait for the calendar stage before fetching pauses.
+PIPELINE_QUEUE_SIZE = 2
+_END_OF_WINDOW = object()
+
+
+async def _fetch_stage(loop, fetch_executor, prayer_time_source, dates, location_params, queue, state):
+    """
+    Producer: fetches each day's schedule in date order and hands it to the calendar stage.
+
+    The end-of-window marker is not sent when the stage is cancelled: the calendar stage has
+    stopped by then, so waiting for room in a full queue would never end.
+    """
+    cancelled = False
+    try:
+        for day in dates:
+            date_str = day.strftime('%Y-%m-%d')
+            print(f"\n--- Processing for date: {date_str} ---")
+            print(f"Scraping prayer times for {date_str} for location: {location_params.get('address_for_display', 'N/A')}")
+            prayer_schedule = await loop.run_in_executor(
+                fetch_executor, prayer_time_source.get_prayer_times_with_ends, day, location_params)
+            if prayer_schedule is None:
+                print(f"Scraping for {date_str} was interrupted or failed. Aborting further processing.")
+                state['scraping_failed'] = True # Days already fetched are still reconciled
+                break
+            if not prayer_schedule:
+                print(f"Failed to scrape prayer times for {date_str}. Skipping this day.")
+                continue
+            print(f"\nPrayer Schedule to Process for {date_str}:")
+            for p, t_info in prayer_schedule.items():
+                print(f"  {p}: Start: {t_info.get('start')} on {t_info.get('date_for_start')}, End: {t_info.get('end')} on {t_info.get('date_for_end')}")
+            await queue.put((date_str, prayer_schedule))
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        if not cancelled:
+            await queue.put(_END_OF_WINDOW)
+
+
+async def _calendar_stage(loop, api_executor, service, listing_future, queue, state, target_tz, location_params,
+                          prayer_name_by_summary, write_batch, dry_run, on_deleted, calendar_id, profile_name, written_events):
+    """
+    Consumer: waits for the existing-event listing (if any), then plans each fetched day and
+    queues its writes. Queued writes are sent whenever they fill a whole batch request, and
+    the rest once the window is done, so a window's writes need as few batches as possible.
+    """
+    existing_index = existing_duplicates = None
+    if listing_future is not None:
+        existing_events_listing = await listing_future
+        if existing_events_listing is None:
+            print("Could not list existing prayer events. Stopping without writing to avoid creating duplicates.")
+            state['listing_failed'] = True
+            return
+        existing_index, existing_duplicates = existing_events_listing
+    planned_keys = set()
+
+    async def send_writes(full_batches_only=False):
+        # googleapiclient/httplib2 are not thread-safe, so every API call goes through the one API thread.
+        succeeded, failed = await loop.run_in_executor(api_executor, write_batch.execute, full_batches_only)
+        state['writes_succeeded'] += succeeded
+        state['writes_failed'] += failed
+
+    while True:
+        item = await queue.get()
+        if item is _END_OF_WINDOW:
+            if not dry_run:
+                await send_writes()
+            return
+        date_str, prayer_schedule = item
+        with span('reconcile.plan'):
+            desired_events = build_desired_events({date_str: prayer_schedule}, target_tz, location_params,
+                                                  calendar_id=calendar_id or CALENDAR_ID, profile_name=profile_name)
+            for key in planned_keys.intersection(desired_events):
+                print(f"Warning: {key[1]} on {key[0]} was already planned from an earlier day. Skipping.")
+                del desired_events[key]
+            planned_keys.update(desired_events)
+
+            if existing_index is None:
+                plan = plan_upserts(desired_events, written_events)
+            else:
+                plan = plan_reconciliation(desired_events, existing_index, existing_duplicates, target_tz, prayer_name_by_summary)
+        state['plan'].extend(plan)
+        if dry_run or plan.is_empty():
+            continue
+        print(f"Queueing {len(plan)} calendar change(s) for {date_str}...")
+        await loop.run_in_executor(api_executor, queue_plan, service, plan, write_batch, on_deleted, calendar_id)
+        if len(write_batch) >= write_batch.batch_size:
+            await send_writes(full_batches_only=True)
+
+
+async def _run(service, prayer_time_source, dates, location_params, target_tz, list_existing_events,
+               prayer_name_by_summary, write_batch, dry_run, on_deleted, calendar_id, profile_name, written_events,
+               api_executor, fetch_executor):
+    loop = asyncio.get_running_loop()
+    state = {'plan': ReconciliationPlan(), 'scraping_failed': False, 'listing_failed': False,
+             'writes_succeeded': 0, 'writes_failed': 0}
+    queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    # The listing starts right away, so it overlaps with the first page load.
+    listing_future = loop.run_in_executor(api_executor, list_existing_events) if list_existing_events else None
+    fetch_task = asyncio.ensure_future(_fetch_stage(loop, fetch_executor, prayer_time_source, dates, location_params, queue, state))
+    try:
+        await _calendar_stage(loop, api_executor, service, listing_future, queue, state, target_tz, location_params,
+                              prayer_name_by_summary, write_batch, dry_run, on_deleted, calendar_id, profile_name, written_events)
+    finally:
+        if not fetch_task.done():
+            fetch_task.cancel()
+        try:
+            await fetch_task
+        except asyncio.CancelledError:
+            pass
+    return state
+
+
+def run_window_pipeline(service, prayer_time_source, dates, location_params, target_tz, list_existing_events,
+                        prayer_name_by_summary, write_batch, dry_run=False, on_deleted=None, calendar_id=None,
+                        profile_name=DEFAULT_PROFILE_NAME, written_events=None):
+    """
+    Fetches, plans and writes the processing window as a two-stage asyncio pipeline.
+
+    The fetch stage gets day d+1's schedule while the calendar stage plans day d and sends its
+    writes as soon as they fill a batch request (the remainder goes out at the end of the window).
+    The stages are joined by a bounded queue. Blocking calls run on executors: one thread for
+    the prayer time backend, and one thread for every googleapiclient call, since its HTTP
+    transport is not thread-safe. The existing-event listing runs while the first day is
+    being fetched. The run then takes roughly as long as the slower stage, not the sum of both.
+
+    Args:
+        service: Authenticated Calendar API service.
+        prayer_time_source: Any prayer time backend (get_prayer_times_with_ends()).
+        dates (list[datetime.date]): Processing dates, in order.
+        location_params (dict): Location passed to the backend and used in event descriptions.
+        target_tz (pytz.timezone): Timezone of the schedules.
+        list_existing_events (callable or None): Returns (index, duplicates) like
+            get_existing_prayer_events_for_window(), or None if listing failed. If None itself,
+            nothing is listed and the events are written as upserts (see plan_upserts()).
+        prayer_name_by_summary (dict): Event summary -> prayer name for managed events.
+        write_batch (CalendarWriteBatch): Batch the writes are sent through.
+        dry_run (bool): Plan only; nothing is written.
+        on_deleted (callable, optional): Called with the id of each deleted event.
+        calendar_id (str, optional): Calendar to write to. Defaults to 'calendar_id' from config.json.
+        profile_name (str): Namespace of the deterministic event IDs (the fleet profile's name).
+        written_events (WrittenEventLog, optional): Without a listing, events this app already
+            wrote with the desired content are skipped.
+
+    Returns:
+        dict: 'plan' (the combined ReconciliationPlan), 'scraping_failed', 'listing_failed',
+              'writes_succeeded' and 'writes_failed'.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="calendar-api") as api_executor, \
+         ThreadPoolExecutor(max_workers=1, thread_name_prefix="prayer-times") as fetch_executor:
+        return asyncio.run(_run(service, prayer_time_source, dates, location_params, target_tz, list_existing_events,
+                                prayer_name_by_summary, write_batch, dry_run, on_deleted, calendar_id,
+                                profile_name, written_events, api_executor, fetch_executor))
+
+# --- END OF FILE run_pipeline.py ---
@@ -0,0 +1,321 @@
+# --- START OF FILE schedule_cache.py ---
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from datetime import date
+from spatial_index import SpatialIndex
+
+DEFAULT_CACHE_PATH = 'schedule_cache.sqlite3'
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_COORDINATE_DECIMALS = 3 # ~110 m, far below any change in prayer times
+
+
+def calculation_params_hash(base_url, prayer_definitions, high_latitude_rule=None):
+    """
+    Hashes the muwaqqit calculation parameters and the prayer definitions (and, for the local
+    engine, its high-latitude rule).
+
+    Query parameters are sorted so reordering them in config.json does not invalidate the cache.
+    """
+    query = urllib.parse.urlparse(base_url or "").query
+    canonical = {
+        "params": sorted(urllib.parse.parse_qsl(query, keep_blank_values=True)),
+        "prayer_definitions": prayer_definitions or {},
+    }
+    if high_latitude_rule:
+        canonical["high_latitude_rule"] = high_latitude_rule
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def location_key(location_params, coordinate_decimals=DEFAULT_COORDINATE_DECIMALS):
+    """Returns a stable string for a location: rounded lat/lon, or the normalized address, plus timezone."""
+    location_params = location_params or {}
+    timezone_str = location_params.get("timezone", "")
+    if location_params.get("latitude") is not None and location_params.get("longitude") is not None:
+        lat = round(float(location_params["latitude"]), coordinate_decimals)
+        lon = round(float(location_params["longitude"]), coordinate_decimals)
+        return f"ll:{lat:.{coordinate_decimals}f},{lon:.{coordinate_decimals}f}|{timezone_str}"
+    address = " ".join(str(location_params.get("address", "")).lower().split())
+    return f"addr:{address}|{timezone_str}"
+
+
+def parse_location_key(key):
+    """Returns (latitude, longitude, timezone) for a coordinate location_key(), or None for an address key."""
+    if not key.startswith("ll:"):
+        return None
+    coordinates, _, timezone_str = key[3:].partition("|")
+    try:
+        latitude, longitude = (float(part) for part in coordinates.split(","))
+    except ValueError:
+        return None
+    return latitude, longitude, timezone_str
+
+
+class ScheduleCache:
+    """
+    Disk-backed (SQLite) store of prayer schedules.
+
+    Entries older than max_age_days are treated as stale and evicted; beyond max_entries
+    the least recently used entries are evicted. Hit/miss counters are kept both for the
+    current run and cumulatively in the database.
+
+    The cache is usually opened on the main thread and read from the backend's worker
+    thread (see run_pipeline), so the connection may be used from any thread; a lock
+    serializes access to it.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS schedules ("
+            " cache_key TEXT PRIMARY KEY, location TEXT NOT NULL, date TEXT NOT NULL,"
+            " schedule_json TEXT NOT NULL, created_at REAL NOT NULL, last_used_at REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_last_used ON schedules (last_used_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(location, date_obj, params_hash, backend):
+        """Builds the cache key from a location_key(), the date, the calculation hash and the backend name."""
+        date_str = date_obj.strftime("%Y-%m-%d") if isinstance(date_obj, date) else str(date_obj)
+        return f"{backend}|{location}|{date_str}|{params_hash}"
+
+    def contains(self, cache_key):
+        """Returns True if a fresh entry exists, without touching the hit/miss counters."""
+        with self._lock:
+            row = self.conn.execute("SELECT created_at FROM schedules WHERE cache_key = ?", (cache_key,)).fetchone()
+            return row is not None and time.time() - row[0] <= self.max_age_seconds
+
+    def locations(self):
+        """Returns the distinct location keys that have cached schedules."""
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT location FROM schedules")]
+
+    def get(self, cache_key):
+        """Returns the cached schedule, or None on a miss or a stale entry."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT schedule_json, created_at FROM schedules WHERE cache_key = ?", (cache_key,)).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.max_age_seconds:
+                self.stale += 1
+                self.misses += 1
+                self.conn.execute("DELETE FROM schedules WHERE cache_key = ?", (cache_key,))
+                self.conn.commit()
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE schedules SET last_used_at = ? WHERE cache_key = ?", (now, cache_key))
+            self.conn.commit()
+            return json.loads(row[0])
+
+    def put(self, cache_key, location, date_obj, schedule):
+        """Stores a complete schedule. Incomplete (None) schedules are never cached."""
+        if not schedule:
+            return
+        with self._lock:
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO schedules (cache_key, location, date, schedule_json, created_at, last_used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, location, date_obj.strftime("%Y-%m-%d"), json.dumps(schedule, ensure_ascii=False), now, now))
+            self.conn.commit()
+            self.writes += 1
+
+    def evict(self):
+        """Removes stale entries, then the least recently used ones beyond max_entries."""
+        with self._lock:
+            cutoff = time.time() - self.max_age_seconds
+            removed = self.conn.execute("DELETE FROM schedules WHERE created_at < ?", (cutoff,)).rowcount
+            count = self.conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+            if count > self.max_entries:
+                removed += self.conn.execute(
+                    "DELETE FROM schedules WHERE cache_key IN"
+                    " (SELECT cache_key FROM schedules ORDER BY last_used_at ASC LIMIT ?)",
+                    (count - self.max_entries,)).rowcount
+            self.conn.commit()
+            self.evictions += removed
+            return removed
+
+    def stats(self):
+        """Returns this run's counters plus the cumulative totals stored in the database."""
+        with self._lock:
+            totals = dict(self.conn.execute("SELECT name, value FROM stats").fetchall())
+            run = {"hits": self.hits, "misses": self.misses, "stale": self.stale, "writes": self.writes, "evictions": self.evictions}
+            lookups = self.hits + self.misses
+            run["hit_rate"] = round(self.hits / lookups, 3) if lookups else None
+            return {"run": run, "total": totals, "entries": self.conn.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]}
+
+    def close(self):
+        """Evicts, folds this run's counters into the cumulative totals and closes the database."""
+        with self._lock:
+            if self.conn is None:
+                return
+            try:
+                self.evict()
+                for name in ("hits", "misses", "stale", "writes", "evictions"):
+                    self.conn.execute(
+                        "INSERT INTO stats (name, value) VALUES (?, ?)"
+                        " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        (name, getattr(self, name)))
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error updating schedule cache statistics: {e}")
+            finally:
+                self.conn.close()
+                self.conn = None
+
+
+class CachedPrayerTimeSource:
+    """
+    Serves prayer schedules from a ScheduleCache in front of any prayer time backend.
+
+    Wraps an object with the ScraperSession interface (get_prayer_times_with_ends,
+    prefetch_prayer_times, close) and exposes the same interface, so callers do not
+    need to know whether a schedule was cached.
+
+    With snap_km set, a coordinate that has no cached schedule for a date reuses the
+    schedule of the nearest cached location within snap_km (same timezone), found
+    through a SpatialIndex over every cached location.
+    """
+
+    def __init__(self, source, cache, params_hash, backend, coordinate_decimals=DEFAULT_COORDINATE_DECIMALS, snap_km=0):
+        self.source = source
+        self.cache = cache
+        self.params_hash = params_hash
+        self.backend = backend
+        self.coordinate_decimals = coordinate_decimals
+        self.snap_km = snap_km
+        self.snapped = 0
+        self._spatial_index = None
+        self._indexed_locations = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _key(self, date_obj, location_params):
+        location = location_key(location_params, self.coordinate_decimals)
+        return location, ScheduleCache.make_key(location, date_obj, self.params_hash, self.backend)
+
+    def _index(self):
+        # The pool backend calls this from several threads; the cache's lock (an RLock, also
+        # taken by locations()) makes building and updating the index one step at a time.
+        with self.cache._lock:
+            if self._spatial_index is None:
+                self._spatial_index = SpatialIndex(cell_km=self.snap_km)
+                for location in self.cache.locations():
+                    self._add_to_index(location)
+            return self._spatial_index
+
+    def _add_to_index(self, location):
+        parsed = parse_location_key(location)
+        with self.cache._lock:
+            if parsed is not None and location not in self._indexed_locations:
+                self._indexed_locations.add(location)
+                self._spatial_index.add(parsed[0], parsed[1], location)
+
+    def _nearby_key(self, date_obj, location_params):
+        """Returns (distance_km, location, cache_key) of the nearest cached location that has this date, or None."""
+        location_params = location_params or {}
+        if not self.snap_km or location_params.get("latitude") is None or location_params.get("longitude") is None:
+            return None
+        timezone_str = location_params.get("timezone", "")
+        try:
+            with self.cache._lock:
+                matches = self._index().within(
+                    float(location_params["latitude"]), float(location_params["longitude"]), self.snap_km,
+                    predicate=lambda location: location.endswith(f"|{timezone_str}"))
+        except sqlite3.Error as e:
+            print(f"Error reading cached locations: {e}")
+            return None
+        for distance_km, location in matches:
+            cache_key = ScheduleCache.make_key(location, date_obj, self.params_hash, self.backend)
+            if self.cache.contains(cache_key):
+                return distance_km, location, cache_key
+        return None
+
+    def prefetch_prayer_times(self, dates, location_params):
+        """Prefetches only the dates that are not already cached."""
+        missing = []
+        for day in dates:
+            _, cache_key = self._key(day, location_params)
+            if not self.cache.contains(cache_key) and self._nearby_key(day, location_params) is None:
+                missing.append(day)
+        if missing:
+            self.source.prefetch_prayer_times(missing, location_params)
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        if target_date_obj_override is None:
+            # 'Today' depends on the backend's timezone handling, so it is never cached.
+            return self.source.get_prayer_times_with_ends(target_date_obj_override, location_params)
+        location, cache_key = self._key(target_date_obj_override, location_params)
+        try:
+            # Only look for a nearby location when this one has nothing, so each lookup counts once.
+            nearby = None if self.cache.contains(cache_key) else self._nearby_key(target_date_obj_override, location_params)
+            cached = self.cache.get(nearby[2] if nearby else cache_key)
+        except sqlite3.Error as e:
+            print(f"Error reading schedule cache, fetching instead: {e}")
+            cached = None
+        if cached is not None:
+            if nearby:
+                self.snapped += 1
+                print(f"Using cached prayer times for {target_date_obj_override.strftime('%Y-%m-%d')} from nearby location "
+                      f"{nearby[1]} ({nearby[0]:.2f} km away).")
+            else:
+                print(f"Using cached prayer times for {target_date_obj_override.strftime('%Y-%m-%d')} ({location}).")
+            return cached
+        schedule = self.source.get_prayer_times_with_ends(target_date_obj_override, location_params)
+        try:
+            self.cache.put(cache_key, location, target_date_obj_override, schedule)
+            if schedule and self._spatial_index is not None:
+                self._add_to_index(location)
+        except sqlite3.Error as e:
+            print(f"Error writing schedule cache: {e}")
+        return schedule
+
+    def close(self):
+        """Closes the backend and the cache, even if the other one (or printing the stats) fails."""
+        try:
+            self.source.close()
+        finally:
+            try:
+                stats = self.cache.stats()
+                run = stats["run"]
+                print(f"Schedule cache: {run['hits']} hit(s) ({self.snapped} from nearby locations), {run['misses']} miss(es) ({run['stale']} stale), "
+                      f"{run['writes']} write(s), {stats['entries']} entries stored.")
+            except sqlite3.Error as e:
+                print(f"Error reading schedule cache stats: {e}")
+            finally:
+                self.cache.close()
+
+
+if __name__ == '__main__':
+    if os.path.exists(DEFAULT_CACHE_PATH):
+        cache = ScheduleCache(DEFAULT_CACHE_PATH)
+        print(json.dumps(cache.stats(), indent=4))
+        cache.close()
+    else:
+        print(f"No schedule cache found at '{DEFAULT_CACHE_PATH}'.")
+
+# --- END OF FILE schedule_cache.py ---
\ No newline at end of file
@@ -1,24 +1,22 @@
 # --- START OF FILE scrape_prayer_times.py ---
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+# selenium.webdriver and webdriver_manager are imported where a browser is actually driven, so the
+# HTTP/local backends and runs served from the schedule cache never pay for importing them.
+from selenium.common.exceptions import TimeoutException, WebDriverException
+import contextlib
 import time
 from datetime import datetime, date, timedelta
 import pytz
-from config_loader import load_config
+from config_loader import get_config
+from prayer_schedule import schedule_label_index, parse_results_rows, build_prayer_schedule
+from run_metrics import span
 import os
 import sys
 import urllib.parse
 
 # Load configuration
 try:
-    config = load_config()
+    config = get_config()
 except Exception as e:
     print(f"FATAL: Could not load configuration for prayer time scraping: {e}")
     sys.exit(1)
@@ -47,30 +45,45 @@ for key, value in critical_scraper_configs.items():
         print(f"FATAL: Scraper critical configuration key '{key}' is missing in config.json. Exiting.")
         sys.exit(1)
 
-ALL_TIME_LABELS_TO_SCRAPE = set()
-if PRAYER_DEFINITIONS:
-    for prayer_key, definition in PRAYER_DEFINITIONS.items():
-        ALL_TIME_LABELS_TO_SCRAPE.add(definition.get("start_text"))
-        ALL_TIME_LABELS_TO_SCRAPE.add(definition.get("end_text"))
-ALL_TIME_LABELS_TO_SCRAPE = {label for label in ALL_TIME_LABELS_TO_SCRAPE if label is not None}
-
-
-def get_prayer_times_with_ends(target_date_obj_override=None, location_params=None):
-    """
-    Scrapes prayer start and end times from the configured website for a specific date and location.
+LABEL_INDEX = schedule_label_index(PRAYER_DEFINITIONS) # page label -> ((prayer, 'start'/'end'), ...)
+ALL_TIME_LABELS_TO_SCRAPE = frozenset(LABEL_INDEX)
+
+
+# WebDriver errors that mean the browser process itself is gone. When one of these
+# surfaces mid-run, the session relaunches its driver instead of failing the whole run.
+DRIVER_CRASH_MARKERS = (
+    "invalid session id",
+    "session deleted",
+    "disconnected",
+    "chrome not reachable",
+    "no such window",
+    "target window already closed",
+    "connection refused",
+)
+MAX_DRIVER_RESTARTS = 2
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36"
+RESULTS_TABLE_BODY_XPATH = "//div[@id='results']//table[@class='table']/tbody"
+# Reads the whole results table inside the browser in one WebDriver call, instead of one
+# round trip per row and cell. Same row filter as the HTML parser: at least 3 <td> cells and
+# a <b> label in the first, keeping only the wanted labels (arguments[1]).
+RESULTS_TABLE_ROWS_SCRIPT = """
+const tableBody = arguments[0];
+const wantedLabels = new Set(arguments[1]);
+const rows = [];
+for (const row of tableBody.rows) {
+    const cells = row.getElementsByTagName('td');
+    const labelElement = cells.length >= 3 ? cells[0].querySelector('b') : null;
+    if (labelElement === null) continue;
+    const label = labelElement.innerText.trim();
+    if (wantedLabels.has(label)) rows.push([label, cells[1].innerText, cells[2].innerText]);
+}
+return {rowCount: tableBody.rows.length, rows: rows};
+"""
 
-    Args:
-        target_date_obj_override (datetime.date, optional): Date to scrape for.
-        location_params (dict, optional): Dictionary containing location info.
-            Expected keys:
-            - "latitude", "longitude", "timezone" (for IP-based location)
-            OR
-            - "address", "timezone" (for address-based fallback)
-            If None, or missing keys, uses TARGET_TIMEZONE_STR and USER_LOCATION_ADDRESS_FALLBACK from config.
 
-    Returns:
-        dict or None: Prayer schedule or None on failure/interruption.
-    """
+def _build_chrome_options():
+    """Builds the headless Chrome/Brave options used by every scraper driver."""
+    from selenium.webdriver.chrome.options import Options
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
@@ -82,194 +95,283 @@ def get_prayer_times_with_ends(target_date_obj_override=None, location_params=No
     options.add_argument("--disable-infobars")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36")
+    options.add_argument(f"user-agent={BROWSER_USER_AGENT}")
     options.add_argument("--log-level=3")
+    return options
+
+
+def _launch_driver():
+    """Starts a new headless browser, preferring Brave when BRAVE_PATH is valid."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    options = _build_chrome_options()
+    service = None
+    if BRAVE_PATH and os.path.exists(BRAVE_PATH):
+        print(f"Using Brave browser from: {BRAVE_PATH}")
+        options.binary_location = BRAVE_PATH
+        service = ChromeService()
+    else:
+        print("Setting up ChromeDriver using webdriver-manager (Brave path not specified or invalid)...")
+        from webdriver_manager.chrome import ChromeDriverManager
+        service = ChromeService(ChromeDriverManager().install())
 
-    driver = None
-    prayer_schedule = {
-        prayer_key: {"start": None, "end": None, "start_date_offset": 0, "end_date_offset": 0, "date_for_start": None, "date_for_end": None}
-        for prayer_key in PRAYER_DEFINITIONS.keys()
-    } if PRAYER_DEFINITIONS else {}
-    all_times_found = False # Initialize it to False by default
-    scraped_times_raw = {label: None for label in ALL_TIME_LABELS_TO_SCRAPE}
-    function_start_time = time.time()
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT_SECONDS)
+    return driver
 
-    try:
-        # Determine operational location and timezone
-        op_latitude = None
-        op_longitude = None
-        op_timezone_str = TARGET_TIMEZONE_STR # Default fallback
-        op_address_for_display = USER_LOCATION_ADDRESS_FALLBACK # Default fallback
-
-        if location_params:
-            op_timezone_str = location_params.get("timezone", TARGET_TIMEZONE_STR)
-            if "latitude" in location_params and "longitude" in location_params:
-                op_latitude = location_params.get("latitude")
-                op_longitude = location_params.get("longitude")
-                op_address_for_display = location_params.get("address_for_display", f"Lat/Lon: {op_latitude},{op_longitude}")
-            elif "address" in location_params:
-                # If only address is provided (fallback scenario)
-                op_address_for_display = location_params.get("address", USER_LOCATION_ADDRESS_FALLBACK)
-            else: # Should not happen if prayer_calendar_manager prepares location_params correctly
-                print("Warning: location_params provided but missing expected keys. Using fallbacks.")
-        
-        current_op_timezone = pytz.timezone(op_timezone_str)
 
-        base_date_obj_for_url = None
-        if target_date_obj_override:
-            base_date_obj_for_url = target_date_obj_override
-            print(f"Scraper called with target date override: {base_date_obj_for_url.strftime('%Y-%m-%d')}")
-        else:
-            current_datetime = datetime.now(current_op_timezone)
-            base_date_obj_for_url = current_datetime.date()
-        date_to_fetch_str = base_date_obj_for_url.strftime("%Y-%m-%d")
-
-        # --- DYNAMIC URL CONSTRUCTION ---
-        url_params = []
-        if op_latitude is not None and op_longitude is not None:
-            url_params.append(f"lt={op_latitude}")
-            url_params.append(f"ln={op_longitude}")
-            # When providing lat/lon, muwaqqit.com still benefits from an explicit timezone.
-            url_params.append(f"tz={urllib.parse.quote_plus(op_timezone_str)}")
-        elif "address" in location_params: # Fallback to using address from location_params
-            url_params.append(f"add={urllib.parse.quote_plus(location_params['address'])}")
-            url_params.append(f"tz={urllib.parse.quote_plus(op_timezone_str)}")
-        else: # Extreme fallback to USER_LOCATION_ADDRESS_FALLBACK from config
-            url_params.append(f"add={urllib.parse.quote_plus(USER_LOCATION_ADDRESS_FALLBACK)}")
-            url_params.append(f"tz={urllib.parse.quote_plus(TARGET_TIMEZONE_STR)}")
-
-
-        url_params.append(f"d={date_to_fetch_str}")
-        url_to_scrape = f"{BASE_URL}&{'&'.join(url_params)}"
-        # --------------------------------
-
-        print(f"Fetching times for location \"{op_address_for_display}\" (Timezone: {op_timezone_str}) for date: {date_to_fetch_str}")
-
-        service = None
-        if BRAVE_PATH and os.path.exists(BRAVE_PATH):
-            print(f"Using Brave browser from: {BRAVE_PATH}")
-            options.binary_location = BRAVE_PATH
-            service = ChromeService()
-        else:
-            print("Setting up ChromeDriver using webdriver-manager (Brave path not specified or invalid)...")
-            service = ChromeService(ChromeDriverManager().install())
+def _is_driver_crash(error):
+    """Returns True if a WebDriverException indicates the browser/driver process died."""
+    if isinstance(error, TimeoutException):
+        return False
+    message = str(error).lower()
+    return any(marker in message for marker in DRIVER_CRASH_MARKERS)
+
+
+def resolve_location(location_params):
+    """
+    Works out the operational location for a scrape.
+
+    Returns:
+        tuple: (latitude, longitude, timezone_str, address_for_display). Latitude and
+               longitude are None when the location is address-based.
+    """
+    op_latitude = None
+    op_longitude = None
+    op_timezone_str = TARGET_TIMEZONE_STR # Default fallback
+    op_address_for_display = USER_LOCATION_ADDRESS_FALLBACK # Default fallback
+
+    if location_params:
+        op_timezone_str = location_params.get("timezone", TARGET_TIMEZONE_STR)
+        if "latitude" in location_params and "longitude" in location_params:
+            op_latitude = location_params.get("latitude")
+            op_longitude = location_params.get("longitude")
+            op_address_for_display = location_params.get("address_for_display", f"Lat/Lon: {op_latitude},{op_longitude}")
+        elif "address" in location_params:
+            # If only address is provided (fallback scenario)
+            op_address_for_display = location_params.get("address", USER_LOCATION_ADDRESS_FALLBACK)
+        else: # Should not happen if prayer_calendar_manager prepares location_params correctly
+            print("Warning: location_params provided but missing expected keys. Using fallbacks.")
+    return op_latitude, op_longitude, op_timezone_str, op_address_for_display
+
+
+def build_muwaqqit_url(base_date_obj, location_params):
+    """Builds the muwaqqit.com URL for a date and location (see get_prayer_times_with_ends)."""
+    op_latitude, op_longitude, op_timezone_str, _ = resolve_location(location_params)
+    date_to_fetch_str = base_date_obj.strftime("%Y-%m-%d")
+
+    url_params = []
+    if op_latitude is not None and op_longitude is not None:
+        url_params.append(f"lt={op_latitude}")
+        url_params.append(f"ln={op_longitude}")
+        # When providing lat/lon, muwaqqit.com still benefits from an explicit timezone.
+        url_params.append(f"tz={urllib.parse.quote_plus(op_timezone_str)}")
+    elif location_params and "address" in location_params: # Fallback to using address from location_params
+        url_params.append(f"add={urllib.parse.quote_plus(location_params['address'])}")
+        url_params.append(f"tz={urllib.parse.quote_plus(op_timezone_str)}")
+    else: # Extreme fallback to USER_LOCATION_ADDRESS_FALLBACK from config
+        url_params.append(f"add={urllib.parse.quote_plus(USER_LOCATION_ADDRESS_FALLBACK)}")
+        url_params.append(f"tz={urllib.parse.quote_plus(TARGET_TIMEZONE_STR)}")
+
+    url_params.append(f"d={date_to_fetch_str}")
+    return f"{BASE_URL}&{'&'.join(url_params)}"
+
+
+def resolve_target_date(target_date_obj_override, op_timezone_str):
+    """Returns the date to fetch: the override if given, otherwise 'today' in the operational timezone."""
+    if target_date_obj_override:
+        print(f"Scraper called with target date override: {target_date_obj_override.strftime('%Y-%m-%d')}")
+        return target_date_obj_override
+    return datetime.now(pytz.timezone(op_timezone_str)).date()
+
+
+class ScraperSession:
+    """
+    Owns one long-lived headless browser and fetches prayer schedules for many dates through it.
+
+    Use it as a context manager so the browser is always closed:
+
+        with ScraperSession() as scraper:
+            for day in days:
+                schedule = scraper.get_prayer_times_with_ends(day, location_params)
+
+    The browser is launched lazily on the first fetch. If the driver crashes (e.g. the
+    browser process dies or the session is lost), the session relaunches it and retries
+    that date, up to MAX_DRIVER_RESTARTS times per session. Sessions that share a
+    'launch_lock' never launch their browsers at the same time.
+    """
+
+    def __init__(self, max_driver_restarts=MAX_DRIVER_RESTARTS, launch_lock=None):
+        self.driver = None
+        self.max_driver_restarts = max_driver_restarts
+        self.driver_restarts = 0
+        self.launch_lock = launch_lock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def ensure_driver(self):
+        """Returns this session's browser, launching one first if there is none (yet, or after a crash)."""
+        if self.driver is None:
+            with self.launch_lock or contextlib.nullcontext(), span('browser.launch'):
+                self.driver = _launch_driver()
+        return self.driver
+
+    def _discard_driver(self):
+        if self.driver:
+            try: self.driver.quit()
+            except Exception as e_quit: print(f"Error during browser quit: {e_quit}")
+        self.driver = None
+
+    def close(self):
+        """Quits the browser if one is running."""
+        if self.driver:
+            print("Closing the browser.")
+        self._discard_driver()
 
-        driver = webdriver.Chrome(service=service, options=options)
-        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT_SECONDS)
+    def prefetch_prayer_times(self, dates, location_params):
+        """Hook for backends that can fetch several dates up front; a single browser scrapes on demand."""
+        return None
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        """
+        Scrapes prayer start and end times for a specific date and location using this session's browser.
+
+        Args and return value are the same as the module-level get_prayer_times_with_ends().
+        """
+        while True:
+            try:
+                return self._scrape(target_date_obj_override, location_params)
+            except WebDriverException as e_driver:
+                if not _is_driver_crash(e_driver):
+                    print(f"An unexpected error occurred during scraping: {e_driver}")
+                    return None
+                self._discard_driver()
+                if self.driver_restarts >= self.max_driver_restarts:
+                    print(f"Browser driver crashed and the restart limit ({self.max_driver_restarts}) was reached: {e_driver}")
+                    return None
+                self.driver_restarts += 1
+                print(f"Browser driver crashed ({str(e_driver).splitlines()[0] if str(e_driver) else type(e_driver).__name__}). "
+                      f"Relaunching browser (restart {self.driver_restarts}/{self.max_driver_restarts}) and retrying this date...")
+
+    def _scrape(self, target_date_obj_override, location_params):
+        """
+        Performs one scrape. Driver crashes are re-raised as WebDriverException so the
+        caller can relaunch the browser; every other failure returns None as before.
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        prayer_schedule = None
+        function_start_time = time.time()
 
-        print(f"Navigating to URL: {url_to_scrape}")
         try:
-            driver.get(url_to_scrape)
-            print("Page navigation initiated by driver.get().")
-        except TimeoutException:
+            _, _, op_timezone_str, op_address_for_display = resolve_location(location_params)
+            base_date_obj_for_url = resolve_target_date(target_date_obj_override, op_timezone_str)
+            date_to_fetch_str = base_date_obj_for_url.strftime("%Y-%m-%d")
+            url_to_scrape = build_muwaqqit_url(base_date_obj_for_url, location_params)
+
+            print(f"Fetching times for location \"{op_address_for_display}\" (Timezone: {op_timezone_str}) for date: {date_to_fetch_str}")
+
+            driver = self.ensure_driver()
+
+            print(f"Navigating to URL: {url_to_scrape}")
+            try:
+                with span('browser.navigate'):
+                    driver.get(url_to_scrape)
+                print("Page navigation initiated by driver.get().")
+            except TimeoutException:
+                current_elapsed = time.time() - function_start_time
+                if current_elapsed > OVERALL_PROCESS_TIMEOUT_SECONDS:
+                     raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded during initial page load which itself timed out.")
+                print(f"driver.get() timed out after {PAGE_LOAD_TIMEOUT_SECONDS}s, but continuing within overall budget if possible...")
+            except KeyboardInterrupt:
+                print("\nScraping interrupted during page navigation by user (Ctrl+C).")
+                return None
+
             current_elapsed = time.time() - function_start_time
             if current_elapsed > OVERALL_PROCESS_TIMEOUT_SECONDS:
-                 raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded during initial page load which itself timed out.")
-            print(f"driver.get() timed out after {PAGE_LOAD_TIMEOUT_SECONDS}s, but continuing within overall budget if possible...")
-        except KeyboardInterrupt:
-            print("\nScraping interrupted during page navigation by user (Ctrl+C).")
-            return None
-
-        current_elapsed = time.time() - function_start_time
-        if current_elapsed > OVERALL_PROCESS_TIMEOUT_SECONDS:
-            raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded after page load attempt.")
+                raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded after page load attempt.")
 
-        print(f"Adding a fixed delay of {ADDITIONAL_DELAY_SECONDS} seconds...")
-        try:
-            time.sleep(ADDITIONAL_DELAY_SECONDS)
-        except KeyboardInterrupt:
-            print("\nScraping interrupted during fixed delay by user (Ctrl+C).")
-            return None
+            print(f"Adding a fixed delay of {ADDITIONAL_DELAY_SECONDS} seconds...")
+            try:
+                with span('browser.fixed_delay'):
+                    time.sleep(ADDITIONAL_DELAY_SECONDS)
+            except KeyboardInterrupt:
+                print("\nScraping interrupted during fixed delay by user (Ctrl+C).")
+                return None
 
-        current_elapsed = time.time() - function_start_time
-        if current_elapsed > OVERALL_PROCESS_TIMEOUT_SECONDS:
-            raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded after fixed delay.")
+            current_elapsed = time.time() - function_start_time
+            if current_elapsed > OVERALL_PROCESS_TIMEOUT_SECONDS:
+                raise TimeoutException(f"Overall timeout ({OVERALL_PROCESS_TIMEOUT_SECONDS}s) exceeded after fixed delay.")
 
-        table_body_xpath = "//div[@id='results']//table[@class='table']/tbody"
-        remaining_time_for_table_wait = max(1, OVERALL_PROCESS_TIMEOUT_SECONDS - current_elapsed)
-        print(f"Waiting up to {remaining_time_for_table_wait:.1f}s for table body: {table_body_xpath}")
-        wait = WebDriverWait(driver, remaining_time_for_table_wait)
+            table_body_xpath = RESULTS_TABLE_BODY_XPATH
+            remaining_time_for_table_wait = max(1, OVERALL_PROCESS_TIMEOUT_SECONDS - current_elapsed)
+            print(f"Waiting up to {remaining_time_for_table_wait:.1f}s for table body: {table_body_xpath}")
+            wait = WebDriverWait(driver, remaining_time_for_table_wait)
 
-        try:
-            table_body = wait.until(EC.presence_of_element_located((By.XPATH, table_body_xpath)))
-            print("Table body found.")
-        except TimeoutException as te:
-            print(f"Timeout Error: {str(te)}")
-            if driver:
+            try:
+                with span('browser.table_wait'):
+                    table_body = wait.until(EC.presence_of_element_located((By.XPATH, table_body_xpath)))
+                print("Table body found.")
+            except TimeoutException as te:
+                print(f"Timeout Error: {str(te)}")
                 try:
                     with open("timeout_page_source.html", "w", encoding="utf-8") as f:
                         f.write(driver.page_source)
                     print("Page source at timeout saved to timeout_page_source.html")
                 except Exception as e_save:
                     print(f"Error saving page source: {e_save}")
-            return None
-        except KeyboardInterrupt:
-            print("\nScraping interrupted while waiting for table by user (Ctrl+C).")
-            return None
-
-        rows = table_body.find_elements(By.XPATH, "./tr")
-        print(f"Found {len(rows)} rows in the table.")
-
-        base_date_obj_for_offsets = base_date_obj_for_url
+                return None
+            except KeyboardInterrupt:
+                print("\nScraping interrupted while waiting for table by user (Ctrl+C).")
+                return None
+
+            with span('browser.parse_rows'):
+                table = driver.execute_script(RESULTS_TABLE_ROWS_SCRIPT, table_body, sorted(ALL_TIME_LABELS_TO_SCRAPE))
+                # (label, time cell text, date cell text) for rows with a wanted label
+                matching_rows = [tuple(row) for row in table['rows']]
+                print(f"Found {table['rowCount']} rows in the table ({len(matching_rows)} with a wanted label).")
+
+                scraped_label_times = parse_results_rows(matching_rows, ALL_TIME_LABELS_TO_SCRAPE)
+                prayer_schedule = build_prayer_schedule(scraped_label_times, base_date_obj_for_url, PRAYER_DEFINITIONS,
+                                                        label_index=LABEL_INDEX)
+
+        except KeyboardInterrupt: print("\nScraping process interrupted by user (Ctrl+C)."); return None
+        except TimeoutException as te: print(f"Timeout Error: {str(te)}")
+        except WebDriverException as e_driver:
+            if _is_driver_crash(e_driver): raise
+            print(f"An unexpected error occurred during scraping: {e_driver}")
+        except Exception as e: print(f"An unexpected error occurred during scraping: {e}")
+        return prayer_schedule
+
+
+def get_prayer_times_with_ends(target_date_obj_override=None, location_params=None, session=None):
+    """
+    Scrapes prayer start and end times from the configured website for a specific date and location.
 
-        for row in rows:
-            try:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) < 3:
-                    continue
-                prayer_name_element = cells[0].find_element(By.XPATH, ".//b")
-                item_label_on_page = prayer_name_element.text.strip()
-                if item_label_on_page in ALL_TIME_LABELS_TO_SCRAPE:
-                    time_cell_text = cells[1].text.strip()
-                    actual_time = time_cell_text.split()[0]
-                    if '—' in actual_time:
-                        actual_time = actual_time.split('—')[0]
-                    if ':' in actual_time and len(actual_time.split(':')) == 3:
-                        scraped_times_raw[item_label_on_page] = actual_time
-                        print(f"Scraped: '{item_label_on_page}' -> {actual_time}")
-                        date_cell_text = cells[2].text.strip()
-                        date_offset_value = 0
-                        if '▲' in date_cell_text: date_offset_value = 1
-                        elif '▼' in date_cell_text: date_offset_value = -1
-                        if PRAYER_DEFINITIONS:
-                            for prayer_key, definition in PRAYER_DEFINITIONS.items():
-                                if definition["start_text"] == item_label_on_page:
-                                    prayer_schedule[prayer_key]["start_date_offset"] = date_offset_value
-                                    prayer_schedule[prayer_key]["date_for_start"] = (base_date_obj_for_offsets + timedelta(days=date_offset_value)).strftime("%Y-%m-%d")
-                                if definition["end_text"] == item_label_on_page:
-                                    prayer_schedule[prayer_key]["end_date_offset"] = date_offset_value
-                                    prayer_schedule[prayer_key]["date_for_end"] = (base_date_obj_for_offsets + timedelta(days=date_offset_value)).strftime("%Y-%m-%d")
-                    else:
-                        print(f"Warning: Extracted text '{actual_time}' for '{item_label_on_page}' doesn't look like a valid time. Cell text: '{time_cell_text}'")
-            except NoSuchElementException: continue
-            except Exception as e_row: print(f"Error processing a row: {e_row} - Row HTML: {row.get_attribute('outerHTML')[:200]}")
-
-        all_times_found = True
-        if PRAYER_DEFINITIONS:
-            for prayer_key, definition in PRAYER_DEFINITIONS.items():
-                start_label, end_label = definition["start_text"], definition["end_text"]
-                if scraped_times_raw.get(start_label):
-                    prayer_schedule[prayer_key]["start"] = scraped_times_raw[start_label]
-                    if prayer_schedule[prayer_key]["date_for_start"] is None: prayer_schedule[prayer_key]["date_for_start"] = (base_date_obj_for_offsets + timedelta(days=prayer_schedule[prayer_key]["start_date_offset"])).strftime("%Y-%m-%d")
-                else: print(f"Warning: Could not find START time for {prayer_key} (label: '{start_label}')"); all_times_found = False
-                if scraped_times_raw.get(end_label):
-                    prayer_schedule[prayer_key]["end"] = scraped_times_raw[end_label]
-                    if prayer_schedule[prayer_key]["date_for_end"] is None: prayer_schedule[prayer_key]["date_for_end"] = (base_date_obj_for_offsets + timedelta(days=prayer_schedule[prayer_key]["end_date_offset"])).strftime("%Y-%m-%d")
-                else: print(f"Warning: Could not find END time for {prayer_key} (label: '{end_label}')"); all_times_found = False
-        
-        if all_times_found: print("Successfully extracted all required start and end times.")
-        else: print("Could not extract all required start and end times. Check warnings.")
+    Args:
+        target_date_obj_override (datetime.date, optional): Date to scrape for.
+        location_params (dict, optional): Dictionary containing location info.
+            Expected keys:
+            - "latitude", "longitude", "timezone" (for IP-based location)
+            OR
+            - "address", "timezone" (for address-based fallback)
+            If None, or missing keys, uses TARGET_TIMEZONE_STR and USER_LOCATION_ADDRESS_FALLBACK from config.
+        session (ScraperSession, optional): An open session to reuse. If None, a one-shot
+            session is created and its browser is closed before returning.
 
-    except KeyboardInterrupt: print("\nScraping process interrupted by user (Ctrl+C)."); return None
-    except TimeoutException as te: print(f"Timeout Error: {str(te)}"); # ... (rest of existing error handling) ...
-    except Exception as e: print(f"An unexpected error occurred during scraping: {e}"); # ... (rest of existing error handling) ...
-    finally:
-        print("Closing the browser.")
-        if driver:
-            try: driver.quit()
-            except Exception as e_quit: print(f"Error during browser quit: {e_quit}")
-    if not all_times_found: return None
-    return prayer_schedule
+    Returns:
+        dict or None: Prayer schedule or None on failure/interruption.
+    """
+    if session is not None:
+        return session.get_prayer_times_with_ends(target_date_obj_override, location_params)
+    with ScraperSession() as one_shot_session:
+        return one_shot_session.get_prayer_times_with_ends(target_date_obj_override, location_params)
 
 
 def _test_scraper_functionality():
@@ -282,7 +384,8 @@ def _test_scraper_functionality():
         "timezone": TARGET_TIMEZONE_STR,
         "address_for_display": f"Test with: {USER_LOCATION_ADDRESS_FALLBACK}"
     }
-    schedule_today = get_prayer_times_with_ends(location_params=test_location_params)
+    test_session = ScraperSession()
+    schedule_today = get_prayer_times_with_ends(location_params=test_location_params, session=test_session)
     if schedule_today:
         print("\n--- Extracted Prayer Schedule (Today) ---")
         for prayer, times in schedule_today.items():
@@ -298,7 +401,8 @@ def _test_scraper_functionality():
         
         schedule_future = get_prayer_times_with_ends(
             target_date_obj_override=specific_date_to_test,
-            location_params=test_location_params # Use the same test_location_params
+            location_params=test_location_params, # Use the same test_location_params
+            session=test_session # Reuse the browser launched for today's scrape
         )
         if schedule_future:
             print(f"\n--- Extracted Prayer Schedule ({specific_date_to_test.strftime('%Y-%m-%d')}) ---")
@@ -308,6 +412,8 @@ def _test_scraper_functionality():
             print(f"\nFailed to extract complete prayer schedule for {specific_date_to_test.strftime('%Y-%m-%d')} or process was interrupted.")
     except Exception as e_test:
         print(f"Error during future date test in __main__: {e_test}")
+    finally:
+        test_session.close()
 
 if __name__ == '__main__':
     _test_scraper_functionality()
@@ -0,0 +1,134 @@
+# --- START OF FILE scraper_pool.py ---
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config_loader import get_config
+from scrape_prayer_times import ScraperSession
+
+# Load configuration
+try:
+    config = get_config()
+except Exception as e:
+    print(f"FATAL: Could not load configuration for the browser pool: {e}")
+    sys.exit(1)
+
+BROWSER_POOL_CONFIG = config.get('browser_pool', {})
+DEFAULT_POOL_SIZE = 3
+DEFAULT_ESTIMATED_BROWSER_MB = 350 # Resident memory of one headless Chrome/Brave with the muwaqqit page loaded
+
+
+def effective_pool_size(size=None, memory_cap_mb=None, estimated_browser_mb=None):
+    """
+    Number of browsers the pool may run at once: 'size', further limited so that
+    size x estimated_browser_mb stays within memory_cap_mb. Always at least 1.
+    """
+    size = size if size is not None else BROWSER_POOL_CONFIG.get('size', DEFAULT_POOL_SIZE)
+    memory_cap_mb = memory_cap_mb if memory_cap_mb is not None else BROWSER_POOL_CONFIG.get('memory_cap_mb')
+    estimated_browser_mb = estimated_browser_mb or BROWSER_POOL_CONFIG.get('estimated_browser_mb', DEFAULT_ESTIMATED_BROWSER_MB)
+    if memory_cap_mb:
+        size = min(size, int(memory_cap_mb // estimated_browser_mb))
+    return max(1, int(size))
+
+
+def _location_token(location_params):
+    return repr(sorted((location_params or {}).items()))
+
+
+class ScraperPool:
+    """
+    Scrapes several dates at once with a bounded pool of reusable browsers.
+
+    Has the same interface as ScraperSession. prefetch_prayer_times() hands every date to
+    the pool; get_prayer_times_with_ends() then waits for that date's result, so callers
+    that ask for dates in order get results in date order. Each worker thread owns one
+    ScraperSession, launched lazily and relaunched on crashes like a single session (one
+    launch at a time across the pool), and every scrape keeps its own
+    OVERALL_PROCESS_TIMEOUT_SECONDS budget, counted from when a worker starts it.
+    """
+
+    def __init__(self, size=None, memory_cap_mb=None, estimated_browser_mb=None):
+        self.size = effective_pool_size(size, memory_cap_mb, estimated_browser_mb)
+        self.executor = None
+        self.prefetched = {} # (date, location token) -> Future
+        self.sessions = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._launch_lock = threading.Lock() # Launching drivers concurrently races in webdriver-manager
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _ensure_executor(self):
+        if self.executor is None:
+            print(f"Starting browser pool with {self.size} worker(s).")
+            self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="scraper")
+        return self.executor
+
+    def _worker_session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = ScraperSession(launch_lock=self._launch_lock)
+            self._local.session = session
+            with self._lock:
+                self.sessions.append(session)
+        session.ensure_driver()
+        return session
+
+    def _scrape(self, date_obj, location_params):
+        try:
+            session = self._worker_session()
+        except Exception as e:
+            print(f"Error launching a browser for {date_obj}: {e}")
+            return None
+        return session.get_prayer_times_with_ends(date_obj, location_params)
+
+    def prefetch_prayer_times(self, dates, location_params):
+        """Queues every date on the pool so they are scraped concurrently."""
+        executor = self._ensure_executor()
+        token = _location_token(location_params)
+        for day in dates:
+            if (day, token) not in self.prefetched:
+                self.prefetched[(day, token)] = executor.submit(self._scrape, day, location_params)
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        """
+        Returns the schedule for a date, waiting for its prefetch if one is running.
+
+        Args and return value match scrape_prayer_times.get_prayer_times_with_ends().
+        """
+        future = None
+        if target_date_obj_override is not None:
+            future = self.prefetched.pop((target_date_obj_override, _location_token(location_params)), None)
+        if future is None:
+            future = self._ensure_executor().submit(self._scrape, target_date_obj_override, location_params)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            print("\nScraping interrupted by user (Ctrl+C). Cancelling queued dates.")
+            self._cancel_pending()
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred during scraping: {e}")
+            return None
+
+    def _cancel_pending(self):
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched = {}
+
+    def close(self):
+        """Cancels dates not yet started, waits for running scrapes and quits every browser."""
+        self._cancel_pending()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
+
+# --- END OF FILE scraper_pool.py ---
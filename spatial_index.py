@@ -0,0 +1,81 @@
+# --- START OF FILE spatial_index.py ---
+
+import math
+
+EARTH_MEAN_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.32
+# Haversine (sphere) and geodesic (ellipsoid) distances differ by at most ~0.5%, so the
+# prefilter keeps a small margin and the exact geodesic check makes the final decision.
+HAVERSINE_MARGIN = 1.006
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance on a spherical Earth; a cheap stand-in for geodesic()."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_MEAN_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    Uniform latitude/longitude grid over known locations, for "is there a known location
+    within X km of this point?" queries.
+
+    A query only visits the grid cells overlapping the search radius, then discards
+    candidates with a haversine prefilter before running the exact geodesic distance.
+    """
+
+    def __init__(self, cell_km=10.0):
+        self.cell_deg = max(cell_km, 0.1) / KM_PER_DEGREE_LATITUDE
+        self.cells = {} # (lat cell, lon cell) -> [(latitude, longitude, payload)]
+        self.size = 0
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg)
+
+    def add(self, latitude, longitude, payload):
+        """Adds a location. 'payload' is returned by within() (e.g. a schedule cache location key)."""
+        self.cells.setdefault(self._cell(latitude, longitude), []).append((latitude, longitude, payload))
+        self.size += 1
+
+    def within(self, latitude, longitude, max_km, predicate=None):
+        """
+        Returns [(distance_km, payload)] for every location within max_km, nearest first.
+
+        Args:
+            predicate (callable, optional): Only payloads for which it returns True are considered
+                (e.g. same timezone).
+        """
+        lat_span = max_km / KM_PER_DEGREE_LATITUDE
+        # Longitude degrees shrink towards the poles; cap the widening so polar queries stay bounded.
+        lon_span = min(180.0, lat_span / max(math.cos(math.radians(min(89.0, abs(latitude) + lat_span))), 0.01))
+        lat_cells = range(math.floor((latitude - lat_span) / self.cell_deg), math.floor((latitude + lat_span) / self.cell_deg) + 1)
+        lon_cells = range(math.floor((longitude - lon_span) / self.cell_deg), math.floor((longitude + lon_span) / self.cell_deg) + 1)
+        crosses_antimeridian = longitude - lon_span < -180.0 or longitude + lon_span > 180.0
+        if crosses_antimeridian or len(lon_cells) > len(self.cells): # Scanning the occupied cells is simpler/cheaper
+            candidate_cells = [cell for cell in self.cells if cell[0] in lat_cells]
+        else:
+            candidate_cells = [(lat_cell, lon_cell) for lat_cell in lat_cells for lon_cell in lon_cells]
+
+        from geopy.distance import geodesic # Deferred: geopy is slow to import and rarely needed
+        matches = []
+        for cell in candidate_cells:
+            for entry_lat, entry_lon, payload in self.cells.get(cell, ()):
+                if predicate is not None and not predicate(payload):
+                    continue
+                if haversine_km(latitude, longitude, entry_lat, entry_lon) > max_km * HAVERSINE_MARGIN:
+                    continue
+                distance_km = geodesic((latitude, longitude), (entry_lat, entry_lon)).km
+                if distance_km <= max_km:
+                    matches.append((distance_km, payload))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def nearest(self, latitude, longitude, max_km, predicate=None):
+        """Returns (distance_km, payload) for the nearest location within max_km, or None."""
+        matches = self.within(latitude, longitude, max_km, predicate)
+        return matches[0] if matches else None
+
+# --- END OF FILE spatial_index.py ---
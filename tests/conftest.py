@@ -0,0 +1,45 @@
+# --- START OF FILE tests/conftest.py ---
+
+"""
+Shared test setup. The app's modules read config.json from the working directory when
+they are imported, so the tests run in a scratch directory holding a copy of the repo's
+config.json with every cache and state file pointed inside it. This runs before any test
+module imports the app.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_CALENDAR_ID = 'test-calendar@group.calendar.google.com'
+TEST_TIMEZONE = 'Australia/Sydney'
+
+
+def _write_test_config(directory):
+    with open(os.path.join(REPO_ROOT, 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config.update({
+        'calendar_id': TEST_CALENDAR_ID,
+        'target_timezone': TEST_TIMEZONE,
+        'prayer_time_backend': 'local',
+        'location_check_enabled': False,
+        'state_path': os.path.join(directory, 'state.json'),
+    })
+    config['schedule_cache'] = dict(config.get('schedule_cache', {}), path=os.path.join(directory, 'schedule_cache.sqlite3'))
+    config['calendar_mirror'] = dict(config.get('calendar_mirror', {}), path=os.path.join(directory, 'calendar_mirror.json'))
+    config['geolocation'] = dict(config.get('geolocation', {}), cache_path=os.path.join(directory, 'geolocation_cache.json'))
+    config['run_metrics'] = dict(config.get('run_metrics', {}), enabled=False)
+    config['calendar_rate_limit'] = dict(config.get('calendar_rate_limit', {}), requests_per_minute=0, backoff_base_seconds=0.0)
+    with open(os.path.join(directory, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4)
+
+
+TEST_DIRECTORY = tempfile.mkdtemp(prefix='prayer_calendar_tests_')
+_write_test_config(TEST_DIRECTORY)
+os.chdir(TEST_DIRECTORY)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# --- END OF FILE tests/conftest.py ---
@@ -0,0 +1,63 @@
+# --- START OF FILE tests/test_batch_prayer_engine.py ---
+
+from datetime import date, timedelta
+
+import pytest
+
+import local_prayer_engine
+from batch_prayer_engine import compute_batch
+from local_prayer_engine import compute_label_times, parse_muwaqqit_params
+from prayer_schedule import schedule_label_index
+
+PARAMS = parse_muwaqqit_params(local_prayer_engine.BASE_URL)
+LABELS = schedule_label_index(local_prayer_engine.PRAYER_DEFINITIONS)
+LOCATIONS = [
+    (-33.8688, 151.2093, 'Australia/Sydney'),
+    (51.5072, -0.1276, 'Europe/London'),
+    (21.4225, 39.8262, 'Asia/Riyadh'),
+    (40.7128, -74.0060, 'America/New_York'),
+    (59.9139, 10.7522, 'Europe/Oslo'),
+]
+# Every 11th day of a year, so the sample covers DST changes and both solstices.
+DATES = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(0, 365, 11)]
+
+
+def _seconds(label_time):
+    time_str, date_offset = label_time
+    hours, minutes, seconds = (int(part) for part in time_str.split(':'))
+    return date_offset * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+@pytest.mark.parametrize('rule', local_prayer_engine.HIGH_LATITUDE_RULES)
+def test_batch_engine_agrees_with_local_engine(rule):
+    batch = compute_batch(DATES, LOCATIONS, labels=LABELS, params=PARAMS, high_latitude_rule=rule)
+    for d, day in enumerate(DATES):
+        for n, (latitude, longitude, timezone_str) in enumerate(LOCATIONS):
+            expected = compute_label_times(day, latitude, longitude, timezone_str, LABELS, PARAMS, rule)
+            actual = batch.label_times(d, n)
+            assert set(actual) == set(expected), (day, timezone_str)
+            for label, label_time in expected.items():
+                assert abs(_seconds(actual[label]) - _seconds(label_time)) <= 60, (day, timezone_str, label)
+
+
+def _schedule_seconds(date_str, time_str):
+    return (date.fromisoformat(date_str) - DATES[0]).days * 86400 + _seconds((time_str, 0))
+
+
+def test_prayer_schedule_matches_the_local_engine():
+    days = DATES[::6]
+    batch = compute_batch(days, LOCATIONS, labels=LABELS, params=PARAMS)
+    engine = local_prayer_engine.LocalPrayerEngine()
+    for d, day in enumerate(days):
+        for n, (latitude, longitude, timezone_str) in enumerate(LOCATIONS):
+            expected = engine.get_prayer_times_with_ends(day, {'latitude': latitude, 'longitude': longitude, 'timezone': timezone_str})
+            actual = batch.prayer_schedule(d, n)
+            assert actual.keys() == expected.keys(), (day, timezone_str)
+            for prayer_name, expected_times in expected.items():
+                actual_times = actual[prayer_name]
+                for time_key, date_key in (('start', 'date_for_start'), ('end', 'date_for_end')):
+                    difference = (_schedule_seconds(actual_times[date_key], actual_times[time_key])
+                                  - _schedule_seconds(expected_times[date_key], expected_times[time_key]))
+                    assert abs(difference) <= 60, (day, timezone_str, prayer_name, time_key)
+
+# --- END OF FILE tests/test_batch_prayer_engine.py ---
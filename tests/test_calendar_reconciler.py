@@ -0,0 +1,211 @@
+# --- START OF FILE tests/test_calendar_reconciler.py ---
+
+import copy
+import re
+from datetime import datetime
+
+import httplib2
+import pytz
+from googleapiclient.errors import HttpError
+
+from calendar_batch import CalendarWriteBatch
+from calendar_reconciler import (
+    WrittenEventLog, apply_plan, build_desired_events, deterministic_event_id, plan_reconciliation, plan_upserts,
+)
+from conftest import TEST_CALENDAR_ID
+from prayer_calendar_manager import index_prayer_events
+from rate_limiter import CalendarRateLimiter
+
+TARGET_TZ = pytz.timezone('Australia/Sydney')
+LOCATION = {'latitude': -33.8688, 'longitude': 151.2093, 'timezone': 'Australia/Sydney'}
+PRAYER_NAME_BY_SUMMARY = {'Fajr Prayer': 'Fajr', 'Isha Prayer': 'Isha'}
+
+
+def _schedule(date_str, fajr=('04:51:12', '06:10:00'), isha=('21:10:00', '23:40:00')):
+    def times(start, end):
+        return {'start': start, 'end': end, 'start_date_offset': 0, 'end_date_offset': 0,
+                'date_for_start': date_str, 'date_for_end': date_str}
+    return {'Fajr': times(*fajr), 'Isha': times(*isha)}
+
+
+def _desired(schedules_by_date):
+    return build_desired_events(schedules_by_date, TARGET_TZ, LOCATION, calendar_id=TEST_CALENDAR_ID)
+
+
+def _existing(desired_event, **changes):
+    """The event the API returns after desired_event was written, with 'changes' applied."""
+    event = dict(copy.deepcopy(desired_event['body']), id=desired_event['event_id'])
+    event.update(changes)
+    return event
+
+
+def _index(events):
+    return {(event['extendedProperties']['private']['date'], event['extendedProperties']['private']['prayer']): event
+            for event in events}
+
+
+def _plan(desired, existing_index, duplicates=()):
+    return plan_reconciliation(desired, existing_index, list(duplicates), TARGET_TZ, PRAYER_NAME_BY_SUMMARY)
+
+
+def test_missing_events_are_created():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    plan = _plan(desired, {})
+    assert plan.counts() == {'create': 2, 'update': 0, 'noop': 0, 'delete': 0, 'upsert': 0}
+
+
+def test_current_events_are_left_alone():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    plan = _plan(desired, _index(_existing(event) for event in desired.values()))
+    assert plan.is_empty()
+    assert len(plan.noops) == 2
+
+
+def test_changed_times_are_updated():
+    old = _desired({'2025-01-01': _schedule('2025-01-01', fajr=('04:50:00', '06:10:00'))})
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    plan = _plan(desired, _index(_existing(event) for event in old.values()))
+    assert [desired_event['prayer_name'] for desired_event, _ in plan.updates] == ['Fajr']
+    assert len(plan.noops) == 1
+
+
+def test_duplicates_of_planned_events_are_deleted():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    existing = [_existing(event) for event in desired.values()]
+    duplicate = _existing(desired[('2025-01-01', 'Fajr')], id='duplicatefajr')
+    plan = _plan(desired, _index(existing), [duplicate])
+    assert plan.deletes == [duplicate]
+
+
+def test_days_that_were_not_fetched_are_not_touched():
+    fetched = _desired({'2025-01-02': _schedule('2025-01-02')})
+    unfetched_day = _desired({'2025-01-01': _schedule('2025-01-01')})
+    existing = [_existing(event) for event in unfetched_day.values()]
+    duplicate = _existing(unfetched_day[('2025-01-01', 'Fajr')], id='duplicatefajr')
+    plan = _plan(fetched, _index(existing), [duplicate])
+    assert len(plan.creates) == 2
+    assert plan.deletes == []
+
+
+def test_events_without_their_deterministic_id_are_moved_onto_it():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    legacy = _existing(desired[('2025-01-01', 'Fajr')], id='randomlegacyid')
+    plan = _plan({('2025-01-01', 'Fajr'): desired[('2025-01-01', 'Fajr')]}, _index([legacy]))
+    assert [event['event_id'] for event in plan.creates] == [desired[('2025-01-01', 'Fajr')]['event_id']]
+    assert plan.deletes == [legacy]
+
+
+def test_events_edited_by_hand_are_repaired_even_though_their_tag_is_unchanged():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    edited = _existing(desired[('2025-01-01', 'Fajr')], summary='Fajr (moved)')
+    edited['start'] = dict(edited['start'], dateTime='2025-01-01T05:30:00+11:00')
+    plan = _plan(desired, _index([edited, _existing(desired[('2025-01-01', 'Isha')])]))
+    assert [existing_event for _, existing_event in plan.updates] == [edited]
+    assert len(plan.noops) == 1
+
+
+def test_times_returned_with_another_offset_are_still_current():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    existing = [_existing(event) for event in desired.values()]
+    for event in existing:
+        for field in ('start', 'end'):
+            instant = datetime.fromisoformat(event[field]['dateTime']).astimezone(pytz.utc)
+            event[field] = dict(event[field], dateTime=instant.strftime('%Y-%m-%dT%H:%M:%SZ'))
+    plan = _plan(desired, _index(existing))
+    assert plan.is_empty()
+
+
+def test_index_keeps_legacy_events_whose_key_has_no_tagged_event():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    tagged_fajr = _existing(desired[('2025-01-01', 'Fajr')])
+    untagged = [{k: v for k, v in _existing(event, id=f'legacy{event["prayer_name"]}').items() if k != 'extendedProperties'}
+                for event in desired.values()]
+    index, duplicates = index_prayer_events([untagged[0], tagged_fajr, untagged[1]], TARGET_TZ, PRAYER_NAME_BY_SUMMARY)
+    assert index == {('2025-01-01', 'Fajr'): tagged_fajr, ('2025-01-01', 'Isha'): untagged[1]}
+    assert duplicates == [untagged[0]]
+
+    plan = _plan(desired, index, duplicates)
+    assert sorted(event['id'] for event in plan.deletes) == ['legacyFajr', 'legacyIsha']
+    assert [event['prayer_name'] for event in plan.creates] == ['Isha']
+
+def test_deterministic_event_ids_are_stable_valid_and_namespaced():
+    event_id = deterministic_event_id(TEST_CALENDAR_ID, 'default', '2025-01-01', 'Fajr')
+    assert event_id == deterministic_event_id(TEST_CALENDAR_ID, 'default', '2025-01-01', 'Fajr')
+    assert re.fullmatch(r'[0-9a-v]{5,1024}', event_id)
+    others = {deterministic_event_id('other@group.calendar.google.com', 'default', '2025-01-01', 'Fajr'),
+              deterministic_event_id(TEST_CALENDAR_ID, 'mosque', '2025-01-01', 'Fajr'),
+              deterministic_event_id(TEST_CALENDAR_ID, 'default', '2025-01-02', 'Fajr'),
+              deterministic_event_id(TEST_CALENDAR_ID, 'default', '2025-01-01', 'Isha')}
+    assert event_id not in others and len(others) == 4
+
+
+def test_upserts_skip_events_whose_content_was_already_written():
+    written = _desired({'2025-01-01': _schedule('2025-01-01')})
+    written_events = WrittenEventLog()
+    for event in written.values():
+        written_events.record(_existing(event))
+    desired = _desired({'2025-01-01': _schedule('2025-01-01', fajr=('04:50:00', '06:10:00')),
+                        '2025-01-02': _schedule('2025-01-02')})
+    plan = plan_upserts(desired, written_events)
+    assert [(event['date_str'], event['prayer_name']) for event in plan.upserts] == [
+        ('2025-01-01', 'Fajr'), ('2025-01-02', 'Fajr'), ('2025-01-02', 'Isha')]
+    assert [desired_event['prayer_name'] for desired_event, _ in plan.noops] == ['Isha']
+
+    written_events.prune('2025-01-02')
+    assert written_events.entries == {}
+
+
+class FakeRequest:
+    def __init__(self, method, kwargs):
+        self.method = method
+        self.kwargs = kwargs
+
+
+class FakeEvents:
+    def __getattr__(self, method):
+        return lambda **kwargs: FakeRequest(method, kwargs)
+
+
+class FakeCalendarService:
+    """Inserting an ID that already exists fails with 409, like the Calendar API; everything else succeeds."""
+
+    def __init__(self, existing_ids=()):
+        self.existing_ids = set(existing_ids)
+        self.calls = []
+
+    def events(self):
+        return FakeEvents()
+
+    def new_batch_http_request(self, callback):
+        service = self
+
+        class Batch:
+            def __init__(self):
+                self.requests = []
+
+            def add(self, request, request_id):
+                self.requests.append((request_id, request))
+
+            def execute(self):
+                for request_id, request in self.requests:
+                    body = request.kwargs.get('body') or {}
+                    event_id = request.kwargs.get('eventId') or body.get('id')
+                    service.calls.append((request.method, event_id))
+                    if request.method == 'insert' and event_id in service.existing_ids:
+                        callback(request_id, None, HttpError(httplib2.Response({'status': 409}), b'duplicate'))
+                    else:
+                        service.existing_ids.add(event_id)
+                        callback(request_id, dict(body, id=event_id), None)
+        return Batch()
+
+
+def test_upserts_insert_first_and_update_ids_that_already_exist():
+    desired = _desired({'2025-01-01': _schedule('2025-01-01')})
+    fajr_id, isha_id = desired[('2025-01-01', 'Fajr')]['event_id'], desired[('2025-01-01', 'Isha')]['event_id']
+    service = FakeCalendarService(existing_ids={isha_id})
+    write_batch = CalendarWriteBatch(service, rate_limiter=CalendarRateLimiter(requests_per_minute=0))
+    assert apply_plan(service, plan_upserts(desired), write_batch, calendar_id=TEST_CALENDAR_ID) == (2, 0)
+    assert service.calls == [('insert', fajr_id), ('insert', isha_id), ('update', isha_id)]
+
+
+# --- END OF FILE tests/test_calendar_reconciler.py ---
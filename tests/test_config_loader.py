@@ -0,0 +1,86 @@
+# --- START OF FILE tests/test_config_loader.py ---
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import config_loader
+from config_loader import AtomicFile, write_json_atomically
+from conftest import REPO_ROOT
+
+
+def test_atomic_writes_replace_the_file_only_on_success(tmp_path):
+    path = os.path.join(tmp_path, 'data.json')
+    write_json_atomically(path, {'version': 1})
+    with pytest.raises(RuntimeError):
+        with AtomicFile(path) as f:
+            f.write('{"version": ')
+            raise RuntimeError("interrupted")
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'version': 1}
+    assert os.listdir(tmp_path) == ['data.json']
+
+    write_json_atomically(path, {'version': 2}, indent=4)
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'version': 2}
+    assert os.listdir(tmp_path) == ['data.json']
+
+@pytest.fixture
+def state_path(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, 'state.json')
+    monkeypatch.setattr(config_loader, '_state_path', lambda: path)
+    monkeypatch.setattr(config_loader, '_pending_state', {})
+    monkeypatch.setattr(config_loader, '_pending_entries', {})
+    monkeypatch.setattr(config_loader, '_state_cache', None)
+    return path
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_flush_merges_entries_into_what_another_process_wrote(state_path):
+    write_json_atomically(state_path, {'written_events': {'a': 1, 'b': 2}, 'last_checked_ip': '10.0.0.1'})
+    config_loader.update_state_entries('written_events', {'c': 3}, removed=['a'])
+    write_json_atomically(state_path, {'written_events': {'a': 1, 'b': 2, 'd': 4}, 'last_checked_ip': '10.0.0.2'}) # Another process
+    assert config_loader.flush_state()
+    assert _read(state_path) == {'written_events': {'b': 2, 'c': 3, 'd': 4}, 'last_checked_ip': '10.0.0.2'}
+    assert not os.path.exists(state_path + '.lock')
+
+
+def test_flush_waits_for_the_state_lock_and_breaks_a_stale_one(state_path, monkeypatch):
+    monkeypatch.setattr(config_loader, 'STATE_LOCK_TIMEOUT_SECONDS', 0.2)
+    config_loader.update_state(last_checked_ip='10.0.0.1')
+    with open(state_path + '.lock', 'w') as f:
+        f.write('12345')
+    assert not config_loader.flush_state()
+    assert config_loader.get_state()['last_checked_ip'] == '10.0.0.1' # Still pending
+
+    stale = time.time() - config_loader.STATE_LOCK_STALE_SECONDS - 1
+    os.utime(state_path + '.lock', (stale, stale))
+    assert config_loader.flush_state()
+    assert _read(state_path)['last_checked_ip'] == '10.0.0.1'
+
+
+def test_concurrent_processes_keep_each_others_entries(tmp_path):
+    with open(os.path.join(REPO_ROOT, 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['state_path'] = os.path.join(tmp_path, 'state.json')
+    with open(os.path.join(tmp_path, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    code = ("import sys, config_loader\n"
+            "for i in range(25):\n"
+            "    config_loader.update_state_entries('written_events', {f'{sys.argv[1]}-{i}': i})\n"
+            "    assert config_loader.flush_state()\n")
+    writers = [subprocess.Popen([sys.executable, '-c', code, name], cwd=tmp_path, env=dict(os.environ, PYTHONPATH=REPO_ROOT))
+               for name in ('daemon', 'fleet', 'cli')]
+    assert [writer.wait(timeout=60) for writer in writers] == [0, 0, 0]
+    assert len(_read(config['state_path'])['written_events']) == 75
+
+
+# --- END OF FILE tests/test_config_loader.py ---
@@ -0,0 +1,28 @@
+# --- START OF FILE tests/test_fleet.py ---
+
+from fleet import load_fleet_profiles
+
+SYDNEY = {'latitude': -33.8688, 'longitude': 151.2093, 'timezone': 'Australia/Sydney'}
+MELBOURNE = {'latitude': -37.8136, 'longitude': 144.9631, 'timezone': 'Australia/Melbourne'}
+
+
+def test_profiles_with_the_same_name_and_calendar_are_rejected():
+    profiles = load_fleet_profiles([
+        {'name': 'home', 'calendar_id': 'family@example.com', 'location': SYDNEY},
+        {'name': 'home', 'calendar_id': 'family@example.com', 'location': MELBOURNE},
+        {'name': 'home', 'calendar_id': 'work@example.com', 'location': MELBOURNE},
+        {'name': 'office', 'calendar_id': 'family@example.com', 'location': MELBOURNE},
+    ])
+    assert [(profile['name'], profile['calendar_id']) for profile in profiles] == [
+        ('home', 'family@example.com'), ('home', 'work@example.com'), ('office', 'family@example.com')]
+    assert profiles[0]['location']['latitude'] == SYDNEY['latitude']
+
+
+def test_unnamed_profiles_get_distinct_names():
+    profiles = load_fleet_profiles([
+        {'calendar_id': 'family@example.com', 'location': SYDNEY},
+        {'calendar_id': 'family@example.com', 'location': MELBOURNE},
+    ])
+    assert [profile['name'] for profile in profiles] == ['profile 1', 'profile 2']
+
+# --- END OF FILE tests/test_fleet.py ---
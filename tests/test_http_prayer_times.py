@@ -0,0 +1,49 @@
+# --- START OF FILE tests/test_http_prayer_times.py ---
+
+from http_prayer_times import parse_results_html
+from prayer_schedule import parse_results_rows
+
+RESULTS_PAGE = """<!DOCTYPE html><html><body>
+<div class="container">
+  <table class="table"><tr><td><b>Fajr</b></td><td>09:99:99</td><td>not the results table</td></tr></table>
+  <div id="results">
+    <table class="table">
+      <thead><tr><th>Time</th><th>Value</th><th>Date</th></tr></thead>
+      <tbody>
+        <tr><td><b>Fajr</b></td><td>04:51:12 <small>(+2)</small></td><td>2025-01-01</td></tr>
+        <tr><td><b>Maghrib/Sunset</b></td><td>20:10:05&mdash;20:12:00</td><td>2025-01-01</td></tr>
+        <tr><td><b>Half shar&#703;&#299; night</b></td><td>00:31:40</td><td>2025-01-02 &#9650;</td></tr>
+        <tr><td>No bold label</td><td>12:00:00</td><td>2025-01-01</td></tr>
+        <tr><td><b>Too few cells</b></td><td>12:00:00</td></tr>
+        <tr><td><b>Nested</b><table><tr><td>x</td></tr></table></td><td>13:00:00</td><td>2025-01-01</td></tr>
+      </tbody>
+    </table>
+  </div>
+</div>
+</body></html>"""
+
+
+def test_parse_results_html_reads_only_the_results_table():
+    rows, table_found = parse_results_html(RESULTS_PAGE)
+    assert table_found
+    labels = [row[0] for row in rows]
+    assert labels == ['Fajr', 'Maghrib/Sunset', 'Half sharʿī night', 'Nested']
+    assert rows[0] == ('Fajr', '04:51:12 (+2)', '2025-01-01')
+
+
+def test_parsed_rows_give_times_and_day_offsets():
+    rows, _ = parse_results_html(RESULTS_PAGE)
+    label_times = parse_results_rows(rows, {'Fajr', 'Maghrib/Sunset', 'Half sharʿī night'})
+    assert label_times == {
+        'Fajr': ('04:51:12', 0),
+        'Maghrib/Sunset': ('20:10:05', 0),
+        'Half sharʿī night': ('00:31:40', 1),
+    }
+
+
+def test_parse_results_html_without_results_table():
+    rows, table_found = parse_results_html('<html><body><div id="results">Loading...</div></body></html>')
+    assert rows == []
+    assert not table_found
+
+# --- END OF FILE tests/test_http_prayer_times.py ---
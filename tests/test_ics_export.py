@@ -0,0 +1,76 @@
+# --- START OF FILE tests/test_ics_export.py ---
+
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import REPO_ROOT
+from ics_export import ICS_MAX_LINE_OCTETS, IcsWriter, _escape_text, _fold, event_uid, export_ics
+from local_prayer_engine import LocalPrayerEngine
+
+LOCATION = {'latitude': -33.8688, 'longitude': 151.2093, 'timezone': 'Australia/Sydney', 'address_for_display': 'Sydney'}
+
+
+def _unfold(text):
+    return text.replace('\r\n ', '')
+
+
+def test_escape_text_escapes_rfc5545_specials():
+    assert _escape_text('a\\b;c,d\r\ne\nf') == 'a\\\\b\\;c\\,d\\ne\\nf'
+
+
+def test_fold_keeps_lines_within_75_octets_without_splitting_characters():
+    line = 'DESCRIPTION:' + 'ʿIshāʾ al-Thānī ' * 20
+    pieces = _fold(line)
+    assert len(pieces) > 1
+    assert all(len(piece.encode('utf-8')) <= ICS_MAX_LINE_OCTETS for piece in pieces)
+    assert all(piece.startswith(' ') for piece in pieces[1:])
+    assert pieces[0] + ''.join(piece[1:] for piece in pieces[1:]) == line
+    assert _fold('SUMMARY:Fajr Prayer') == ['SUMMARY:Fajr Prayer']
+
+
+def test_event_uid_is_stable_and_location_specific():
+    uid = event_uid('Fajr', '2025-01-01', LOCATION)
+    assert uid == event_uid('Fajr', '2025-01-01', dict(LOCATION))
+    assert uid.startswith('fajr-2025-01-01-') and uid.endswith('@prayer-calendar-manager')
+    assert uid != event_uid('Fajr', '2025-01-01', dict(LOCATION, latitude=21.4225, longitude=39.8262))
+
+
+def test_export_writes_a_valid_calendar_with_one_event_per_prayer_and_day(tmp_path):
+    path = os.path.join(tmp_path, 'prayers.ics')
+    dates = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(3)]
+    result = export_ics(path, dates, LOCATION, LocalPrayerEngine(), calendar_name='Test, Prayers')
+    assert result == {'events': 15, 'failed_dates': []}
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    assert all(line.endswith('\r') for line in text.split('\n')[:-1])
+    lines = _unfold(text).split('\r\n')
+    assert lines[0] == 'BEGIN:VCALENDAR' and lines[-2] == 'END:VCALENDAR'
+    assert 'X-WR-CALNAME:Test\\, Prayers' in lines
+    assert lines.count('BEGIN:VEVENT') == lines.count('END:VEVENT') == 15
+    uids = [line for line in lines if line.startswith('UID:')]
+    assert len(set(uids)) == 15
+    assert all(line.endswith('Z') for line in lines if line.startswith(('DTSTART:', 'DTEND:')))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_an_aborted_export_leaves_no_file_behind(tmp_path):
+    path = os.path.join(tmp_path, 'prayers.ics')
+    with pytest.raises(RuntimeError):
+        with IcsWriter(path):
+            raise RuntimeError("interrupted")
+    assert os.listdir(tmp_path) == []
+
+
+def test_importing_the_exporter_does_not_load_google_calendar_or_the_manager():
+    code = ("import sys, ics_export; "
+            "print(sorted(name for name in ('prayer_calendar_manager', 'googleapiclient', 'httplib2') if name in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env).stdout
+    assert output.strip().splitlines()[-1] == '[]'
+
+# --- END OF FILE tests/test_ics_export.py ---
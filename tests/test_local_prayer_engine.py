@@ -0,0 +1,60 @@
+# --- START OF FILE tests/test_local_prayer_engine.py ---
+
+from datetime import date
+
+import pytest
+
+import local_prayer_engine
+from local_prayer_engine import HIGH_LATITUDE_RULES, LocalPrayerEngine, compute_label_times, parse_muwaqqit_params
+from prayer_schedule import schedule_label_index
+
+LONDON = {'latitude': 51.5072, 'longitude': -0.1276, 'timezone': 'Europe/London'}
+SYDNEY = {'latitude': -33.8688, 'longitude': 151.2093, 'timezone': 'Australia/Sydney'}
+PARAMS = parse_muwaqqit_params(local_prayer_engine.BASE_URL)
+LABELS = schedule_label_index(local_prayer_engine.PRAYER_DEFINITIONS)
+FAJR = local_prayer_engine.PRAYER_DEFINITIONS['Fajr']['start_text']
+ISHA = local_prayer_engine.PRAYER_DEFINITIONS['Isha']['start_text']
+SUNRISE = local_prayer_engine.PRAYER_DEFINITIONS['Fajr']['end_text']
+SUNSET = local_prayer_engine.PRAYER_DEFINITIONS['Maghrib']['start_text']
+
+
+def _seconds(label_time):
+    time_str, date_offset = label_time
+    hours, minutes, seconds = (int(part) for part in time_str.split(':'))
+    return date_offset * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def _label_times(day, location, rule):
+    return compute_label_times(day, location['latitude'], location['longitude'], location['timezone'], LABELS, PARAMS, rule)
+
+
+def test_without_a_rule_london_in_june_has_no_fajr_or_isha():
+    label_times = _label_times(date(2025, 6, 21), LONDON, 'none')
+    assert FAJR not in label_times
+    assert ISHA not in label_times
+
+
+@pytest.mark.parametrize('rule', [rule for rule in HIGH_LATITUDE_RULES if rule != 'none'])
+def test_high_latitude_rule_places_twilight_within_the_night(rule):
+    label_times = _label_times(date(2025, 6, 21), LONDON, rule)
+    sunrise, sunset = _seconds(label_times[SUNRISE]), _seconds(label_times[SUNSET])
+    fajr, isha = _seconds(label_times[FAJR]), _seconds(label_times[ISHA])
+    assert fajr < sunrise
+    assert sunset < isha <= sunset + (sunrise + 86400 - sunset) / 2 + 1
+
+
+def test_angle_based_rule_gives_a_complete_schedule_for_london_in_june():
+    engine = LocalPrayerEngine(high_latitude_rule='angle_based')
+    schedule = engine.get_prayer_times_with_ends(date(2025, 6, 21), LONDON)
+    assert schedule is not None
+    assert set(schedule) == set(local_prayer_engine.PRAYER_DEFINITIONS)
+    isha = schedule['Isha']
+    assert (isha['date_for_start'], isha['start']) < (isha['date_for_end'], isha['end'])
+
+
+def test_rule_does_not_change_mid_latitude_times():
+    for month in range(1, 13):
+        day = date(2025, month, 15)
+        assert _label_times(day, SYDNEY, 'angle_based') == _label_times(day, SYDNEY, 'none')
+
+# --- END OF FILE tests/test_local_prayer_engine.py ---
@@ -0,0 +1,47 @@
+# --- START OF FILE tests/test_prayer_calendar_manager.py ---
+
+from datetime import date
+
+import pytest
+
+import config_loader
+import prayer_calendar_manager
+from calendar_reconciler import ReconciliationPlan, WrittenEventLog
+from conftest import TEST_CALENDAR_ID
+
+
+@pytest.fixture
+def upsert_mode(monkeypatch):
+    monkeypatch.setattr(prayer_calendar_manager, 'CALENDAR_WRITE_MODE', 'upsert')
+    monkeypatch.setattr(config_loader, '_pending_state', {}) # Nothing is written to disk
+    monkeypatch.setattr(config_loader, '_pending_entries', {})
+
+
+def _run_result(listing_failed=False, writes_failed=0):
+    return {'plan': ReconciliationPlan(), 'scraping_failed': False, 'listing_failed': listing_failed,
+            'writes_succeeded': 0, 'writes_failed': writes_failed}
+
+
+def test_upsert_mode_reconciles_a_calendar_once_before_writing_blindly(upsert_mode):
+    assert prayer_calendar_manager.calendar_write_mode(TEST_CALENDAR_ID) == 'reconcile'
+
+    prayer_calendar_manager.record_sync_result(_run_result(writes_failed=1), 'reconcile', WrittenEventLog(),
+                                               TEST_CALENDAR_ID, date(2025, 1, 1))
+    assert prayer_calendar_manager.calendar_write_mode(TEST_CALENDAR_ID) == 'reconcile'
+
+    prayer_calendar_manager.record_sync_result(_run_result(), 'reconcile', WrittenEventLog(), TEST_CALENDAR_ID, date(2025, 1, 1))
+    assert prayer_calendar_manager.calendar_write_mode(TEST_CALENDAR_ID) == 'upsert'
+    assert prayer_calendar_manager.calendar_write_mode(TEST_CALENDAR_ID, 'another-profile') == 'reconcile'
+
+
+def test_sync_results_save_only_the_written_event_log_entries_they_changed(upsert_mode):
+    config_loader.update_state_entries('written_events', {'old': ('2024-12-30', 'a' * 32), 'other': ('2025-01-02', 'c' * 32)})
+    written_events = WrittenEventLog({'old': ['2024-12-30', 'a' * 32]}) # Loaded before 'other' was written elsewhere
+    written_events.forget('missing')
+    written_events.record({'id': 'new', 'extendedProperties': {'private': {
+        'prayerCalendarManaged': '1', 'prayer': 'Fajr', 'date': '2025-01-01', 'contentHash': 'b' * 32}}})
+    prayer_calendar_manager.record_sync_result(_run_result(), 'upsert', written_events, TEST_CALENDAR_ID, date(2025, 1, 1))
+    assert dict(config_loader.get_state()['written_events']) == {'other': ('2025-01-02', 'c' * 32),
+                                                                'new': ('2025-01-01', 'b' * 32)}
+
+# --- END OF FILE tests/test_prayer_calendar_manager.py ---
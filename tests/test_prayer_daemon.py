@@ -0,0 +1,47 @@
+# --- START OF FILE tests/test_prayer_daemon.py ---
+
+from datetime import datetime
+
+import pytz
+
+from prayer_daemon import JobScheduler, next_local_midnight
+
+
+def test_jobs_pop_in_due_order_and_only_when_due():
+    scheduler = JobScheduler()
+    scheduler.schedule('sync', 300.0)
+    scheduler.schedule('location_check', 100.0)
+    scheduler.schedule('recycle', 200.0)
+    assert scheduler.next_due() == 100.0
+    assert scheduler.pop_due(99.0) is None
+    assert [scheduler.pop_due(1000.0) for _ in range(4)] == ['location_check', 'recycle', 'sync', None]
+    assert scheduler.next_due() is None
+
+
+def test_rescheduling_keeps_the_earlier_time():
+    scheduler = JobScheduler()
+    scheduler.schedule('sync', 500.0)
+    scheduler.schedule('sync', 100.0) # Supersedes the entry at 500
+    scheduler.schedule('sync', 900.0) # Later than the live entry: ignored
+    assert scheduler.pop_due(100.0) == 'sync'
+    assert scheduler.pop_due(10000.0) is None # The superseded entries are skipped
+
+
+def test_a_popped_job_can_be_scheduled_again():
+    scheduler = JobScheduler()
+    scheduler.schedule('sync', 100.0)
+    assert scheduler.pop_due(100.0) == 'sync'
+    scheduler.schedule('sync', 200.0)
+    assert scheduler.next_due() == 200.0
+
+
+def test_next_local_midnight_follows_the_timezone_across_dst():
+    sydney = pytz.timezone('Australia/Sydney')
+    # Daylight saving time ends at 03:00 on 2025-04-06, so that day has 25 hours.
+    now = sydney.localize(datetime(2025, 4, 5, 23, 30))
+    assert next_local_midnight(sydney, now=now) == sydney.localize(datetime(2025, 4, 6)).timestamp()
+    assert next_local_midnight(sydney, delay_seconds=60, now=now) == sydney.localize(datetime(2025, 4, 6)).timestamp() + 60
+    later = sydney.localize(datetime(2025, 4, 6, 12, 0))
+    assert next_local_midnight(sydney, now=later) - next_local_midnight(sydney, now=now) == 25 * 3600
+
+# --- END OF FILE tests/test_prayer_daemon.py ---
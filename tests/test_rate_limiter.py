@@ -0,0 +1,104 @@
+# --- START OF FILE tests/test_rate_limiter.py ---
+
+import json
+import subprocess
+import sys
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import rate_limiter
+from conftest import REPO_ROOT
+from rate_limiter import CalendarRateLimiter, TokenBucket, is_rate_limited, is_retryable, retry_after_seconds
+
+
+class FakeClock:
+    """Stands in for time.monotonic()/time.sleep(): sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake_clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', fake_clock.sleep)
+    return fake_clock
+
+
+def _http_error(status, reason=None, headers=None):
+    content = json.dumps({'error': {'errors': [{'reason': reason}] if reason else []}}).encode('utf-8')
+    return HttpError(httplib2.Response(dict(headers or {}, status=status)), content)
+
+
+def test_token_bucket_allows_a_burst_then_paces_at_its_rate(clock):
+    bucket = TokenBucket(rate=10.0, capacity=5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire(3) == pytest.approx(0.3)
+
+
+def test_token_bucket_lets_an_oversized_request_through_and_leaves_it_in_debt(clock):
+    bucket = TokenBucket(rate=10.0, capacity=5)
+    assert bucket.acquire(8) == 0.0
+    assert bucket.tokens == pytest.approx(-3.0)
+    assert bucket.acquire() == pytest.approx(0.4)
+
+
+def test_token_bucket_refills_only_up_to_its_capacity(clock):
+    bucket = TokenBucket(rate=10.0, capacity=5)
+    bucket.acquire(5)
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.acquire() > 0
+
+
+@pytest.mark.parametrize('exception, retryable', [
+    (_http_error(429), True),
+    (_http_error(503), True),
+    (_http_error(403, 'rateLimitExceeded'), True),
+    (_http_error(403, 'userRateLimitExceeded'), True),
+    (_http_error(403, 'dailyLimitExceeded'), False),
+    (_http_error(403, 'forbidden'), False),
+    (_http_error(404), False),
+    (_http_error(409), False),
+    (ConnectionResetError(), True),
+    (TimeoutError(), True),
+    (httplib2.ServerNotFoundError('no such host'), True),
+    (ValueError('bad value'), False),
+])
+def test_errors_are_classified_as_retryable_or_not(exception, retryable):
+    assert is_retryable(exception) is retryable
+
+
+def test_only_429_and_rate_limit_403s_count_as_rate_limited():
+    assert is_rate_limited(_http_error(429))
+    assert is_rate_limited(_http_error(403, 'userRateLimitExceeded'))
+    assert not is_rate_limited(_http_error(403, 'dailyLimitExceeded'))
+    assert not is_rate_limited(_http_error(503))
+
+
+def test_backoff_honours_retry_after():
+    assert retry_after_seconds(_http_error(429, headers={'retry-after': '7'})) == 7.0
+    assert retry_after_seconds(_http_error(429)) is None
+    limiter = CalendarRateLimiter(requests_per_minute=0, backoff_base_seconds=0.0)
+    assert limiter.backoff_delay(3, _http_error(429, headers={'retry-after': '7'})) == 7.0
+
+
+def test_importing_the_rate_limiter_does_not_load_httplib2():
+    code = "import sys, rate_limiter; print('httplib2' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env={'PYTHONPATH': REPO_ROOT, 'PATH': ''})
+    assert result.stdout.strip().splitlines()[-1] == 'False'
+
+# --- END OF FILE tests/test_rate_limiter.py ---
@@ -0,0 +1,141 @@
+# --- START OF FILE tests/test_run_pipeline.py ---
+
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import pytz
+
+from calendar_batch import CalendarWriteBatch
+from local_prayer_engine import LocalPrayerEngine
+from rate_limiter import CalendarRateLimiter
+from run_pipeline import run_window_pipeline
+from schedule_cache import CachedPrayerTimeSource, ScheduleCache
+
+TARGET_TZ = pytz.timezone('Australia/Sydney')
+LOCATION = {'latitude': -33.8688, 'longitude': 151.2093, 'timezone': 'Australia/Sydney', 'address_for_display': 'Sydney'}
+PRAYER_NAME_BY_SUMMARY = {f'{name} Prayer': name for name in ('Fajr', 'Zuhr', 'Asr', 'Maghrib', 'Isha')}
+DATES = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(7)]
+
+
+class CountingSource:
+    """A prayer time backend that calculates locally and counts the dates it was asked for."""
+
+    def __init__(self):
+        self.engine = LocalPrayerEngine()
+        self.calls = 0
+
+    def prefetch_prayer_times(self, dates, location_params):
+        pass
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        self.calls += 1
+        return self.engine.get_prayer_times_with_ends(target_date_obj_override, location_params)
+
+    def close(self):
+        pass
+
+
+class FakeRequest:
+    def __init__(self, method, kwargs):
+        self.method = method
+        self.kwargs = kwargs
+
+
+class FakeEvents:
+    def __getattr__(self, method):
+        return lambda **kwargs: FakeRequest(method, kwargs)
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            self.callback(request_id, dict(request.kwargs.get('body') or {}, id=request.kwargs.get('eventId')), None)
+
+
+class FakeCalendarService:
+    """Answers every write with success and records the size of each batch request."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def events(self):
+        return FakeEvents()
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+def _dry_run(cache_path):
+    backend = CountingSource()
+    source = CachedPrayerTimeSource(backend, ScheduleCache(cache_path), 'test-params', 'test') # Opened on this thread
+    try:
+        state = run_window_pipeline(None, source, DATES, LOCATION, TARGET_TZ, lambda: ({}, []), PRAYER_NAME_BY_SUMMARY,
+                                    None, dry_run=True)
+    finally:
+        source.close()
+    return backend, state
+
+
+def test_warm_pipeline_serves_every_day_from_the_schedule_cache(tmp_path):
+    cache_path = os.path.join(tmp_path, 'schedule_cache.sqlite3')
+    cold_backend, cold_state = _dry_run(cache_path)
+    assert cold_backend.calls == len(DATES)
+
+    warm_backend, warm_state = _dry_run(cache_path)
+    assert warm_backend.calls == 0
+    assert not warm_state['scraping_failed']
+    assert warm_state['plan'].counts() == cold_state['plan'].counts()
+    assert len(warm_state['plan'].creates) == 5 * len(DATES)
+
+
+def _sync(dates, batch_size=50):
+    service = FakeCalendarService()
+    write_batch = CalendarWriteBatch(service, batch_size=batch_size, rate_limiter=CalendarRateLimiter(requests_per_minute=0))
+    state = run_window_pipeline(service, LocalPrayerEngine(), dates, LOCATION, TARGET_TZ, lambda: ({}, []),
+                                PRAYER_NAME_BY_SUMMARY, write_batch)
+    return service, state
+
+
+def test_a_window_of_writes_goes_out_in_full_batch_requests():
+    service, state = _sync(DATES)
+    assert service.batch_sizes == [5 * len(DATES)]
+    assert state['writes_succeeded'] == 5 * len(DATES)
+    assert state['writes_failed'] == 0
+
+
+def test_writes_beyond_a_batch_are_sent_as_the_window_fills_batches():
+    dates = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(23)]
+    service, state = _sync(dates, batch_size=50)
+    assert service.batch_sizes == [50, 50, 15]
+    assert state['writes_succeeded'] == 115
+
+def test_a_failed_listing_stops_the_run_without_waiting_on_the_fetch_stage():
+    dates = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(30)]
+    service = FakeCalendarService()
+    write_batch = CalendarWriteBatch(service, rate_limiter=CalendarRateLimiter(requests_per_minute=0))
+    result = {}
+
+    def failing_listing():
+        time.sleep(0.5) # Long enough for the fetch stage to fill the queue
+        return None
+    runner = threading.Thread(target=lambda: result.update(run_window_pipeline(
+        service, LocalPrayerEngine(), dates, LOCATION, TARGET_TZ, failing_listing, PRAYER_NAME_BY_SUMMARY, write_batch)), daemon=True)
+    runner.start()
+    runner.join(timeout=20)
+    assert not runner.is_alive(), "the pipeline hung after the listing failed"
+    assert result['listing_failed']
+    assert service.batch_sizes == []
+
+
+# --- END OF FILE tests/test_run_pipeline.py ---
@@ -0,0 +1,80 @@
+# --- START OF FILE tests/test_schedule_cache.py ---
+
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pytest
+
+import schedule_cache
+from schedule_cache import CachedPrayerTimeSource, ScheduleCache, location_key
+
+DAY = date(2025, 1, 1)
+SCHEDULE = {'Fajr': {'start': '05:00:00', 'end': '06:00:00', 'date_for_start': '2025-01-01', 'date_for_end': '2025-01-01'}}
+
+
+class FakeSource:
+    """Stands in for a prayer time backend; counts calls to close()."""
+
+    def __init__(self):
+        self.closed = 0
+
+    def get_prayer_times_with_ends(self, target_date_obj_override=None, location_params=None):
+        return SCHEDULE
+
+    def prefetch_prayer_times(self, dates, location_params):
+        pass
+
+    def close(self):
+        self.closed += 1
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ScheduleCache(str(tmp_path / 'schedule_cache.sqlite3'))
+
+
+def test_close_closes_the_cache_even_if_reading_its_stats_fails(cache, monkeypatch):
+    def failing_stats():
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(cache, 'stats', failing_stats)
+    source = FakeSource()
+    CachedPrayerTimeSource(source, cache, 'hash', 'local').close()
+    assert source.closed == 1
+    assert cache.conn is None
+
+
+def test_the_spatial_index_is_built_once_when_threads_look_up_nearby_locations(cache, monkeypatch):
+    locations = [{'latitude': -33.8 + n * 0.01, 'longitude': 151.2, 'timezone': 'Australia/Sydney'} for n in range(5)]
+    for location_params in locations:
+        location = location_key(location_params)
+        cache.put(ScheduleCache.make_key(location, DAY, 'hash', 'local'), location, DAY, SCHEDULE)
+
+    built = []
+
+    class SlowSpatialIndex(schedule_cache.SpatialIndex):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            built.append(self)
+
+        def add(self, latitude, longitude, payload):
+            time.sleep(0.01) # Widens the window in which another thread could build its own index
+            super().add(latitude, longitude, payload)
+
+    monkeypatch.setattr(schedule_cache, 'SpatialIndex', SlowSpatialIndex)
+    source = CachedPrayerTimeSource(FakeSource(), cache, 'hash', 'local', snap_km=5)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(source._nearby_key(DAY, {
+        'latitude': -33.805, 'longitude': 151.2, 'timezone': 'Australia/Sydney'}))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=20)
+    assert len(built) == 1
+    assert len(results) == 8 and all(result is not None for result in results)
+    assert sorted(payload for _, payload in source._index().within(-33.8, 151.2, 50)) == sorted(
+        location_key(location_params) for location_params in locations)
+    source.close()
+
+# --- END OF FILE tests/test_schedule_cache.py ---
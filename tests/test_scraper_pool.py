@@ -0,0 +1,65 @@
+# --- START OF FILE tests/test_scraper_pool.py ---
+
+import threading
+from datetime import date, timedelta
+
+from selenium.common.exceptions import WebDriverException
+
+import scrape_prayer_times
+from scraper_pool import ScraperPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.alive = True
+
+    def quit(self):
+        self.alive = False
+
+
+def _install_fake_browser(monkeypatch, crash_on=()):
+    """Replaces the browser with FakeDrivers. Scraping a date in 'crash_on' kills that worker's first browser."""
+    launched = []
+    launch_lock = threading.Lock()
+
+    def launch_driver():
+        with launch_lock:
+            driver = FakeDriver()
+            launched.append(driver)
+            return driver
+
+    def scrape(session, target_date_obj_override, location_params):
+        driver = session.ensure_driver()
+        if target_date_obj_override in crash_on and driver is launched[0]:
+            driver.alive = False
+        if not driver.alive:
+            raise WebDriverException("invalid session id")
+        return {'date': target_date_obj_override}
+
+    monkeypatch.setattr(scrape_prayer_times, '_launch_driver', launch_driver)
+    monkeypatch.setattr(scrape_prayer_times.ScraperSession, '_scrape', scrape)
+    return launched
+
+
+def test_pool_relaunches_a_crashed_worker_browser(monkeypatch):
+    days = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(6)]
+    launched = _install_fake_browser(monkeypatch, crash_on={days[0]})
+    with ScraperPool(size=1) as pool:
+        pool.prefetch_prayer_times(days, {})
+        results = [pool.get_prayer_times_with_ends(day, {}) for day in days]
+        assert pool.sessions[0].driver_restarts == 1
+    assert results == [{'date': day} for day in days]
+    assert len(launched) == 2
+
+
+def test_pool_workers_launch_through_the_session(monkeypatch):
+    launched = _install_fake_browser(monkeypatch)
+    with ScraperPool(size=3) as pool:
+        days = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(9)]
+        pool.prefetch_prayer_times(days, {})
+        assert all(pool.get_prayer_times_with_ends(day, {}) == {'date': day} for day in days)
+        assert all(session.launch_lock is pool._launch_lock for session in pool.sessions)
+        assert len(launched) == len(pool.sessions) <= 3
+    assert not any(driver.alive for driver in launched)
+
+# --- END OF FILE tests/test_scraper_pool.py ---